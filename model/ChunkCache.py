@@ -0,0 +1,205 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+import os
+import threading
+
+import numpy as np
+
+
+# -----------------------------------------------------------------------------
+# class ChunkCache
+#
+# This holds decoded windows of images, so reading the same window again does
+# not pay for decompression again.  Entries are keyed by the file, its
+# modification time and size, the bands and the window, so a rewritten file
+# does not return stale pixels.  When the cached bytes exceed maxBytes, the
+# least recently used entries are evicted.  One cache may be shared by many
+# ImageFiles and Chunkers, from any thread.  getDefault() returns the
+# process-wide cache.
+#
+# Arrays are copied in and out, so callers may modify what they receive.
+#
+# cache = ChunkCache.getDefault()
+# chunker.setCache(cache)
+# ... several passes over the chunks ...
+# print(cache.statistics())
+# -----------------------------------------------------------------------------
+class ChunkCache(object):
+
+    DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+    _default = None
+    _defaultLock = threading.Lock()
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self, maxBytes=DEFAULT_MAX_BYTES):
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._numBytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self.setMaxBytes(maxBytes)
+
+    # -------------------------------------------------------------------------
+    # clear
+    # -------------------------------------------------------------------------
+    def clear(self):
+
+        self.invalidate()
+
+    # -------------------------------------------------------------------------
+    # _evict
+    #
+    # The lock must be held.
+    # -------------------------------------------------------------------------
+    def _evict(self):
+
+        while self._numBytes > self._maxBytes:
+
+            key, array = self._entries.popitem(last=False)
+            self._numBytes -= array.nbytes
+            self._evictions += 1
+
+    # -------------------------------------------------------------------------
+    # get
+    #
+    # This returns a copy of the cached array, or None.  When out is given,
+    # the array is copied into it, and out is returned.
+    # -------------------------------------------------------------------------
+    def get(self, key, out=None):
+
+        with self._lock:
+
+            array = self._entries.get(key)
+
+            if array is None:
+
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+
+        if out is None:
+            return array.copy()
+
+        np.copyto(out, array)
+
+        return out
+
+    # -------------------------------------------------------------------------
+    # getDefault
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def getDefault():
+
+        with ChunkCache._defaultLock:
+
+            if ChunkCache._default is None:
+                ChunkCache._default = ChunkCache()
+
+            return ChunkCache._default
+
+    # -------------------------------------------------------------------------
+    # invalidate
+    #
+    # This removes the entries of one file, or every entry when no file is
+    # given.  Call it after rewriting a file in place.
+    # -------------------------------------------------------------------------
+    def invalidate(self, pathToFile=None):
+
+        with self._lock:
+
+            if pathToFile is None:
+
+                self._entries.clear()
+                self._numBytes = 0
+                return
+
+            pathToFile = os.path.abspath(pathToFile)
+
+            for key in [key for key in self._entries
+                        if key[0] == pathToFile]:
+
+                self._numBytes -= self._entries.pop(key).nbytes
+
+    # -------------------------------------------------------------------------
+    # makeKey
+    #
+    # This identifies a window of a file as it is on disk now.  Extra holds
+    # anything else that changes the pixels read, like a subdataset name.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def makeKey(pathToFile, window, bands=None, extra=None):
+
+        stat = os.stat(pathToFile)
+
+        return (os.path.abspath(pathToFile),
+                stat.st_mtime_ns,
+                stat.st_size,
+                tuple(bands) if bands else None,
+                tuple(int(value) for value in window),
+                extra)
+
+    # -------------------------------------------------------------------------
+    # put
+    #
+    # Arrays larger than the whole cache are not kept.
+    # -------------------------------------------------------------------------
+    def put(self, key, array):
+
+        if array.nbytes > self._maxBytes:
+            return
+
+        array = np.array(array)
+
+        with self._lock:
+
+            previous = self._entries.pop(key, None)
+
+            if previous is not None:
+                self._numBytes -= previous.nbytes
+
+            self._entries[key] = array
+            self._numBytes += array.nbytes
+            self._evict()
+
+    # -------------------------------------------------------------------------
+    # setMaxBytes
+    # -------------------------------------------------------------------------
+    def setMaxBytes(self, maxBytes):
+
+        if maxBytes < 0:
+            raise RuntimeError('The cache size must not be negative.')
+
+        with self._lock:
+
+            self._maxBytes = int(maxBytes)
+            self._evict()
+
+    # -------------------------------------------------------------------------
+    # statistics
+    # -------------------------------------------------------------------------
+    def statistics(self):
+
+        with self._lock:
+
+            return {'hits': self._hits,
+                    'misses': self._misses,
+                    'evictions': self._evictions,
+                    'entries': len(self._entries),
+                    'bytes': self._numBytes,
+                    'maxBytes': self._maxBytes}
+
+    # -------------------------------------------------------------------------
+    # __len__
+    # -------------------------------------------------------------------------
+    def __len__(self):
+
+        return len(self._entries)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import json
+
+import numpy as np
+
+
+# -----------------------------------------------------------------------------
+# class ChunkPlan
+#
+# This describes every chunk window of an image, in the order Chunker steps
+# through it, without any stateful stepping or GDAL calls.  A plan is only
+# the image size and the chunk size, so it is cheap to create, pickle and send
+# as JSON.  Any window is computed from its chunk number in constant time, and
+# many windows are computed at once with NumPy.  A distributed process can
+# receive (path, plan, indices) and read its windows with
+# Chunker.readWindow(*plan[index]).
+#
+# Windows are (xStart, yStart, xLen, yLen) tuples.  Chunks are numbered from
+# the upper left, across each row of chunks.  A plan may cover only a region
+# of the image, itself a window, in which case its chunks start at the
+# region's upper left and are clipped to it.
+# -----------------------------------------------------------------------------
+class ChunkPlan(object):
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self, xImage, yImage, xChunk, yChunk, region=None):
+
+        if xImage < 1 or yImage < 1:
+            raise RuntimeError('The image size must be greater than zero.')
+
+        if xChunk < 1 or yChunk < 1:
+            raise RuntimeError('The chunk size must be greater than zero.')
+
+        region = region or (0, 0, xImage, yImage)
+        xFirst, yFirst, xLen, yLen = [int(value) for value in region]
+
+        if xFirst < 0 or yFirst < 0 or xLen < 1 or yLen < 1 or \
+           xFirst + xLen > xImage or yFirst + yLen > yImage:
+
+            raise RuntimeError('The region, ' +
+                               str(tuple(region)) +
+                               ', must be within the image.')
+
+        self._xImage = int(xImage)
+        self._yImage = int(yImage)
+        self._xChunk = int(xChunk)
+        self._yChunk = int(yChunk)
+        self._xFirst = xFirst
+        self._yFirst = yFirst
+        self._xEnd = xFirst + xLen
+        self._yEnd = yFirst + yLen
+        self._xNum = -(-xLen // self._xChunk)
+        self._yNum = -(-yLen // self._yChunk)
+
+    # -------------------------------------------------------------------------
+    # batches
+    #
+    # This splits the chunk numbers into ranges of, at most, batchSize chunks.
+    # Ranges pickle compactly, so they are suitable for task arguments.
+    # -------------------------------------------------------------------------
+    def batches(self, batchSize):
+
+        if batchSize < 1:
+            raise RuntimeError('The batch size must be greater than zero.')
+
+        return [range(start, min(start + batchSize, len(self)))
+                for start in range(0, len(self), batchSize)]
+
+    # -------------------------------------------------------------------------
+    # chunkSize
+    # -------------------------------------------------------------------------
+    def chunkSize(self):
+
+        return (self._xChunk, self._yChunk)
+
+    # -------------------------------------------------------------------------
+    # imageSize
+    # -------------------------------------------------------------------------
+    def imageSize(self):
+
+        return (self._xImage, self._yImage)
+
+    # -------------------------------------------------------------------------
+    # indexOf
+    #
+    # This returns the number of the chunk starting at (xStart, yStart).
+    # -------------------------------------------------------------------------
+    def indexOf(self, xStart, yStart):
+
+        xOffset = xStart - self._xFirst
+        yOffset = yStart - self._yFirst
+
+        if xOffset % self._xChunk or yOffset % self._yChunk or \
+           not self._xFirst <= xStart < self._xEnd or \
+           not self._yFirst <= yStart < self._yEnd:
+
+            raise RuntimeError('No chunk starts at ' +
+                               str((xStart, yStart)) +
+                               '.')
+
+        return yOffset // self._yChunk * self._xNum + xOffset // self._xChunk
+
+    # -------------------------------------------------------------------------
+    # windows
+    #
+    # This computes the windows of the given chunk numbers, or of every chunk,
+    # as an (n, 4) array of (xStart, yStart, xLen, yLen) rows.
+    # -------------------------------------------------------------------------
+    def windows(self, indices=None):
+
+        if indices is None:
+            indices = np.arange(len(self), dtype=np.int64)
+
+        elif isinstance(indices, range):
+
+            indices = np.arange(indices.start,
+                                indices.stop,
+                                indices.step,
+                                dtype=np.int64)
+
+        else:
+            indices = np.asarray(indices, dtype=np.int64)
+
+        if indices.size and \
+           (indices.min() < -len(self) or indices.max() >= len(self)):
+
+            raise IndexError('Chunk numbers must be less than ' +
+                             str(len(self)) +
+                             '.')
+
+        indices = indices % len(self) if indices.size else indices
+        windows = np.empty((indices.size, 4), dtype=np.int64)
+        windows[:, 0] = indices % self._xNum * self._xChunk + self._xFirst
+        windows[:, 1] = indices // self._xNum * self._yChunk + self._yFirst
+        windows[:, 2] = np.minimum(self._xChunk, self._xEnd - windows[:, 0])
+        windows[:, 3] = np.minimum(self._yChunk, self._yEnd - windows[:, 1])
+
+        return windows
+
+    # -------------------------------------------------------------------------
+    # region
+    #
+    # This is the window the plan covers, which is the whole image unless a
+    # region was given.
+    # -------------------------------------------------------------------------
+    def region(self):
+
+        return (self._xFirst,
+                self._yFirst,
+                self._xEnd - self._xFirst,
+                self._yEnd - self._yFirst)
+
+    # -------------------------------------------------------------------------
+    # toJson
+    # -------------------------------------------------------------------------
+    def toJson(self):
+
+        return json.dumps({'xImage': self._xImage,
+                           'yImage': self._yImage,
+                           'xChunk': self._xChunk,
+                           'yChunk': self._yChunk,
+                           'region': self.region()})
+
+    # -------------------------------------------------------------------------
+    # fromJson
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def fromJson(planJson):
+
+        plan = json.loads(planJson)
+
+        return ChunkPlan(plan['xImage'],
+                         plan['yImage'],
+                         plan['xChunk'],
+                         plan['yChunk'],
+                         plan.get('region'))
+
+    # -------------------------------------------------------------------------
+    # __eq__
+    # -------------------------------------------------------------------------
+    def __eq__(self, other):
+
+        return isinstance(other, ChunkPlan) and \
+            self.imageSize() == other.imageSize() and \
+            self.chunkSize() == other.chunkSize() and \
+            self.region() == other.region()
+
+    # -------------------------------------------------------------------------
+    # __getitem__
+    #
+    # A chunk number returns its window as a tuple.  A slice returns the
+    # windows as an array, like windows().
+    # -------------------------------------------------------------------------
+    def __getitem__(self, index):
+
+        if isinstance(index, slice):
+            return self.windows(range(*index.indices(len(self))))
+
+        if index < -len(self) or index >= len(self):
+
+            raise IndexError('Chunk number ' +
+                             str(index) +
+                             ' is out of range.')
+
+        index %= len(self)
+        xStart = index % self._xNum * self._xChunk + self._xFirst
+        yStart = index // self._xNum * self._yChunk + self._yFirst
+
+        return (xStart,
+                yStart,
+                min(self._xChunk, self._xEnd - xStart),
+                min(self._yChunk, self._yEnd - yStart))
+
+    # -------------------------------------------------------------------------
+    # __hash__
+    # -------------------------------------------------------------------------
+    def __hash__(self):
+
+        return hash((self.imageSize(), self.chunkSize(), self.region()))
+
+    # -------------------------------------------------------------------------
+    # __iter__
+    # -------------------------------------------------------------------------
+    def __iter__(self):
+
+        for index in range(len(self)):
+            yield self[index]
+
+    # -------------------------------------------------------------------------
+    # __len__
+    # -------------------------------------------------------------------------
+    def __len__(self):
+
+        return self._xNum * self._yNum
+
+    # -------------------------------------------------------------------------
+    # __reduce__
+    #
+    # Pickle only the sizes and the region.
+    # -------------------------------------------------------------------------
+    def __reduce__(self):
+
+        return (self.__class__,
+                (self._xImage,
+                 self._yImage,
+                 self._xChunk,
+                 self._yChunk,
+                 self.region()))
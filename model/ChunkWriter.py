@@ -0,0 +1,223 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import queue
+import threading
+
+import numpy as np
+
+from osgeo import gdal
+
+from core.model.Chunker import Chunker
+
+
+# -----------------------------------------------------------------------------
+# class ChunkWriter
+#
+# This is the output counterpart of Chunker.  It creates a tiled, compressed
+# GeoTIFF on the grid of a source GeospatialImageFile, then writes
+# (location, chunk) pairs into it as they are computed, so a pipeline never
+# holds the whole output in memory.  Chunks may arrive in any order and from
+# any number of threads.  GDAL datasets are not thread safe, so writes go
+# through a bounded queue to a single writer thread, which owns the output
+# dataset.  When the queue is full, write() waits, limiting memory.
+#
+# Chunks are in a Chunker layout, LAYOUT_XYB by default.  For chunks with a
+# halo, write the inner chunk from Chunker.getInnerChunk().
+#
+# with ChunkWriter(outPath, GeospatialImageFile(inPath)) as writer:
+#     for loc, chunk in chunker.iterChunks(workers=4):
+#         writer.write(loc, process(chunk))
+# -----------------------------------------------------------------------------
+class ChunkWriter(object):
+
+    DEFAULT_CREATION_OPTIONS = ['TILED=YES',
+                                'COMPRESS=LZW',
+                                'BIGTIFF=IF_SAFER']
+    DEFAULT_QUEUE_SIZE = 8
+
+    # -------------------------------------------------------------------------
+    # __init__
+    #
+    # dataType is a GDAL data type, like gdal.GDT_Float32.  It defaults to the
+    # source's data type.
+    # -------------------------------------------------------------------------
+    def __init__(self,
+                 outputPath,
+                 sourceImageFile,
+                 numBands=1,
+                 dataType=None,
+                 noDataValue=None,
+                 creationOptions=None,
+                 layout=Chunker.LAYOUT_XYB,
+                 queueSize=DEFAULT_QUEUE_SIZE):
+
+        if layout not in Chunker.LAYOUTS:
+
+            raise RuntimeError('Layout, ' +
+                               str(layout) +
+                               ', must be one of ' +
+                               str(Chunker.LAYOUTS) +
+                               '.')
+
+        source = sourceImageFile.getDataset()
+
+        dataType = dataType or source.GetRasterBand(1).DataType
+
+        creationOptions = creationOptions or \
+            ChunkWriter.DEFAULT_CREATION_OPTIONS
+
+        self._outputPath = outputPath
+        self._layout = layout
+
+        self._dataset = gdal.GetDriverByName('GTiff').Create(
+            outputPath,
+            source.RasterXSize,
+            source.RasterYSize,
+            numBands,
+            dataType,
+            options=creationOptions)
+
+        if not self._dataset:
+
+            raise RuntimeError('GDAL was unable to create ' +
+                               outputPath +
+                               '.')
+
+        self._dataset.SetGeoTransform(source.GetGeoTransform())
+        self._dataset.SetSpatialRef(sourceImageFile.srs())
+
+        if noDataValue is not None:
+
+            for band in range(1, numBands + 1):
+                self._dataset.GetRasterBand(band).SetNoDataValue(noDataValue)
+
+        self._error = None
+        self._queue = queue.Queue(maxsize=queueSize)
+        self._thread = threading.Thread(target=self._writeQueue, daemon=True)
+        self._thread.start()
+
+    # -------------------------------------------------------------------------
+    # close
+    #
+    # This writes the chunks still queued, then closes the output file.
+    # -------------------------------------------------------------------------
+    def close(self):
+
+        if not self._thread:
+            return
+
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+        self._dataset.FlushCache()
+        self._dataset = None
+
+        self._raiseError()
+
+    # -------------------------------------------------------------------------
+    # fileName
+    # -------------------------------------------------------------------------
+    def fileName(self):
+
+        return self._outputPath
+
+    # -------------------------------------------------------------------------
+    # _raiseError
+    # -------------------------------------------------------------------------
+    def _raiseError(self):
+
+        if self._error:
+
+            raise RuntimeError('Writing to ' +
+                               self._outputPath +
+                               ' failed: ' +
+                               str(self._error))
+
+    # -------------------------------------------------------------------------
+    # write
+    #
+    # The chunk is copied, because it is written later, by the writer thread,
+    # and callers, like a Chunker with a buffer ring, may reuse its buffer.
+    # -------------------------------------------------------------------------
+    def write(self, loc, chunk):
+
+        if not self._thread:
+            raise RuntimeError(self._outputPath + ' is closed.')
+
+        self._raiseError()
+        self._queue.put((loc, np.array(chunk, copy=True)))
+
+    # -------------------------------------------------------------------------
+    # _writeChunk
+    #
+    # This writes a chunk, converted to GDAL's (band, row, column) order.
+    # -------------------------------------------------------------------------
+    def _writeChunk(self, loc, chunk):
+
+        if self._layout == Chunker.LAYOUT_BXY:
+            bands = chunk.transpose(0, 2, 1)
+
+        elif self._layout == Chunker.LAYOUT_BYX:
+            bands = chunk
+
+        elif chunk.ndim == 2:
+            bands = chunk.transpose()[None, :, :]
+
+        else:
+            bands = chunk.transpose(2, 1, 0)
+
+        if len(bands) != self._dataset.RasterCount:
+
+            raise RuntimeError('The chunk at ' +
+                               str(loc) +
+                               ' has ' +
+                               str(len(bands)) +
+                               ' bands, but the output has ' +
+                               str(self._dataset.RasterCount) +
+                               '.')
+
+        for band in range(len(bands)):
+
+            self._dataset.GetRasterBand(band + 1).WriteArray(bands[band],
+                                                            int(loc[0]),
+                                                            int(loc[1]))
+
+    # -------------------------------------------------------------------------
+    # _writeQueue
+    #
+    # This runs on the writer thread.  After an error, the remaining chunks
+    # are discarded, and the error is raised by the next write() or close().
+    # -------------------------------------------------------------------------
+    def _writeQueue(self):
+
+        while True:
+
+            item = self._queue.get()
+
+            if item is None:
+                return
+
+            if self._error:
+                continue
+
+            try:
+                self._writeChunk(*item)
+
+            except Exception as e:
+                self._error = e
+
+    # -------------------------------------------------------------------------
+    # __enter__
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+
+        return self
+
+    # -------------------------------------------------------------------------
+    # __exit__
+    # -------------------------------------------------------------------------
+    def __exit__(self, type, value, traceback):
+
+        self.close()
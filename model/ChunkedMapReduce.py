@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import math
+import pickle
+import time
+
+from core.model.CeleryConfiguration import app
+from core.model.Chunker import Chunker
+
+
+# -----------------------------------------------------------------------------
+# ChunkedMapReduce
+#
+# This distributes a computation over the chunks of an image with Celery.
+# The image's ChunkPlan is split into batches of chunks, and each batch
+# becomes one task, so per-task overhead is paid once per batch rather than
+# once per chunk.  Each task opens the image itself, because GDAL datasets
+# cannot be pickled, maps func over its chunks and reduces them to a single
+# partial result.  The controlling process reduces the partial results in
+# batch order, as they become available, so reducer need not be
+# commutative.
+#
+# func(loc, chunk) receives each chunk's (xStart, yStart) location and its
+# pixels in (x, y) orientation, as from Chunker.getChunk().
+# reducer(a, b) combines two results, and must be associative.  Both are sent
+# to the workers with Pickle, so they must be defined at module level.
+# Partial results are pickled by the task, so they may be numpy values,
+# tuples or objects like RasterStats, whatever the app's result serializer.
+# When a task fails, the pending tasks are revoked and its exception is
+# raised.
+#
+# Workers must import this module, so include 'core.model.ChunkedMapReduce'
+# in the Celery application's modules.  For testing, set
+# app.conf.task_always_eager to run the tasks locally.
+# -----------------------------------------------------------------------------
+DEFAULT_NUM_TASKS = 100
+
+
+# -----------------------------------------------------------------------------
+# mapChunkBatch
+#
+# This returns the batch's partial result pickled, as text that any result
+# serializer, including JSON, returns unchanged.  See _loadPartial().
+# -----------------------------------------------------------------------------
+@app.task(serializer='pickle')
+def mapChunkBatch(imagePath, plan, indices, func, reducer, bands=None):
+
+    chunker = Chunker(imagePath)
+    chunker.setBands(bands)
+    partial = None
+
+    for i, index in enumerate(indices):
+
+        window = plan[index]
+        result = func(window[:2], chunker.readWindow(*window))
+        partial = result if i == 0 else reducer(partial, result)
+
+    return base64.b64encode(pickle.dumps(partial)).decode('ascii')
+
+
+# -----------------------------------------------------------------------------
+# _loadPartial
+# -----------------------------------------------------------------------------
+def _loadPartial(encodedPartial):
+
+    return pickle.loads(base64.b64decode(encodedPartial))
+
+
+# -----------------------------------------------------------------------------
+# chunkedMapReduce
+#
+# chunkSize is (xSize, ySize).  When batchSize is not given, chunks are split
+# into about DEFAULT_NUM_TASKS tasks.
+# -----------------------------------------------------------------------------
+def chunkedMapReduce(imagePath,
+                     func,
+                     reducer,
+                     chunkSize,
+                     batchSize=None,
+                     bands=None,
+                     pollInterval=0.1):
+
+    chunker = Chunker(imagePath)
+    chunker.setChunkSize(*chunkSize)
+    plan = chunker.getChunkPlan()
+    batchSize = batchSize or math.ceil(len(plan) / DEFAULT_NUM_TASKS)
+
+    pending = {}
+
+    for number, batch in enumerate(plan.batches(batchSize)):
+
+        pending[number] = mapChunkBatch.apply_async((imagePath,
+                                                     plan,
+                                                     batch,
+                                                     func,
+                                                     reducer,
+                                                     bands))
+
+    numBatches = len(pending)
+    partials = {}
+    nextBatch = 0
+    total = None
+
+    while nextBatch < numBatches:
+
+        ready = [batch for batch, result in pending.items() if result.ready()]
+
+        if not ready:
+
+            time.sleep(pollInterval)
+            continue
+
+        for batch in ready:
+
+            result = pending.pop(batch)
+
+            try:
+                partials[batch] = _loadPartial(result.get())
+
+            except Exception:
+
+                for other in pending.values():
+                    other.revoke()
+
+                raise
+
+            finally:
+
+                # Finished results are not kept in the backend.
+                result.forget()
+
+        # Reduce the partial results in batch order.
+        while nextBatch in partials:
+
+            partial = partials.pop(nextBatch)
+            total = partial if nextBatch == 0 else reducer(total, partial)
+            nextBatch += 1
+
+    return total
@@ -1,12 +1,31 @@
 #!/usr/bin/env python2
 # -*- coding: utf-8 -*-
 
+import asyncio
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+import itertools
+import math
+import multiprocessing
+from multiprocessing import shared_memory
+import queue
 import struct
+import threading
+import warnings
+import weakref
 
 import numpy as np
 
+from osgeo import gdal
+from osgeo import gdal_array
 from osgeo import gdalconst
+from osgeo import ogr
+from osgeo import osr
 
+from core.model.ChunkPlan import ChunkPlan
+from core.model.Envelope import Envelope
 from core.model.ImageFile import ImageFile
 
 
@@ -20,6 +39,21 @@ from core.model.ImageFile import ImageFile
 # -----------------------------------------------------------------------------
 class Chunker(object):
 
+    COARSE_MASK_SIZE = 1024
+    DEFAULT_CHUNK_PIXELS = 1024 * 1024
+    DEFAULT_TASKS_PER_PROCESS = 4
+    REGION_SEGMENTS = 100
+
+    # ---
+    # Chunk layouts.  LAYOUT_XYB is the original (x, y) for one band and
+    # (x, y, band) for several.  LAYOUT_BXY is always (band, x, y), and
+    # LAYOUT_BYX is GDAL's (band, row, column).  Each is returned contiguous.
+    # ---
+    LAYOUT_XYB = 'xyb'
+    LAYOUT_BXY = 'bxy'
+    LAYOUT_BYX = 'byx'
+    LAYOUTS = (LAYOUT_XYB, LAYOUT_BXY, LAYOUT_BYX)
+
     # -------------------------------------------------------------------------
     # __init__
     # -------------------------------------------------------------------------
@@ -30,6 +64,99 @@ class Chunker(object):
         self._ySize = 1
         self._curChunkLoc = (0, 0)
         self._complete = False
+        self._bands = None
+        self._layout = Chunker.LAYOUT_XYB
+        self._bufferRing = []
+        self._bufferRingSize = 0
+        self._bufferRingIndex = 0
+        self._halo = 0
+        self._prefetchDepth = 0
+        self._prefetchQueue = None
+        self._prefetchStop = None
+        self._prefetchThread = None
+        self._skipEmpty = False
+        self._skipNoData = None
+        self._skipNoDataValue = None
+        self._skipUseOverview = False
+        self._coarseMask = None
+        self._skippedWindows = []
+        self._cache = None
+        self._pool = None
+        self._bounds = None
+        self._region = None
+        self._regionSource = None
+        self._regionLock = threading.Lock()
+        self._resolution = 1
+        self._resampling = gdalconst.GRIORA_NearestNeighbour
+
+    # Each processMap() worker process keeps its Chunker and output here.
+    _processState = None
+
+    # -------------------------------------------------------------------------
+    # aiter
+    #
+    # This is the asyncio form of iterChunks(), for use in an event loop:
+    #
+    # async for loc, chunk in chunker.aiter(concurrency=4):
+    #     await upload(loc, chunk)
+    #
+    # Reads run on concurrency threads, each with its own dataset, so they do
+    # not block the event loop.  A chunk's read is replaced only after the
+    # consumer takes the chunk, so no more than concurrency chunks are read
+    # ahead of a slow consumer.  See iterChunks() for ordered and indices.
+    # -------------------------------------------------------------------------
+    async def aiter(self, concurrency=1, ordered=False, indices=None):
+
+        if concurrency < 1:
+            raise RuntimeError('The concurrency must be greater than zero.')
+
+        loop = asyncio.get_running_loop()
+        windows = self._getPlanWindows(indices)
+        threadState = threading.local()
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+
+        def submit(window):
+            return loop.run_in_executor(executor,
+                                        self._readChunkOnThread,
+                                        threadState,
+                                        window)
+
+        pending = deque()
+
+        try:
+            pending.extend(submit(window) for window in
+                           itertools.islice(windows, concurrency))
+
+            while pending:
+
+                if ordered:
+                    finished = [pending.popleft()]
+
+                else:
+
+                    finished, unfinished = await asyncio.wait(
+                        pending,
+                        return_when=asyncio.FIRST_COMPLETED)
+
+                    pending = deque(f for f in pending if f not in finished)
+
+                for future in finished:
+
+                    loc, chunk = await future
+                    window = next(windows, None)
+
+                    if window:
+                        pending.append(submit(window))
+
+                    if chunk is not None:
+                        yield (loc, chunk)
+
+        finally:
+
+            for future in pending:
+                future.cancel()
+
+            executor.shutdown(wait=False, cancel_futures=True)
 
     # -------------------------------------------------------------------------
     # getChunk
@@ -47,9 +174,32 @@ class Chunker(object):
     #
     # This might be easier to understand as a specialized Chunker class because
     # this version crams two slightly different uses into one.  Trying to keep
-    # it simple, with one class.
+    # it simple, with one class.  For many chunks, getChunkPlan() computes
+    # every location at once, and readWindow() reads any of them.
+    #
+    # When out is given, the chunk is read directly into it.  It must be a
+    # C-contiguous array of the image's data type with at least as many
+    # elements as the chunk.  The chunk returned is a view of it.
+    #
+    # When empty chunks are skipped, getChunk() steps past them.  If the chunk
+    # at an explicit xStart and yStart is empty, its chunk is None.
+    # -------------------------------------------------------------------------
+    def getChunk(self, xStart=None, yStart=None, read=True, out=None):
+
+        loc, chunk = self._stepChunk(xStart, yStart, read, out)
+
+        while loc and chunk is None and not xStart and not yStart:
+            loc, chunk = self._stepChunk(None, None, read, out)
+
+        return (loc, chunk)
+
+    # -------------------------------------------------------------------------
+    # _stepChunk
+    #
+    # This reads the chunk at the cursor, or at xStart and yStart, and moves
+    # the cursor to the following chunk.
     # -------------------------------------------------------------------------
-    def getChunk(self, xStart=None, yStart=None, read=True):
+    def _stepChunk(self, xStart, yStart, read, out):
 
         if self._complete:
             return (None, None)
@@ -60,6 +210,11 @@ class Chunker(object):
         if not self._ySize:
             raise RuntimeError('The chunk y size must be set.')
 
+        # Chunks step through the region, which is the whole image by default.
+        xFirst, yFirst, xRegion, yRegion = self._getBounds()
+        xEnd = xFirst + xRegion
+        yEnd = yFirst + yRegion
+
         xStart = xStart or self._curChunkLoc[0]
         yStart = yStart or self._curChunkLoc[1]
         xLen = self._xSize
@@ -70,15 +225,15 @@ class Chunker(object):
         yExceeded = False
 
         # X dimension exceeded?
-        if xStart + xLen > self._imageFile.getDataset().RasterXSize:
+        if xStart + xLen > xEnd:
 
             # Limit the read in the X dimension.
-            xLen = self._imageFile.getDataset().RasterXSize - xStart
+            xLen = xEnd - xStart
 
             # If the length is 0, move to the next chunk row now.
             if xLen == 0:
 
-                xStart = 0
+                xStart = xFirst
                 yStart = yStart + self._ySize
                 xLen = self._xSize
                 next_xStart = xStart + xLen
@@ -87,17 +242,17 @@ class Chunker(object):
             else:
 
                 # Move to next chunk row for the following chunk.
-                next_xStart = 0
+                next_xStart = xFirst
                 next_yStart = yStart + self._ySize
 
             # When X and Y are exceeded, chunking is complete.
             xExceeded = True
 
-        # Y dimension exceeded?  Must be the last row of the image.
-        if yStart + yLen > self._imageFile.getDataset().RasterYSize:
+        # Y dimension exceeded?  Must be the last row of the region.
+        if yStart + yLen > yEnd:
 
             # Limit the read in the Y dimension.
-            yLen = self._imageFile.getDataset().RasterYSize - yStart
+            yLen = yEnd - yStart
 
             # ---
             # When yLen is 0, the next read cannot happen.  If yLen is not 0,
@@ -112,15 +267,33 @@ class Chunker(object):
             # When X and Y are exceeded, chunking is complete.
             yExceeded = True
 
-        if not self.isComplete() and read:
+        if not self.isComplete() and self._region is not None and \
+           not self._intersectsRegion((xStart, yStart, xLen, yLen)):
+
+            # Chunks outside a region's polygon are skipped without reading.
+            chunk = None
+
+        elif not self.isComplete() and read:
+
+            if out is None and self._prefetchDepth:
+
+                chunk = self._getPrefetchedChunk(
+                    (xStart, yStart, xLen, yLen))
 
-            rcChunk = self._imageFile.getDataset().ReadAsArray(xStart,
-                                                               yStart,
-                                                               xLen,
-                                                               yLen)
+            else:
+
+                if out is None and self._bufferRingSize:
+                    out = self._nextRingBuffer()
 
-            # Load the chunk as (x, y), instead of (row, column).
-            chunk = rcChunk.transpose()
+                chunk = self._readChunk(self._imageFile,
+                                        xStart,
+                                        yStart,
+                                        xLen,
+                                        yLen,
+                                        out)
+
+            if chunk is None:
+                self._skippedWindows.append((xStart, yStart, xLen, yLen))
 
         else:
 
@@ -136,69 +309,1552 @@ class Chunker(object):
         return ((xStart, yStart), chunk)
 
     # -------------------------------------------------------------------------
-    # isComplete
+    # getBlockSize
+    #
+    # This is the natural block size of the raster, (x, y).  Tiled images have
+    # square-ish tiles; striped images have blocks as wide as the image.
     # -------------------------------------------------------------------------
-    def isComplete(self):
-        return self._complete
+    def getBlockSize(self):
+
+        xBlock, yBlock = \
+            self._imageFile.getDataset().GetRasterBand(1).GetBlockSize()
+
+        return (xBlock, yBlock)
 
     # -------------------------------------------------------------------------
-    # reset
+    # _getBounds
+    #
+    # This is the window of the region, or of the whole image.
     # -------------------------------------------------------------------------
-    def reset(self):
+    def _getBounds(self):
 
-        self._curChunkLoc = (0, 0)
-        self._complete = False
+        if self._bounds:
+            return self._bounds
+
+        return (0,
+                0,
+                self._imageFile.getDataset().RasterXSize,
+                self._imageFile.getDataset().RasterYSize)
 
     # -------------------------------------------------------------------------
-    # setChunkAsColumn
+    # _getBufferSize
+    #
+    # This is the size, (x, y), of a window read at the chunk resolution.
     # -------------------------------------------------------------------------
-    def setChunkAsColumn(self):
+    def _getBufferSize(self, xLen, yLen):
 
-        self.setChunkSize(1, self._imageFile.getDataset().RasterYSize)
+        if self._resolution == 1:
+            return (xLen, yLen)
+
+        return (max(1, int(round(xLen / self._resolution))),
+                max(1, int(round(yLen / self._resolution))))
 
     # -------------------------------------------------------------------------
-    # setChunkAsRow
+    # getChunkBytes
+    #
+    # This is the peak memory, in bytes, used by one full chunk, including its
+    # halo.  Chunks are read directly into their layout, so a read needs one
+    # buffer.  Code that processes a chunk usually allocates a second buffer of
+    # the same size, so includeCopy counts it, too.  Set includeCopy to False
+    # to count only the chunk.  bands is a list of band numbers, as for
+    # setBands(), and defaults to the selected bands.
     # -------------------------------------------------------------------------
-    def setChunkAsRow(self):
+    def getChunkBytes(self, bands=None, includeCopy=True):
 
-        self.setChunkSize(self._imageFile.getDataset().RasterXSize, 1)
+        return self._getPaddedChunkPixels() * \
+            self._getBytesPerPixel(bands, includeCopy)
 
     # -------------------------------------------------------------------------
-    # setChunkToImage
+    # _getBytesPerPixel
     # -------------------------------------------------------------------------
-    def setChunkToImage(self):
+    def _getBytesPerPixel(self, bands=None, includeCopy=True):
 
-        self.setChunkSize(self._imageFile.getDataset().RasterXSize,
-                          self._imageFile.getDataset().RasterYSize)
+        dataset = self._imageFile.getDataset()
+        numBands = len(bands) if bands else self._getNumBands()
+
+        dataTypeBytes = \
+            gdal.GetDataTypeSize(dataset.GetRasterBand(1).DataType) // 8
+
+        copies = 2 if includeCopy else 1
+
+        return dataTypeBytes * numBands * copies
 
     # -------------------------------------------------------------------------
-    # setChunkSize
+    # _getDataType
     # -------------------------------------------------------------------------
-    def setChunkSize(self, _xSize, _ySize):
+    def _getDataType(self, imageFile=None):
 
-        if _xSize < 1:
-            raise RuntimeError('The sample size of a chunk must be greater ' +
-                               'than zero.')
+        imageFile = imageFile or self._imageFile
 
-        if _xSize > self._imageFile.getDataset().RasterXSize:
+        return gdal_array.GDALTypeCodeToNumericTypeCode(
+            imageFile.getDataset().GetRasterBand(1).DataType)
 
-            raise RuntimeError('Sample size, ' +
-                               str(_xSize) +
-                               ', must be less than or equal to the image ' +
-                               'sample size, ' +
-                               str(self._imageFile.getDataset().RasterXSize))
+    # -------------------------------------------------------------------------
+    # _getPaddedChunkPixels
+    # -------------------------------------------------------------------------
+    def _getPaddedChunkPixels(self):
 
-        if _ySize < 1:
-            raise RuntimeError('The line size of a chunk must be greater ' +
+        return (self._xSize + 2 * self._halo) * (self._ySize + 2 * self._halo)
+
+    # -------------------------------------------------------------------------
+    # _getPrefetchedChunk
+    #
+    # Chunks arrive in getChunk() order.  If the caller jumps elsewhere by
+    # passing xStart and yStart, prefetching restarts from the new window.
+    # -------------------------------------------------------------------------
+    def _getPrefetchedChunk(self, window):
+
+        for attempt in range(2):
+
+            if not self._prefetchThread:
+                self._startPrefetch(window[0], window[1])
+
+            item = self._prefetchQueue.get()
+
+            if isinstance(item, Exception):
+
+                self._stopPrefetch()
+                raise item
+
+            if item and item[0] == window:
+                return item[1]
+
+            self._stopPrefetch()
+
+        raise RuntimeError('Prefetching did not produce the chunk at ' +
+                           str(window[:2]) + '.')
+
+    # -------------------------------------------------------------------------
+    # getChunkPlan
+    # -------------------------------------------------------------------------
+    def getChunkPlan(self):
+
+        return ChunkPlan(self._imageFile.getDataset().RasterXSize,
+                         self._imageFile.getDataset().RasterYSize,
+                         self._xSize,
+                         self._ySize,
+                         self._bounds)
+
+    # -------------------------------------------------------------------------
+    # _getPlanWindows
+    #
+    # This generates the windows of the given chunk numbers of the plan, or
+    # of every chunk in the region.
+    # -------------------------------------------------------------------------
+    def _getPlanWindows(self, indices=None):
+
+        plan = self.getChunkPlan()
+
+        if indices is None:
+            indices = self._getRegionIndices(plan)
+
+        # None means no region, so use every chunk; an empty list means the
+        # region hits no chunks.
+        if indices is None:
+            indices = range(len(plan))
+
+        return (plan[index] for index in indices)
+
+    # -------------------------------------------------------------------------
+    # getImageFile
+    # -------------------------------------------------------------------------
+    def getImageFile(self):
+
+        return self._imageFile
+
+    # -------------------------------------------------------------------------
+    # getRegionMask
+    #
+    # This rasterizes the region's polygon over the chunk at loc, including
+    # its halo.  The mask is True for pixels whose centers are inside the
+    # region, in the chunk's layout: (x, y), or (y, x) for LAYOUT_BYX.
+    # -------------------------------------------------------------------------
+    def getRegionMask(self, loc):
+
+        if self._region is None:
+            raise RuntimeError('There is no region to mask.')
+
+        xFirst, yFirst, xRegion, yRegion = self._getBounds()
+
+        xStart, yStart, xLen, yLen = self._padWindow(
+            self._imageFile,
+            loc[0],
+            loc[1],
+            min(self._xSize, xFirst + xRegion - loc[0]),
+            min(self._ySize, yFirst + yRegion - loc[1]))
+
+        # The mask has the chunk's resolution.
+        xBuf, yBuf = self._getBufferSize(xLen, yLen)
+        xScale = xLen / xBuf
+        yScale = yLen / yBuf
+        xform = self._imageFile.getDataset().GetGeoTransform()
+        xUpperLeft, yUpperLeft = gdal.ApplyGeoTransform(xform, xStart, yStart)
+
+        raster = gdal.GetDriverByName('MEM').Create('',
+                                                    xBuf,
+                                                    yBuf,
+                                                    1,
+                                                    gdal.GDT_Byte)
+
+        raster.SetGeoTransform((xUpperLeft,
+                                xform[1] * xScale,
+                                xform[2] * yScale,
+                                yUpperLeft,
+                                xform[4] * xScale,
+                                xform[5] * yScale))
+
+        # OGR layers are not thread safe.
+        with self._regionLock:
+
+            gdal.RasterizeLayer(raster,
+                                [1],
+                                self._regionSource.GetLayer(0),
+                                burn_values=[1])
+
+        mask = raster.ReadAsArray().astype(bool)
+
+        return mask if self._layout == Chunker.LAYOUT_BYX else mask.T
+
+    # -------------------------------------------------------------------------
+    # _getRegionIndices
+    #
+    # These are the numbers of a plan's chunks within the region's polygon,
+    # or None when every chunk is.
+    # -------------------------------------------------------------------------
+    def _getRegionIndices(self, plan):
+
+        if self._region is None:
+            return None
+
+        return [index for index, window in enumerate(plan)
+                if self._intersectsRegion(window)]
+
+    # -------------------------------------------------------------------------
+    # getSkippedWindows
+    #
+    # These are the windows, (xStart, yStart, xLen, yLen), of the empty chunks
+    # skipped since the last reset(), so reducers can account for them.
+    # -------------------------------------------------------------------------
+    def getSkippedWindows(self):
+
+        return list(self._skippedWindows)
+
+    # -------------------------------------------------------------------------
+    # getInnerChunk
+    #
+    # This is the part of a chunk, or of a result computed from it in the same
+    # layout, that excludes the halo.  It is a view, not a copy.
+    # -------------------------------------------------------------------------
+    def getInnerChunk(self, loc, chunk):
+
+        return chunk[self.getInnerSlices(loc)]
+
+    # -------------------------------------------------------------------------
+    # getInnerSlices
+    #
+    # This returns the slices that select the inner, non-overlapping region of
+    # the chunk at loc from its halo-padded array.  Inner regions tile the
+    # image without seams, so results can be written back at loc.
+    # -------------------------------------------------------------------------
+    def getInnerSlices(self, loc):
+
+        xSlice, ySlice = self._getInnerXYSlices(loc)
+
+        if self._layout == Chunker.LAYOUT_BXY:
+            return (slice(None), xSlice, ySlice)
+
+        if self._layout == Chunker.LAYOUT_BYX:
+            return (slice(None), ySlice, xSlice)
+
+        return (xSlice, ySlice)
+
+    # -------------------------------------------------------------------------
+    # _getInnerXYSlices
+    #
+    # These select the inner region of a padded chunk along x and y.
+    # -------------------------------------------------------------------------
+    def _getInnerXYSlices(self, loc):
+
+        xStart, yStart = loc
+        xFirst, yFirst, xRegion, yRegion = self._getBounds()
+        xLen = min(self._xSize, xFirst + xRegion - xStart)
+        yLen = min(self._ySize, yFirst + yRegion - yStart)
+        xOffset = xStart - max(0, xStart - self._halo)
+        yOffset = yStart - max(0, yStart - self._halo)
+
+        return (slice(xOffset, xOffset + xLen), slice(yOffset, yOffset + yLen))
+
+    # -------------------------------------------------------------------------
+    # _getNumBands
+    # -------------------------------------------------------------------------
+    def _getNumBands(self, imageFile=None):
+
+        imageFile = imageFile or self._imageFile
+
+        return len(self._bands) if self._bands else \
+            imageFile.getDataset().RasterCount
+
+    # -------------------------------------------------------------------------
+    # _startPrefetch
+    # -------------------------------------------------------------------------
+    def _startPrefetch(self, xFirst, yFirst):
+
+        self._prefetchQueue = queue.Queue(maxsize=self._prefetchDepth)
+        self._prefetchStop = threading.Event()
+
+        self._prefetchThread = threading.Thread(
+            target=Chunker._prefetch,
+            args=(weakref.ref(self),
+                  self._imageFile.fileName(),
+                  self._cache,
+                  self._pool,
+                  self._getChunkWindows(xFirst, yFirst),
+                  self._prefetchQueue,
+                  self._prefetchStop),
+            daemon=True)
+
+        self._prefetchThread.start()
+
+    # -------------------------------------------------------------------------
+    # _stopPrefetch
+    #
+    # This cancels prefetching, discarding chunks already read.
+    # -------------------------------------------------------------------------
+    def _stopPrefetch(self):
+
+        if not self._prefetchThread:
+            return
+
+        self._prefetchStop.set()
+        self._prefetchThread.join()
+        self._prefetchThread = None
+        self._prefetchQueue = None
+        self._prefetchStop = None
+
+    # -------------------------------------------------------------------------
+    # _windowIntersects
+    #
+    # This tests whether a window of pixels intersects a geometry in the
+    # image's SRS.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _windowIntersects(geometry, geoTransform, window):
+
+        xStart, yStart, xLen, yLen = window
+        ring = ogr.Geometry(ogr.wkbLinearRing)
+
+        for x, y in ((xStart, yStart),
+                     (xStart + xLen, yStart),
+                     (xStart + xLen, yStart + yLen),
+                     (xStart, yStart + yLen),
+                     (xStart, yStart)):
+
+            ring.AddPoint_2D(*gdal.ApplyGeoTransform(geoTransform, x, y))
+
+        polygon = ogr.Geometry(ogr.wkbPolygon)
+        polygon.AddGeometry(ring)
+
+        return geometry.Intersects(polygon)
+
+    # -------------------------------------------------------------------------
+    # _viewBuffer
+    #
+    # This views the front of a caller's buffer as an array of the given
+    # shape, without copying.
+    # -------------------------------------------------------------------------
+    def _viewBuffer(self, buf, shape, dataType):
+
+        numElements = int(np.prod(shape))
+
+        if buf.dtype != dataType:
+
+            raise RuntimeError('The buffer type, ' +
+                               str(buf.dtype) +
+                               ', must match the image type, ' +
+                               str(np.dtype(dataType)) +
+                               '.')
+
+        if not buf.flags['C_CONTIGUOUS']:
+            raise RuntimeError('The buffer must be C-contiguous.')
+
+        if buf.size < numElements:
+
+            raise RuntimeError('The buffer has ' +
+                               str(buf.size) +
+                               ' elements, but the chunk needs ' +
+                               str(numElements) +
+                               '.')
+
+        return buf.reshape(-1)[:numElements].reshape(shape)
+
+    # -------------------------------------------------------------------------
+    # _getChunkWindows
+    #
+    # This generates the window of each chunk, (xStart, yStart, xLen, yLen),
+    # in the same order that getChunk() steps through the image, starting at
+    # (xFirst, yFirst).  The generator does not refer to the Chunker, so
+    # background threads can use it without keeping the Chunker alive.
+    # -------------------------------------------------------------------------
+    def _getChunkWindows(self, xFirst=0, yFirst=0):
+
+        region = None
+
+        if self._region is not None:
+
+            region = (self._region,
+                      self._imageFile.getDataset().GetGeoTransform())
+
+        return Chunker._generateWindows(self._getBounds(),
+                                        self._xSize,
+                                        self._ySize,
+                                        xFirst,
+                                        yFirst,
+                                        region)
+
+    # -------------------------------------------------------------------------
+    # _generateWindows
+    #
+    # Region is a (geometry, geotransform) pair, whose windows outside the
+    # geometry are not generated.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _generateWindows(bounds, xSize, ySize, xFirst, yFirst, region=None):
+
+        xRegion = bounds[0]
+        xEnd = bounds[0] + bounds[2]
+        yEnd = bounds[1] + bounds[3]
+
+        for yStart in range(yFirst, yEnd, ySize):
+
+            yLen = min(ySize, yEnd - yStart)
+
+            for xStart in range(xFirst, xEnd, xSize):
+
+                window = (xStart, yStart, min(xSize, xEnd - xStart), yLen)
+
+                if not region or Chunker._windowIntersects(*region, window):
+                    yield window
+
+            xFirst = xRegion
+
+    # -------------------------------------------------------------------------
+    # _intersectsRegion
+    # -------------------------------------------------------------------------
+    def _intersectsRegion(self, window):
+
+        return Chunker._windowIntersects(
+            self._region,
+            self._imageFile.getDataset().GetGeoTransform(),
+            window)
+
+    # -------------------------------------------------------------------------
+    # isComplete
+    # -------------------------------------------------------------------------
+    def isComplete(self):
+        return self._complete
+
+    # -------------------------------------------------------------------------
+    # _isEmptyWindow
+    #
+    # This detects empty windows without reading them.  Sparse files report
+    # blocks that were never written through GDAL's data coverage status.
+    # Otherwise, the coarse no-data mask is used, when there is one.
+    # -------------------------------------------------------------------------
+    def _isEmptyWindow(self, imageFile, xStart, yStart, xLen, yLen):
+
+        dataset = imageFile.getDataset()
+        bands = self._bands or range(1, dataset.RasterCount + 1)
+
+        for band in bands:
+
+            flags, percent = dataset.GetRasterBand(band). \
+                GetDataCoverageStatus(xStart, yStart, xLen, yLen)
+
+            if flags != gdal.GDAL_DATA_COVERAGE_STATUS_EMPTY:
+                break
+
+        else:
+            return True
+
+        if self._coarseMask is None:
+            return False
+
+        yCoarse, xCoarse = self._coarseMask.shape
+        xImage = dataset.RasterXSize
+        yImage = dataset.RasterYSize
+        xFirst = xStart * xCoarse // xImage
+        yFirst = yStart * yCoarse // yImage
+        xLast = -(-(xStart + xLen) * xCoarse // xImage)
+        yLast = -(-(yStart + yLen) * yCoarse // yImage)
+
+        return not self._coarseMask[yFirst:yLast, xFirst:xLast].any()
+
+    # -------------------------------------------------------------------------
+    # _isNoData
+    #
+    # This tests whether every pixel of a (band, row, column) chunk is its
+    # band's no-data value.
+    # -------------------------------------------------------------------------
+    def _isNoData(self, gdalView):
+
+        if self._skipNoData is None:
+            return False
+
+        noData = np.array(self._skipNoData, dtype=float)[:, None, None]
+
+        return bool(np.all((gdalView == noData) |
+                           (np.isnan(noData) & np.isnan(gdalView))))
+
+    # -------------------------------------------------------------------------
+    # iterChunks
+    #
+    # This reads every chunk of the image on a pool of threads, yielding
+    # ((xStart, yStart), chunk) pairs.  GDAL datasets cannot be shared across
+    # threads, so each thread opens its own ImageFile.  GDAL releases the GIL
+    # while it reads, so decompression overlaps across cores.  When ordered is
+    # True, chunks are yielded in the order getChunk() produces them;
+    # otherwise, they are yielded as they finish.  At most two chunks per
+    # worker are in flight, so memory is bounded regardless of the image size.
+    # This does not move the getChunk() cursor.  Indices limits the chunks to
+    # those chunk numbers of getChunkPlan(), which otherwise defaults to those
+    # within the region.  Skipped empty chunks are not yielded.
+    # -------------------------------------------------------------------------
+    def iterChunks(self, workers=1, ordered=False, indices=None):
+
+        if workers < 1:
+            raise RuntimeError('The number of workers must be greater ' +
                                'than zero.')
 
-        if _ySize > self._imageFile.getDataset().RasterYSize:
+        windows = self._getPlanWindows(indices)
+        threadState = threading.local()
+        executor = ThreadPoolExecutor(max_workers=workers)
 
-            raise RuntimeError('Line size, ' +
-                               str(_ySize) +
-                               ', must be less than or equal to the image ' +
-                               'line size, ' +
-                               str(self._imageFile.getDataset().RasterYSize))
+        def submit(window):
+            return executor.submit(self._readChunkOnThread,
+                                   threadState,
+                                   window)
 
-        self._xSize = _xSize
-        self._ySize = _ySize
+        try:
+            pending = deque(submit(window) for window in
+                            itertools.islice(windows, 2 * workers))
+
+            while pending:
+
+                if ordered:
+                    finished = [pending.popleft()]
+
+                else:
+
+                    finished = wait(pending, return_when=FIRST_COMPLETED).done
+                    pending = deque(f for f in pending if f not in finished)
+
+                # Keep the workers busy while the caller handles this chunk.
+                for future in finished:
+
+                    window = next(windows, None)
+
+                    if window:
+                        pending.append(submit(window))
+
+                    loc, chunk = future.result()
+
+                    if chunk is not None:
+                        yield (loc, chunk)
+
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    # -------------------------------------------------------------------------
+    # processMap
+    #
+    # This applies func(loc, chunk) to every chunk on a pool of processes, for
+    # CPU-bound Python code that threads cannot run in parallel.  func must
+    # return an (x, y) array the size of the chunk's window, or of the whole
+    # padded chunk when there is a halo.  Each process opens the image itself
+    # and computes its windows from the chunk plan, and it writes results
+    # directly into a shared-memory output array, so no pixels are pickled in
+    # either direction.  func must be defined at module level so it can be
+    # sent to the processes.  The (x, y) output of dataType, defaulting to the
+    # image's type, is returned as an ordinary array.  Skipped empty chunks
+    # are left as zeros.
+    # -------------------------------------------------------------------------
+    def processMap(self, func, workers=None, dataType=None, batchSize=None):
+
+        if self._resolution != 1:
+
+            raise RuntimeError('processMap() requires full resolution ' +
+                               'chunks.')
+
+        workers = workers or multiprocessing.cpu_count()
+        plan = self.getChunkPlan()
+        dataType = np.dtype(dataType or self._getDataType())
+        shape = plan.imageSize()
+
+        indices = self._getRegionIndices(plan)
+        numChunks = len(plan) if indices is None else len(indices)
+
+        batchSize = batchSize or \
+            max(1, numChunks // (workers * Chunker.DEFAULT_TASKS_PER_PROCESS))
+
+        if indices is None:
+            batches = plan.batches(batchSize)
+
+        else:
+
+            batches = [indices[start:start + batchSize]
+                       for start in range(0, numChunks, batchSize)]
+
+        sharedOutput = shared_memory.SharedMemory(
+            create=True,
+            size=max(1, int(np.prod(shape)) * dataType.itemsize))
+
+        try:
+            initArgs = (self._imageFile.fileName(),
+                        self._xSize,
+                        self._ySize,
+                        self._bands,
+                        self._layout,
+                        self._halo,
+                        self._bounds,
+                        (self._skipEmpty, self._skipNoData, self._coarseMask),
+                        func,
+                        sharedOutput.name,
+                        dataType.str)
+
+            with multiprocessing.Pool(workers,
+                                      initializer=Chunker._initProcess,
+                                      initargs=initArgs) as pool:
+
+                # Wait for every batch, raising any process's exception.
+                for result in pool.imap_unordered(Chunker._mapProcessBatch,
+                                                  batches):
+                    pass
+
+            output = np.ndarray(shape,
+                                dtype=dataType,
+                                buffer=sharedOutput.buf).copy()
+
+        finally:
+
+            sharedOutput.close()
+            sharedOutput.unlink()
+
+        return output
+
+    # -------------------------------------------------------------------------
+    # _initProcess
+    #
+    # This runs once in each processMap() worker process.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _initProcess(imageFileName, xSize, ySize, bands, layout, halo,
+                     bounds, skipState, func, sharedOutputName, dataType):
+
+        chunker = Chunker(imageFileName)
+        chunker._setChunkSize(xSize, ySize)
+        chunker.setBands(bands)
+        chunker.setLayout(layout)
+        chunker.setHalo(halo)
+        chunker._bounds = bounds
+
+        # The skipping state is copied, rather than computed again.
+        chunker._skipEmpty, chunker._skipNoData, chunker._coarseMask = \
+            skipState
+
+        Chunker._processState = {'chunker': chunker,
+                                 'func': func,
+                                 'plan': chunker.getChunkPlan(),
+                                 'sharedOutputName': sharedOutputName,
+                                 'dataType': np.dtype(dataType)}
+
+    # -------------------------------------------------------------------------
+    # _mapProcessBatch
+    #
+    # The output is attached for each batch, and closed after it, because
+    # pool processes are terminated without running exit handlers.  Only the
+    # parent process, which created the output, unlinks it.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _mapProcessBatch(indices):
+
+        state = Chunker._processState
+        chunker = state['chunker']
+        plan = state['plan']
+
+        try:
+            # Python 3.13 can attach without registering with the tracker.
+            sharedOutput = shared_memory.SharedMemory(
+                name=state['sharedOutputName'],
+                track=False)
+
+        except TypeError:
+
+            sharedOutput = shared_memory.SharedMemory(
+                name=state['sharedOutputName'])
+
+        try:
+            output = np.ndarray(plan.imageSize(),
+                                dtype=state['dataType'],
+                                buffer=sharedOutput.buf)
+
+            for index in indices:
+
+                window = plan[index]
+                xStart, yStart, xLen, yLen = window
+                loc = (xStart, yStart)
+                chunk = chunker.readWindow(*window)
+
+                if chunk is None:
+                    continue
+
+                result = state['func'](loc, chunk)
+
+                if chunker._halo:
+                    result = result[chunker._getInnerXYSlices(loc)]
+
+                output[xStart:xStart + xLen, yStart:yStart + yLen] = result
+
+        finally:
+
+            # The buffer cannot be closed while an array uses it.
+            output = None
+            sharedOutput.close()
+
+        return len(indices)
+
+    # -------------------------------------------------------------------------
+    # readWindow
+    #
+    # This reads one chunk at any window, such as one from a ChunkPlan, using
+    # the Chunker's bands, layout and halo.  It does not move the getChunk()
+    # cursor.  See getChunk() for out.  When empty chunks are skipped, empty
+    # windows return None.
+    # -------------------------------------------------------------------------
+    def readWindow(self, xStart, yStart, xLen, yLen, out=None):
+
+        return self._readChunk(self._imageFile,
+                               xStart,
+                               yStart,
+                               xLen,
+                               yLen,
+                               out)
+
+    # -------------------------------------------------------------------------
+    # _readChunk
+    #
+    # This reads all the chunk's bands in one call.  The chunk is allocated in
+    # its final layout, or taken from out, and GDAL writes into a
+    # (band, row, column) view of it, so no transposed copy is made.  The
+    # window is padded by the halo, clipped at the image edges.  When empty
+    # chunks are skipped, None is returned for them.
+    # -------------------------------------------------------------------------
+    def _readChunk(self, imageFile, xStart, yStart, xLen, yLen, out=None):
+
+        xStart, yStart, xLen, yLen = \
+            self._padWindow(imageFile, xStart, yStart, xLen, yLen)
+
+        xBuf, yBuf = self._getBufferSize(xLen, yLen)
+
+        if self._skipEmpty and \
+           self._isEmptyWindow(imageFile, xStart, yStart, xLen, yLen):
+
+            return None
+
+        numBands = self._getNumBands(imageFile)
+        dataType = self._getDataType(imageFile)
+
+        def allocate(shape):
+
+            if out is None:
+                return np.empty(shape, dtype=dataType)
+
+            return self._viewBuffer(out, shape, dataType)
+
+        if self._layout == Chunker.LAYOUT_BXY:
+
+            chunk = allocate((numBands, xBuf, yBuf))
+            gdalView = chunk.transpose(0, 2, 1)
+
+        elif self._layout == Chunker.LAYOUT_BYX:
+
+            chunk = allocate((numBands, yBuf, xBuf))
+            gdalView = chunk
+
+        else:
+
+            chunk = allocate((xBuf, yBuf, numBands))
+            gdalView = chunk.transpose(2, 1, 0)
+
+        bufSize = None if self._resolution == 1 else (xBuf, yBuf)
+
+        imageFile.readWindow(xStart,
+                             yStart,
+                             xLen,
+                             yLen,
+                             bands=self._bands,
+                             out=gdalView,
+                             bufSize=bufSize,
+                             resampling=self._resampling)
+
+        if self._skipEmpty and self._isNoData(gdalView):
+            return None
+
+        # The original layout is (x, y) for a single band.
+        if self._layout == Chunker.LAYOUT_XYB and numBands == 1:
+            chunk = chunk[:, :, 0]
+
+        return chunk
+
+    # -------------------------------------------------------------------------
+    # _prefetch
+    #
+    # This runs on the prefetch thread, reading windows into a bounded queue.
+    # It holds only a weak reference to the Chunker, so it ends when the
+    # Chunker is discarded, as well as when stop is set.  A None marks the
+    # last window, and an exception is passed to the consumer to raise.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _prefetch(chunkerRef, imageFileName, cache, pool, windows,
+                  prefetchQueue, stop):
+
+        def put(item):
+
+            while not stop.is_set() and chunkerRef():
+
+                try:
+                    prefetchQueue.put(item, timeout=0.1)
+                    return True
+
+                except queue.Full:
+                    pass
+
+            return False
+
+        try:
+            imageFile = ImageFile(imageFileName, readOnly=True, pool=pool)
+            imageFile.setCache(cache)
+
+            for window in windows:
+
+                chunker = chunkerRef()
+
+                if stop.is_set() or not chunker:
+                    return
+
+                chunk = chunker._readChunk(imageFile, *window)
+                del chunker
+
+                if not put((window, chunk)):
+                    return
+
+            put(None)
+
+        except Exception as e:
+            put(e)
+
+    # -------------------------------------------------------------------------
+    # _padWindow
+    #
+    # This pads a window by the halo, clipped at the image edges.
+    # -------------------------------------------------------------------------
+    def _padWindow(self, imageFile, xStart, yStart, xLen, yLen):
+
+        if not self._halo:
+            return (xStart, yStart, xLen, yLen)
+
+        xImage = imageFile.getDataset().RasterXSize
+        yImage = imageFile.getDataset().RasterYSize
+        xEnd = min(xImage, xStart + xLen + self._halo)
+        yEnd = min(yImage, yStart + yLen + self._halo)
+        xStart = max(0, xStart - self._halo)
+        yStart = max(0, yStart - self._halo)
+
+        return (xStart, yStart, xEnd - xStart, yEnd - yStart)
+
+    # -------------------------------------------------------------------------
+    # _readChunkOnThread
+    #
+    # This reads a window using the calling thread's own dataset, opening it
+    # on the thread's first read.
+    # -------------------------------------------------------------------------
+    def _readChunkOnThread(self, threadState, window):
+
+        if not hasattr(threadState, 'imageFile'):
+
+            threadState.imageFile = ImageFile(self._imageFile.fileName(),
+                                              readOnly=True,
+                                              pool=self._pool)
+
+            threadState.imageFile.setCache(self._cache)
+
+        xStart, yStart, xLen, yLen = window
+
+        chunk = self._readChunk(threadState.imageFile,
+                                xStart,
+                                yStart,
+                                xLen,
+                                yLen)
+
+        if chunk is None:
+            self._skippedWindows.append(window)
+
+        return ((xStart, yStart), chunk)
+
+    # -------------------------------------------------------------------------
+    # _nextRingBuffer
+    #
+    # Each buffer holds a full chunk of the selected bands.  Buffers are
+    # allocated on first use and reallocated when the chunk outgrows them.
+    # -------------------------------------------------------------------------
+    def _nextRingBuffer(self):
+
+        numElements = self._getPaddedChunkPixels() * self._getNumBands()
+        dataType = np.dtype(self._getDataType())
+        index = self._bufferRingIndex
+        self._bufferRingIndex = (index + 1) % self._bufferRingSize
+
+        if index >= len(self._bufferRing):
+            self._bufferRing.append(None)
+
+        buf = self._bufferRing[index]
+
+        if buf is None or buf.size < numElements or buf.dtype != dataType:
+
+            buf = np.empty(numElements, dtype=dataType)
+            self._bufferRing[index] = buf
+
+        return buf
+
+    # -------------------------------------------------------------------------
+    # reset
+    # -------------------------------------------------------------------------
+    def reset(self):
+
+        self._stopPrefetch()
+        self._curChunkLoc = self._getBounds()[:2]
+        self._complete = False
+        self._skippedWindows = []
+
+    # -------------------------------------------------------------------------
+    # setBands
+    #
+    # This selects the bands to read, numbered from 1 as in GDAL.  The chunk's
+    # bands are in the order listed.  None selects all bands.  When empty
+    # chunks are skipped, their no-data values and coarse mask are computed
+    # again for the new bands.
+    # -------------------------------------------------------------------------
+    def setBands(self, bands=None):
+
+        if bands is not None:
+
+            bands = [int(band) for band in bands]
+            numBands = self._imageFile.getDataset().RasterCount
+
+            if not bands:
+                raise RuntimeError('At least one band must be selected.')
+
+            for band in bands:
+
+                if band < 1 or band > numBands:
+
+                    raise RuntimeError('Band ' +
+                                       str(band) +
+                                       ' must be between 1 and ' +
+                                       str(numBands) +
+                                       '.')
+
+        self._stopPrefetch()
+        self._bands = bands
+
+        if self._skipEmpty:
+
+            self.setSkipEmpty(noDataValue=self._skipNoDataValue,
+                              useOverview=self._skipUseOverview)
+
+    # -------------------------------------------------------------------------
+    # setBufferRing
+    #
+    # This makes getChunk() read into a ring of size preallocated buffers,
+    # instead of allocating each chunk.  A chunk's buffer is reused size reads
+    # later, so callers may hold on to, at most, the last size chunks.  Zero
+    # turns the ring off.
+    # -------------------------------------------------------------------------
+    def setBufferRing(self, size):
+
+        if size < 0:
+            raise RuntimeError('The buffer ring size cannot be negative.')
+
+        self._bufferRing = []
+        self._bufferRingSize = size
+        self._bufferRingIndex = 0
+
+    # -------------------------------------------------------------------------
+    # setPrefetch
+    #
+    # This makes getChunk() read up to depth chunks ahead on a background
+    # thread, so the disk stays busy while the caller processes a chunk.
+    # Prefetched chunks are always newly allocated, so the buffer ring is not
+    # used while prefetching.  Zero turns prefetching off.
+    # -------------------------------------------------------------------------
+    def setPrefetch(self, depth):
+
+        if depth < 0:
+            raise RuntimeError('The prefetch depth cannot be negative.')
+
+        self._stopPrefetch()
+        self._prefetchDepth = depth
+
+    # -------------------------------------------------------------------------
+    # setSkipEmpty
+    #
+    # This skips chunks with no data.  Blocks never written to sparse files
+    # are detected without reading them.  Otherwise, a chunk is read, and it
+    # is skipped when every pixel is its band's no-data value.  noDataValue
+    # overrides the bands' own no-data values.
+    #
+    # With useOverview, a coarse no-data mask of the whole image is read once,
+    # from overviews when the file has them, and chunks it shows to be empty
+    # are skipped without reading them.  The mask is averaged from the pixels,
+    # so it is approximate: a chunk whose only valid pixels average to the
+    # no-data value would be skipped.
+    # -------------------------------------------------------------------------
+    def setSkipEmpty(self, skip=True, noDataValue=None, useOverview=False):
+
+        self._stopPrefetch()
+        self._skipEmpty = skip
+        self._skipNoData = None
+        self._skipNoDataValue = noDataValue
+        self._skipUseOverview = useOverview
+        self._coarseMask = None
+
+        if not skip:
+            return
+
+        dataset = self._imageFile.getDataset()
+        bands = self._bands or list(range(1, dataset.RasterCount + 1))
+
+        noData = [noDataValue if noDataValue is not None else
+                  dataset.GetRasterBand(band).GetNoDataValue()
+                  for band in bands]
+
+        if None not in noData:
+            self._skipNoData = noData
+
+        if not useOverview:
+            return
+
+        if self._skipNoData is None:
+
+            raise RuntimeError('A no-data value is required to skip ' +
+                               'chunks using overviews.')
+
+        xImage = dataset.RasterXSize
+        yImage = dataset.RasterYSize
+        scale = -(-max(xImage, yImage) // Chunker.COARSE_MASK_SIZE)
+
+        coarse = dataset.ReadAsArray(0,
+                                     0,
+                                     xImage,
+                                     yImage,
+                                     buf_xsize=-(-xImage // scale),
+                                     buf_ysize=-(-yImage // scale),
+                                     resample_alg=gdalconst.GRIORA_Average,
+                                     band_list=bands)
+
+        coarse = coarse.reshape((len(bands),) + coarse.shape[-2:])
+
+        self._coarseMask = np.zeros(coarse.shape[1:], dtype=bool)
+
+        for band in range(len(bands)):
+
+            noDataBand = self._skipNoData[band]
+
+            self._coarseMask |= ~((coarse[band] == noDataBand) |
+                                  (np.isnan(noDataBand) &
+                                   np.isnan(coarse[band])))
+
+    # -------------------------------------------------------------------------
+    # setCache
+    #
+    # This keeps decoded windows in a ChunkCache, like ChunkCache.getDefault(),
+    # so passes after the first read them from memory.  None stops caching.
+    # The cache applies to reads in this process, including iterChunks() and
+    # prefetching, but not to processMap().
+    # -------------------------------------------------------------------------
+    def setCache(self, cache=None):
+
+        self._stopPrefetch()
+        self._cache = cache
+        self._imageFile.setCache(cache)
+
+    # -------------------------------------------------------------------------
+    # setPool
+    #
+    # This borrows datasets from a DatasetPool, like DatasetPool.getDefault(),
+    # for this Chunker's image, the iterChunks() and aiter() threads and
+    # prefetching.  Their handles return to the pool for reuse, so repeated
+    # passes and other Chunkers of the file do not reopen it.  None stops
+    # pooling.  Each processMap() worker opens the image once, so it does not
+    # use the pool.
+    # -------------------------------------------------------------------------
+    def setPool(self, pool=None):
+
+        self._stopPrefetch()
+        self._pool = pool
+        self._imageFile.setPool(pool)
+
+    # -------------------------------------------------------------------------
+    # setRegion
+    #
+    # This limits chunks to those intersecting a region of interest, given as
+    # an Envelope or an OGR polygon with a spatial reference.  The region is
+    # transformed to the image's SRS, and chunks step through its bounding
+    # window of pixels, starting at its upper left.  Chunks within the window
+    # but outside the polygon are not read.  getRegionMask() masks each chunk
+    # to the polygon.  None restores the whole image.  This resets the
+    # Chunker.
+    # -------------------------------------------------------------------------
+    def setRegion(self, region=None):
+
+        self._bounds = None
+        self._region = None
+        self._regionSource = None
+        self.reset()
+
+        if region is None:
+            return
+
+        dataset = self._imageFile.getDataset()
+        imageSrs = dataset.GetSpatialRef()
+
+        if not imageSrs:
+
+            raise RuntimeError(self._imageFile.fileName() +
+                               ' has no spatial reference, so a region ' +
+                               'cannot be located in it.')
+
+        if isinstance(region, Envelope):
+
+            ring = ogr.Geometry(ogr.wkbLinearRing)
+
+            for x, y in ((region.ulx(), region.uly()),
+                         (region.lrx(), region.uly()),
+                         (region.lrx(), region.lry()),
+                         (region.ulx(), region.lry()),
+                         (region.ulx(), region.uly())):
+
+                ring.AddPoint_2D(x, y)
+
+            geometry = ogr.Geometry(ogr.wkbPolygon)
+            geometry.AddGeometry(ring)
+            geometry.AssignSpatialReference(region.GetSpatialReference())
+
+        else:
+            geometry = region.Clone()
+
+        regionSrs = geometry.GetSpatialReference()
+
+        if regionSrs and not regionSrs.IsSame(imageSrs):
+
+            # Densify the edges, so they stay accurate once transformed.
+            minX, maxX, minY, maxY = geometry.GetEnvelope()
+
+            geometry.Segmentize(max(maxX - minX, maxY - minY) /
+                                Chunker.REGION_SEGMENTS)
+
+            regionSrs = regionSrs.Clone()
+            regionSrs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+            imageSrs = imageSrs.Clone()
+            imageSrs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+            geometry.Transform(osr.CoordinateTransformation(regionSrs,
+                                                            imageSrs))
+
+            geometry.AssignSpatialReference(imageSrs)
+
+        # Find the pixel window bounding the region.
+        inverse = gdal.InvGeoTransform(dataset.GetGeoTransform())
+        minX, maxX, minY, maxY = geometry.GetEnvelope()
+
+        corners = [gdal.ApplyGeoTransform(inverse, x, y)
+                   for x in (minX, maxX) for y in (minY, maxY)]
+
+        xStart = max(0, math.floor(min(c[0] for c in corners)))
+        yStart = max(0, math.floor(min(c[1] for c in corners)))
+        xEnd = min(dataset.RasterXSize, math.ceil(max(c[0] for c in corners)))
+        yEnd = min(dataset.RasterYSize, math.ceil(max(c[1] for c in corners)))
+
+        if xStart >= xEnd or yStart >= yEnd:
+
+            raise RuntimeError('The region does not intersect ' +
+                               self._imageFile.fileName() +
+                               '.')
+
+        self._bounds = (xStart, yStart, xEnd - xStart, yEnd - yStart)
+        self._setRegionGeometry(geometry)
+        self.reset()
+
+    # -------------------------------------------------------------------------
+    # _setRegionGeometry
+    #
+    # The geometry is in the image's SRS.
+    # -------------------------------------------------------------------------
+    def _setRegionGeometry(self, geometry):
+
+        # Keep the polygon in a layer, for rasterizing masks.
+        source = ogr.GetDriverByName('Memory').CreateDataSource('')
+
+        layer = source.CreateLayer('region',
+                                   geometry.GetSpatialReference(),
+                                   geometry.GetGeometryType())
+
+        feature = ogr.Feature(layer.GetLayerDefn())
+        feature.SetGeometry(geometry)
+        layer.CreateFeature(feature)
+
+        self._region = geometry
+        self._regionSource = source
+
+    # -------------------------------------------------------------------------
+    # setResolution
+    #
+    # This reads chunks at a reduced resolution, factor times coarser along
+    # each axis, or at the resolution of one of the image's overviews,
+    # numbered from 0.  Chunk locations remain in full-resolution pixels, but
+    # each chunk is its window decimated by GDAL, which reads from the best
+    # overview when the file has them, so a factor of four costs roughly a
+    # sixteenth of the I/O.  Resampling is a GDAL GRIORA_ algorithm.  A factor
+    # of one restores full resolution.  Halos and processMap() are only
+    # available at full resolution.
+    # -------------------------------------------------------------------------
+    def setResolution(self,
+                      factor=1,
+                      overview=None,
+                      resampling=gdalconst.GRIORA_NearestNeighbour):
+
+        if overview is not None:
+
+            band = self._imageFile.getDataset().GetRasterBand(1)
+
+            if not 0 <= overview < band.GetOverviewCount():
+
+                raise RuntimeError(self._imageFile.fileName() +
+                                   ' has no overview ' +
+                                   str(overview) +
+                                   '.')
+
+            factor = band.XSize / band.GetOverview(overview).XSize
+
+        if factor < 1:
+            raise RuntimeError('The resolution factor must be at least one.')
+
+        if factor != 1 and self._halo:
+
+            raise RuntimeError('A halo cannot be used with a reduced ' +
+                               'resolution.')
+
+        self._stopPrefetch()
+        self._resolution = factor
+        self._resampling = resampling
+
+    # -------------------------------------------------------------------------
+    # setChunkAsColumn
+    # -------------------------------------------------------------------------
+    def setChunkAsColumn(self):
+
+        self._setChunkSize(1, self._imageFile.getDataset().RasterYSize)
+
+    # -------------------------------------------------------------------------
+    # setChunkAsRow
+    # -------------------------------------------------------------------------
+    def setChunkAsRow(self):
+
+        self._setChunkSize(self._imageFile.getDataset().RasterXSize, 1)
+
+    # -------------------------------------------------------------------------
+    # setChunkToImage
+    # -------------------------------------------------------------------------
+    def setChunkToImage(self):
+
+        self._setChunkSize(self._imageFile.getDataset().RasterXSize,
+                           self._imageFile.getDataset().RasterYSize)
+
+    # -------------------------------------------------------------------------
+    # setChunkToBlocks
+    #
+    # This sets the chunk size to a whole multiple of the raster's block size,
+    # so no compressed block is decompressed more than once.  When multiple is
+    # None, the largest multiple whose chunk fits within maxPixels is chosen.
+    # Chunks never exceed the image dimensions.
+    # -------------------------------------------------------------------------
+    def setChunkToBlocks(self, multiple=None, maxPixels=DEFAULT_CHUNK_PIXELS):
+
+        xImage = self._imageFile.getDataset().RasterXSize
+        yImage = self._imageFile.getDataset().RasterYSize
+        xBlock, yBlock = self.getBlockSize()
+
+        def blockChunk(k):
+            return min(k * xBlock, xImage), min(k * yBlock, yImage)
+
+        if multiple is None:
+
+            multiple = 1
+
+            while True:
+
+                xSize, ySize = blockChunk(multiple + 1)
+
+                if xSize * ySize > maxPixels or \
+                   (xSize, ySize) == blockChunk(multiple):
+
+                    break
+
+                multiple += 1
+
+        if multiple < 1:
+            raise RuntimeError('The block multiple must be greater than ' +
+                               'zero.')
+
+        self._setChunkSize(*blockChunk(multiple))
+
+    # -------------------------------------------------------------------------
+    # setChunkSizeForMemory
+    #
+    # This sets the largest block-aligned chunk whose peak memory, as
+    # reported by getChunkBytes(), fits within maxBytes.  Whole block rows are
+    # preferred because they read the raster sequentially.  If even a single
+    # block exceeds the budget, the chunk is the largest part of one block
+    # that fits.  Set the halo first; the block-aligned size is reduced until
+    # the padded chunk fits.  See getChunkBytes() for bands.
+    # -------------------------------------------------------------------------
+    def setChunkSizeForMemory(self, maxBytes, bands=None, includeCopy=True):
+
+        maxPixels = maxBytes // self._getBytesPerPixel(bands, includeCopy)
+
+        if maxPixels < 1:
+
+            raise RuntimeError('The memory budget, ' +
+                               str(maxBytes) +
+                               ' bytes, is too small for a single pixel.')
+
+        xImage = self._imageFile.getDataset().RasterXSize
+        yImage = self._imageFile.getDataset().RasterYSize
+        xBlock, yBlock = self.getBlockSize()
+        xBlock = min(xBlock, xImage)
+        yBlock = min(yBlock, yImage)
+
+        halo = 2 * self._halo
+
+        def fits(xSize, ySize):
+
+            return min(xSize + halo, xImage) * \
+                min(ySize + halo, yImage) <= maxPixels
+
+        if fits(xImage, yBlock):
+
+            # Full-width chunks, as many block rows tall as fit.
+            xSize = xImage
+            ySize = yBlock
+
+            while ySize < yImage and fits(xSize, ySize + yBlock):
+                ySize = min(ySize + yBlock, yImage)
+
+        elif fits(xBlock, yBlock):
+
+            # One block row tall, as many blocks wide as fit.
+            xSize = xBlock
+            ySize = yBlock
+
+            while fits(xSize + xBlock, ySize):
+                xSize += xBlock
+
+        else:
+
+            # Part of one block.
+            xSize = min(xBlock, max(1, maxPixels // (1 + halo) - halo))
+
+            ySize = min(yBlock,
+                        max(1, maxPixels // min(xSize + halo, xImage) - halo))
+
+            if not fits(xSize, ySize):
+
+                raise RuntimeError('The memory budget, ' +
+                                   str(maxBytes) +
+                                   ' bytes, is too small for a chunk ' +
+                                   'with a halo of ' +
+                                   str(self._halo) +
+                                   ' pixels.')
+
+        self._setChunkSize(xSize, ySize)
+
+    # -------------------------------------------------------------------------
+    # setHalo
+    #
+    # This pads each chunk by halo pixels on every side, clipped at the image
+    # edges, for focal operations that need neighboring pixels.  Chunk
+    # locations still refer to the inner, non-overlapping regions.  Use
+    # getInnerChunk() or getInnerSlices() to remove the halo.
+    # -------------------------------------------------------------------------
+    def setHalo(self, halo):
+
+        if halo < 0:
+            raise RuntimeError('The halo cannot be negative.')
+
+        if halo and self._resolution != 1:
+
+            raise RuntimeError('A halo cannot be used with a reduced ' +
+                               'resolution.')
+
+        self._stopPrefetch()
+        self._halo = halo
+
+    # -------------------------------------------------------------------------
+    # setLayout
+    # -------------------------------------------------------------------------
+    def setLayout(self, layout):
+
+        if layout not in Chunker.LAYOUTS:
+
+            raise RuntimeError('Layout, ' +
+                               str(layout) +
+                               ', must be one of ' +
+                               str(Chunker.LAYOUTS) +
+                               '.')
+
+        self._stopPrefetch()
+        self._layout = layout
+
+    # -------------------------------------------------------------------------
+    # setChunkSize
+    #
+    # Chunks that straddle the raster's blocks cause GDAL to decompress the
+    # same block for several chunks, so a warning is issued when the chunk
+    # size is not aligned with the block size.
+    # -------------------------------------------------------------------------
+    def setChunkSize(self, _xSize, _ySize):
+
+        self._setChunkSize(_xSize, _ySize)
+
+        xImage = self._imageFile.getDataset().RasterXSize
+        yImage = self._imageFile.getDataset().RasterYSize
+        xBlock, yBlock = self.getBlockSize()
+        xAligned = _xSize % xBlock == 0 or _xSize == xImage
+        yAligned = _ySize % yBlock == 0 or _ySize == yImage
+
+        if not xAligned or not yAligned:
+
+            warnings.warn('Chunk size, ' +
+                          str((_xSize, _ySize)) +
+                          ', is not aligned with the block size, ' +
+                          str((xBlock, yBlock)) +
+                          ', of ' +
+                          self._imageFile.fileName() +
+                          '.  Consider setChunkToBlocks().')
+
+    # -------------------------------------------------------------------------
+    # _setChunkSize
+    # -------------------------------------------------------------------------
+    def _setChunkSize(self, _xSize, _ySize):
+
+        if _xSize < 1:
+            raise RuntimeError('The sample size of a chunk must be greater ' +
+                               'than zero.')
+
+        if _xSize > self._imageFile.getDataset().RasterXSize:
+
+            raise RuntimeError('Sample size, ' +
+                               str(_xSize) +
+                               ', must be less than or equal to the image ' +
+                               'sample size, ' +
+                               str(self._imageFile.getDataset().RasterXSize))
+
+        if _ySize < 1:
+            raise RuntimeError('The line size of a chunk must be greater ' +
+                               'than zero.')
+
+        if _ySize > self._imageFile.getDataset().RasterYSize:
+
+            raise RuntimeError('Line size, ' +
+                               str(_ySize) +
+                               ', must be less than or equal to the image ' +
+                               'line size, ' +
+                               str(self._imageFile.getDataset().RasterYSize))
+
+        self._stopPrefetch()
+        self._xSize = _xSize
+        self._ySize = _ySize
+
+    # -------------------------------------------------------------------------
+    # __getstate__
+    #
+    # Chunkers pickle compactly, for task queues, with their image, settings
+    # and position.  The region goes as WKT and the coarse mask as bits.
+    # Threads, buffers, the cache and the pool belong to this process, so
+    # they are not included; set the cache and pool again after unpickling.
+    # -------------------------------------------------------------------------
+    def __getstate__(self):
+
+        state = self.__dict__.copy()
+
+        for key in ('_bufferRing',
+                    '_prefetchQueue',
+                    '_prefetchStop',
+                    '_prefetchThread',
+                    '_cache',
+                    '_pool',
+                    '_regionSource',
+                    '_regionLock'):
+
+            del state[key]
+
+        state['_bufferRingIndex'] = 0
+
+        if self._region is not None:
+
+            srs = self._region.GetSpatialReference()
+
+            state['_region'] = (self._region.ExportToWkt(),
+                                srs.ExportToWkt() if srs else None)
+
+        if self._coarseMask is not None:
+
+            state['_coarseMask'] = (np.packbits(self._coarseMask),
+                                    self._coarseMask.shape)
+
+        return state
+
+    # -------------------------------------------------------------------------
+    # __setstate__
+    # -------------------------------------------------------------------------
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+        self._bufferRing = []
+        self._prefetchQueue = None
+        self._prefetchStop = None
+        self._prefetchThread = None
+        self._cache = None
+        self._pool = None
+        self._region = None
+        self._regionSource = None
+        self._regionLock = threading.Lock()
+
+        if state['_region'] is not None:
+
+            wkt, srsWkt = state['_region']
+            srs = None
+
+            if srsWkt:
+
+                srs = osr.SpatialReference()
+                srs.ImportFromWkt(srsWkt)
+                srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+            self._setRegionGeometry(ogr.CreateGeometryFromWkt(wkt, srs))
+
+        if state['_coarseMask'] is not None:
+
+            bits, shape = state['_coarseMask']
+
+            self._coarseMask = np.unpackbits(
+                bits, count=shape[0] * shape[1]).reshape(shape).astype(bool)
@@ -0,0 +1,302 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+import itertools
+import os
+import threading
+
+from osgeo import gdal
+from osgeo import gdalconst
+
+
+# -----------------------------------------------------------------------------
+# class DatasetPool
+#
+# This bounds the number of GDAL datasets open in a process, and reuses them.
+# Each handle is lent to one owner at a time, because GDAL datasets are not
+# thread safe.  When an owner releases a handle, it stays open, idle, for the
+# next owner of the same file and mode.  When there are more than maxHandles
+# handles, the least recently used are closed, idle ones or not.  An owner
+# whose handle is closed is told, through its onEvict callback, and opens
+# another on its next use.  getDefault() returns the process-wide pool.
+#
+# Read-only and writable handles of a file are separate.  Writable handles are
+# flushed when they are released.
+#
+# pool = DatasetPool.getDefault()
+# imageFile = ImageFile(path, pool=pool)
+# chunker.setPool(pool)
+# print(pool.statistics())
+# -----------------------------------------------------------------------------
+class DatasetPool(object):
+
+    DEFAULT_MAX_HANDLES = 256
+
+    _default = None
+    _defaultLock = threading.Lock()
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self, maxHandles=DEFAULT_MAX_HANDLES):
+
+        # token: [(name, readOnly), dataset, onEvict or None when idle]
+        self._handles = OrderedDict()
+        self._idle = {}
+        self._tokens = itertools.count()
+        self._lock = threading.Lock()
+        self._opens = 0
+        self._reuses = 0
+        self._evictions = 0
+        self.setMaxHandles(maxHandles)
+
+    # -------------------------------------------------------------------------
+    # acquire
+    #
+    # This lends a handle of a file or subdataset to the caller, opening it
+    # if there is no idle one.  It returns (token, dataset).  Pass the token
+    # to release() and touch().  onEvict(token) is called, from any thread,
+    # if the pool closes the handle before it is released.
+    # -------------------------------------------------------------------------
+    def acquire(self, name, readOnly=True, onEvict=None):
+
+        key = (DatasetPool._normalize(name), bool(readOnly))
+        onEvict = onEvict or DatasetPool._ignore
+
+        with self._lock:
+
+            idle = self._idle.get(key)
+
+            if idle:
+
+                token = idle.pop()
+
+                if not idle:
+                    del self._idle[key]
+
+                handle = self._handles[token]
+                handle[2] = onEvict
+                self._handles.move_to_end(token)
+                self._reuses += 1
+
+                return token, handle[1]
+
+        mode = gdalconst.GA_ReadOnly if readOnly else gdalconst.GA_Update
+        dataset = gdal.Open(name, mode)
+
+        if not dataset:
+            raise RuntimeError('GDAL could not open ' + name + '.')
+
+        with self._lock:
+
+            token = next(self._tokens)
+            self._handles[token] = [key, dataset, onEvict]
+            self._opens += 1
+            evicted = self._evict()
+
+        for evictedToken, callback in evicted:
+            callback(evictedToken)
+
+        return token, dataset
+
+    # -------------------------------------------------------------------------
+    # clear
+    # -------------------------------------------------------------------------
+    def clear(self):
+
+        self.invalidate()
+
+    # -------------------------------------------------------------------------
+    # _evict
+    #
+    # This closes handles until there are, at most, maxHandles, and returns
+    # the (token, onEvict) of the lent ones, to call without the lock.  The
+    # lock must be held.
+    # -------------------------------------------------------------------------
+    def _evict(self):
+
+        evicted = []
+
+        while len(self._handles) > self._maxHandles:
+
+            token = next(iter(self._handles))
+            evicted.extend(self._remove(token))
+
+        return evicted
+
+    # -------------------------------------------------------------------------
+    # _filePath
+    #
+    # This returns the absolute path of the file of a dataset name.
+    # Subdataset names, like NETCDF:"/data/file.nc":var, quote the file.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _filePath(name):
+
+        parts = name.split('"')
+
+        return os.path.abspath(parts[1] if len(parts) > 2 else name)
+
+    # -------------------------------------------------------------------------
+    # getDefault
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def getDefault():
+
+        with DatasetPool._defaultLock:
+
+            if DatasetPool._default is None:
+                DatasetPool._default = DatasetPool()
+
+            return DatasetPool._default
+
+    # -------------------------------------------------------------------------
+    # _ignore
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _ignore(token):
+        pass
+
+    # -------------------------------------------------------------------------
+    # invalidate
+    #
+    # This closes the handles of one file, including its subdatasets, or
+    # every handle when no file is given.  Relative and absolute paths of the
+    # file match.  Call it after rewriting a file in
+    # place.  Owners of lent handles are told, so they reopen the file.
+    # -------------------------------------------------------------------------
+    def invalidate(self, pathToFile=None):
+
+        if pathToFile is not None:
+            pathToFile = os.path.abspath(pathToFile)
+
+        with self._lock:
+
+            evicted = []
+
+            for token in [token for token, handle in self._handles.items()
+                          if pathToFile is None or
+                          DatasetPool._filePath(handle[0][0]) == pathToFile]:
+
+                evicted.extend(self._remove(token))
+
+        for evictedToken, callback in evicted:
+            callback(evictedToken)
+
+    # -------------------------------------------------------------------------
+    # _normalize
+    #
+    # This makes the file of a dataset name absolute, so relative and
+    # absolute names of a file share handles.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _normalize(name):
+
+        parts = name.split('"')
+
+        if len(parts) > 2:
+
+            parts[1] = os.path.abspath(parts[1])
+            return '"'.join(parts)
+
+        return os.path.abspath(name)
+
+    # -------------------------------------------------------------------------
+    # release
+    #
+    # This returns a lent handle to the pool.  Releasing a handle that was
+    # already closed does nothing.
+    # -------------------------------------------------------------------------
+    def release(self, token):
+
+        with self._lock:
+            handle = self._handles.get(token)
+
+        if handle is None or handle[2] is None:
+            return
+
+        key, dataset, onEvict = handle
+
+        if not key[1]:
+            dataset.FlushCache()
+
+        with self._lock:
+
+            if token in self._handles:
+
+                handle[2] = None
+                self._idle.setdefault(key, []).append(token)
+
+    # -------------------------------------------------------------------------
+    # _remove
+    #
+    # This drops a handle, closing it when its last reference goes, and
+    # returns [(token, onEvict)] when it was lent.  The lock must be held.
+    # -------------------------------------------------------------------------
+    def _remove(self, token):
+
+        key, dataset, onEvict = self._handles.pop(token)
+        self._evictions += 1
+
+        if onEvict is None:
+
+            self._idle[key].remove(token)
+
+            if not self._idle[key]:
+                del self._idle[key]
+
+            return []
+
+        return [(token, onEvict)]
+
+    # -------------------------------------------------------------------------
+    # setMaxHandles
+    # -------------------------------------------------------------------------
+    def setMaxHandles(self, maxHandles):
+
+        if maxHandles < 1:
+            raise RuntimeError('The pool must allow at least one handle.')
+
+        with self._lock:
+
+            self._maxHandles = int(maxHandles)
+            evicted = self._evict()
+
+        for evictedToken, callback in evicted:
+            callback(evictedToken)
+
+    # -------------------------------------------------------------------------
+    # statistics
+    # -------------------------------------------------------------------------
+    def statistics(self):
+
+        with self._lock:
+
+            numIdle = sum(len(idle) for idle in self._idle.values())
+
+            return {'opens': self._opens,
+                    'reuses': self._reuses,
+                    'evictions': self._evictions,
+                    'lent': len(self._handles) - numIdle,
+                    'idle': numIdle,
+                    'maxHandles': self._maxHandles}
+
+    # -------------------------------------------------------------------------
+    # touch
+    #
+    # This marks a lent handle as recently used.
+    # -------------------------------------------------------------------------
+    def touch(self, token):
+
+        with self._lock:
+
+            if token in self._handles:
+                self._handles.move_to_end(token)
+
+    # -------------------------------------------------------------------------
+    # __len__
+    # -------------------------------------------------------------------------
+    def __len__(self):
+
+        return len(self._handles)
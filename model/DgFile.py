@@ -24,8 +24,13 @@ class DgFile(GeospatialImageFile):
 
     # -------------------------------------------------------------------------
     # __init__
+    #
+    # When lazy is true, the image is opened on first use, but its XML
+    # counterpart is still read here.  pool is an optional DatasetPool, and
+    # metadataCache an optional MetadataCache.
     # -------------------------------------------------------------------------
-    def __init__(self, fileName, logger=None):
+    def __init__(self, fileName, logger=None, lazy=False, pool=None,
+                 metadataCache=None):
 
         # Check that the file is NITF or TIFF
         extension = os.path.splitext(fileName)[1]
@@ -44,23 +49,15 @@ class DgFile(GeospatialImageFile):
         self.xmlFileName = xmlFileName
 
         # ---
-        # Initialize the base class.  Wrap in a try-catch block because there
-        # is a good chance that the SRS will be invalid.  This is handled
-        # below.
+        # Initialize the base class.  There is a good chance that the SRS will
+        # be invalid.  This is handled in _initDataset() and below.
         # ---
-        try:
-            super(DgFile, self).__init__(fileName,
-                                         spatialReference=None,
-                                         logger=logger)
-
-        except RuntimeError as e:
-
-            # ---
-            # It could also be the case that the file is corrupt.  This means
-            # GDAL will fail when it tries to open the dataset.
-            # ---
-            if not self._dataset:
-                raise e
+        super(DgFile, self).__init__(fileName,
+                                     spatialReference=None,
+                                     logger=logger,
+                                     lazy=lazy,
+                                     pool=pool,
+                                     metadataCache=metadataCache)
 
         # Some data members require the XML file counterpart to the TIF.
         tree = ET.parse(self.xmlFileName)
@@ -141,17 +138,6 @@ class DgFile(GeospatialImageFile):
 
             self.bandNameList = None
 
-        # numBands
-        try:
-            self.numBands = self._dataset.RasterCount
-
-        except Exception as e:
-
-            if self._logger:
-                self._logger.info(e)
-
-            self.numBands = None
-
         self.footprintsGml = None
 
     # -------------------------------------------------------------------------
@@ -175,7 +161,7 @@ class DgFile(GeospatialImageFile):
             cc = self.imdTag.find('IMAGE').find('CLOUDCOVER').text
 
             if cc is None:
-                cc = self._dataset.GetMetadataItem('NITF_PIAIMC_CLOUDCVR')
+                cc = self.getDataset().GetMetadataItem('NITF_PIAIMC_CLOUDCVR')
 
             return float(cc)
 
@@ -217,7 +203,7 @@ class DgFile(GeospatialImageFile):
     def firstLineTime(self):
 
         try:
-            t = self._dataset.GetMetadataItem('NITF_CSDIDA_TIME')
+            t = self.getDataset().GetMetadataItem('NITF_CSDIDA_TIME')
 
             if t is not None:
                 return datetime.strptime(t, "%Y%m%d%H%M%S")
@@ -273,7 +259,7 @@ class DgFile(GeospatialImageFile):
     def getBandName(self):
 
         try:
-            return self._dataset.GetMetadataItem('bandName')
+            return self.getDataset().GetMetadataItem('bandName')
 
         except Exception as e:
 
@@ -296,7 +282,7 @@ class DgFile(GeospatialImageFile):
 
         try:
 
-            value = self._dataset.GetMetadataItem(nitfTag)
+            value = self.getDataset().GetMetadataItem(nitfTag)
 
             if not value:
                 value = self.imdTag.find('IMAGE').find(xmlTag).text
@@ -348,6 +334,31 @@ class DgFile(GeospatialImageFile):
 
         return os.path.splitext(self.fileName())[0].split('_')[-1]
 
+    # -------------------------------------------------------------------------
+    # _initDataset
+    #
+    # DG files often have no valid SRS, so that is not an error here.  Their
+    # spatial information comes from the XML counterpart.
+    # -------------------------------------------------------------------------
+    def _initDataset(self):
+
+        try:
+            super(DgFile, self)._initDataset()
+
+        except RuntimeError:
+            pass
+
+        # numBands
+        try:
+            self._numBands = self._dataset.RasterCount
+
+        except Exception as e:
+
+            if self._logger:
+                self._logger.info(e)
+
+            self._numBands = None
+
     # -------------------------------------------------------------------------
     # isMate
     #
@@ -432,6 +443,18 @@ class DgFile(GeospatialImageFile):
 
         return self.getField('NITF_CSEXRA_SUN_ELEVATION', 'MEANSUNEL')
 
+    # -------------------------------------------------------------------------
+    # numBands()
+    #
+    # This opens the dataset of a lazy DgFile.
+    # -------------------------------------------------------------------------
+    @property
+    def numBands(self):
+
+        self.getDataset()
+
+        return self._numBands
+
     # -------------------------------------------------------------------------
     # prodLevelCode()
     # -------------------------------------------------------------------------
@@ -453,7 +476,7 @@ class DgFile(GeospatialImageFile):
     def sensor(self):
 
         try:
-            sens = self._dataset.GetMetadataItem('NITF_PIAIMC_SENSNAME')
+            sens = self.getDataset().GetMetadataItem('NITF_PIAIMC_SENSNAME')
 
             if not sens:
                 sens = self.imdTag.find('IMAGE').find('SATID').text
@@ -474,7 +497,7 @@ class DgFile(GeospatialImageFile):
     # -------------------------------------------------------------------------
     def setBandName(self, bandName):
 
-        self._dataset.SetMetadataItem("bandName", bandName)
+        self.getDataset().SetMetadataItem("bandName", bandName)
 
     # -------------------------------------------------------------------------
     # specTypeCode()
@@ -482,7 +505,7 @@ class DgFile(GeospatialImageFile):
     def specTypeCode(self):
 
         try:
-            stc = self._dataset.GetMetadataItem('NITF_CSEXRA_SENSOR')
+            stc = self.getDataset().GetMetadataItem('NITF_CSEXRA_SENSOR')
 
             if stc is None:
 
@@ -508,7 +531,7 @@ class DgFile(GeospatialImageFile):
     # -------------------------------------------------------------------------
     def srs(self):
 
-        srs = self._dataset.GetSpatialRef()
+        srs = super(DgFile, self).srs()
 
         if not srs:
             srs = SpatialReference()
@@ -570,7 +593,7 @@ class DgFile(GeospatialImageFile):
     def year(self):
 
         try:
-            yr = self._dataset.GetMetadataItem('NITF_CSDIDA_YEAR')
+            yr = self.getDataset().GetMetadataItem('NITF_CSDIDA_YEAR')
 
             if yr is None:
                 yr = self.firstLineTime().year
@@ -592,4 +615,7 @@ class DgFile(GeospatialImageFile):
     def __setstate__(self, state):
 
         self.__init__(state[GeospatialImageFile.FILE_KEY],
-                      state[GeospatialImageFile.LOGGER_KEY])
+                      state[GeospatialImageFile.LOGGER_KEY],
+                      lazy=True)
+
+        self._metadata = state.get(GeospatialImageFile.METADATA_KEY)
@@ -5,6 +5,7 @@ import math
 import shutil
 import tempfile
 
+from osgeo import osr
 from osgeo.osr import SpatialReference
 
 from core.model.Envelope import Envelope
@@ -17,35 +18,58 @@ from core.model.SystemCommand import SystemCommand
 # -----------------------------------------------------------------------------
 class GeospatialImageFile(ImageFile):
 
-    FILE_KEY = 'PathToFile'
-    SUBDATASET_KEY = 'subdataset'
     LOGGER_KEY = 'logger'
     SRS_KEY = 'SpatialReference'
 
     # -------------------------------------------------------------------------
     # __init__
+    #
+    # When lazy is true, the dataset is opened, and its SRS checked, on first
+    # use.  pool is an optional DatasetPool.  With a MetadataCache, envelope(),
+    # scale() and srs() do not open the dataset of a cached file.
     # -------------------------------------------------------------------------
     def __init__(self, pathToFile, spatialReference=None,
-                 subdataset=None, logger=None):
+                 subdataset=None, logger=None, lazy=False, pool=None,
+                 metadataCache=None):
+
+        self.logger = logger
+        self._spatialReference = spatialReference
+        self._srs = None
 
         # Initialize the base class.
-        super(GeospatialImageFile, self).__init__(pathToFile, subdataset)
+        super(GeospatialImageFile, self).__init__(pathToFile,
+                                                  subdataset,
+                                                  lazy=lazy,
+                                                  pool=pool,
+                                                  metadataCache=metadataCache)
 
-        self.logger = logger
+    # -------------------------------------------------------------------------
+    # _initDataset
+    #
+    # The SRS chosen here is kept in this object.  It is also set on the
+    # dataset, as before, unless the dataset is pooled, because a pooled
+    # dataset is lent to other owners afterward.
+    # -------------------------------------------------------------------------
+    def _initDataset(self):
+
+        self._srs = None
+        spatialReference = self._spatialReference
 
         # The passed SRS overrides any internal SRS.
         if spatialReference and spatialReference.Validate() == 0:
 
-            self._dataset.SetSpatialRef(spatialReference)
+            self._setSrs(spatialReference)
+            return
 
         # Does the image file have a valid SRS?
         if self._dataset.GetSpatialRef() and \
            self._dataset.GetSpatialRef().Validate() == 0:
 
+            self._srs = self._dataset.GetSpatialRef()
             return
 
         # Can the image file's projection be used as an SRS?
-        wkt = self.getDataset().GetProjection()
+        wkt = self._dataset.GetProjection()
 
         if wkt:
 
@@ -53,22 +77,24 @@ class GeospatialImageFile(ImageFile):
             projSRS.ImportFromWkt(wkt)
 
             if projSRS.Validate() == 0:
-                self._dataset.SetSpatialRef(projSRS)
 
-        # # If there is still no SRS in the image, try to use the one passed.
-        # if not self._dataset.GetSpatialRef() or \
-        #     self._dataset.GetSpatialRef().Validate() != 0:
-        #
-        #     if spatialReference and spatialReference.Validate() == 0:
-        #         self._dataset.SetSpatialRef(spatialReference)
+                self._setSrs(projSRS)
+                return
 
-        # After all that, is there a valid SRS in the image?
-        if not self._dataset.GetSpatialRef() or \
-           self._dataset.GetSpatialRef().Validate() != 0:
+        # After all that, there is no valid SRS for the image.
+        raise RuntimeError('Spatial reference for ' +
+                           self._filePath +
+                           ' is invalid.')
 
-            raise RuntimeError('Spatial reference for ' +
-                               pathToFile,
-                               ' is invalid.')
+    # -------------------------------------------------------------------------
+    # _setSrs
+    # -------------------------------------------------------------------------
+    def _setSrs(self, srs):
+
+        self._srs = srs
+
+        if self._pool is None:
+            self._dataset.SetSpatialRef(srs)
 
     # -------------------------------------------------------------------------
     # clipReproject
@@ -110,7 +136,7 @@ class GeospatialImageFile(ImageFile):
                     '"')
 
         # Reproject?
-        if outputSRS and not self._dataset.GetSpatialRef().IsSame(outputSRS):
+        if outputSRS and not self.srs().IsSame(outputSRS):
 
             cmd += ' -t_srs "' + outputSRS.ExportToProj4() + '"'
             self._srs = outputSRS
@@ -121,6 +147,10 @@ class GeospatialImageFile(ImageFile):
         SystemCommand(cmd, self.logger, True)
 
         shutil.move(outFile, self._filePath)
+        self._invalidateCache()
+        cache = self.getCache()
+        pool = self.getPool()
+        metadataCache = self.getMetadataCache()
 
         # ---
         # Update the dataset.  It would be nice to use the SRS inside the
@@ -128,19 +158,24 @@ class GeospatialImageFile(ImageFile):
         # be incorrect.  Passing the requested SRS keeps the axis order
         # consistent.
         # ---
-        self.__init__(self._filePath, spatialReference=outputSRS)
+        self.__init__(self._filePath,
+                      spatialReference=outputSRS,
+                      pool=pool,
+                      metadataCache=metadataCache)
+
+        self.setCache(cache)
 
     # -------------------------------------------------------------------------
     # envelope
     # -------------------------------------------------------------------------
     def envelope(self):
 
-        dataset = self.getDataset()
-        xform = dataset.GetGeoTransform()
+        metadata = self.getMetadata()
+        xform = metadata['geoTransform']
         xScale = xform[1]
         yScale = xform[5]
-        width = dataset.RasterXSize
-        height = dataset.RasterYSize
+        width = metadata['xSize']
+        height = metadata['ySize']
         ulx = xform[0]
         uly = xform[3]
         lrx = ulx + width * xScale
@@ -155,15 +190,17 @@ class GeospatialImageFile(ImageFile):
         srs4326 = SpatialReference()
         srs4326.ImportFromEPSG(4326)
 
-        if srs4326.IsSame(self._dataset.GetSpatialRef()):
+        srs = self.srs()
+
+        if srs4326.IsSame(srs):
 
-            envelope.addPoint(uly, ulx, 0, self._dataset.GetSpatialRef())
-            envelope.addPoint(lry, lrx, 0, self._dataset.GetSpatialRef())
+            envelope.addPoint(uly, ulx, 0, srs)
+            envelope.addPoint(lry, lrx, 0, srs)
 
         else:
 
-            envelope.addPoint(ulx, uly, 0, self._dataset.GetSpatialRef())
-            envelope.addPoint(lrx, lry, 0, self._dataset.GetSpatialRef())
+            envelope.addPoint(ulx, uly, 0, srs)
+            envelope.addPoint(lrx, lry, 0, srs)
 
         return envelope
 
@@ -176,7 +213,7 @@ class GeospatialImageFile(ImageFile):
                ' -multi' + \
                ' -of netCDF' + \
                ' -s_srs "' + \
-               self._dataset.GetSpatialRef().ExportToProj4() + \
+               self.srs().ExportToProj4() + \
                '"'
 
     # -------------------------------------------------------------------------
@@ -211,6 +248,7 @@ class GeospatialImageFile(ImageFile):
         cmd += ' ' + self._filePath + ' ' + outFile
         SystemCommand(cmd, None, True)
         shutil.move(outFile, self._filePath)
+        self._invalidateCache()
 
         # Update the dataset.
         self.getDataset()
@@ -220,7 +258,7 @@ class GeospatialImageFile(ImageFile):
     # -------------------------------------------------------------------------
     def scale(self):
 
-        xform = self.getDataset().GetGeoTransform()
+        xform = self.getMetadata()['geoTransform']
         return xform[1], xform[5]
 
     # -------------------------------------------------------------------------
@@ -228,7 +266,30 @@ class GeospatialImageFile(ImageFile):
     # -------------------------------------------------------------------------
     def srs(self):
 
-        return self._dataset.GetSpatialRef()
+        # ---
+        # Before the dataset is opened, the SRS comes from the metadata cache
+        # or the metadata of an unpickled file, as _initDataset() would choose
+        # it.  If the cached projection is not valid, opening the dataset
+        # reports it.
+        # ---
+        if self._dataset is None and \
+           (self._metadata is not None or self._metadataCache is not None):
+
+            srs = self._spatialReference
+
+            if not srs or srs.Validate() != 0:
+
+                srs = SpatialReference()
+                srs.ImportFromWkt(self.getMetadata()['projection'])
+                srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+            if srs.Validate() == 0:
+                return srs
+
+        # Opening the dataset chooses the SRS.
+        self.getDataset()
+
+        return self._srs
 
     # -------------------------------------------------------------------------
     # subdataset
@@ -238,13 +299,30 @@ class GeospatialImageFile(ImageFile):
 
     # -------------------------------------------------------------------------
     # __getstate__
+    #
+    # Only an SRS passed to the constructor is included, as its EPSG code,
+    # when it has one, or its WKT.  Otherwise, the file's own SRS is used
+    # when the dataset opens.  See ImageFile.__getstate__().
     # -------------------------------------------------------------------------
     def __getstate__(self):
 
-        state = {GeospatialImageFile.FILE_KEY: self.fileName(),
-                 GeospatialImageFile.SRS_KEY: self.srs().ExportToProj4(),
-                 GeospatialImageFile.SUBDATASET_KEY: self.subdataset(),
-                 GeospatialImageFile.LOGGER_KEY: self.logger}
+        state = super(GeospatialImageFile, self).__getstate__()
+        state[GeospatialImageFile.LOGGER_KEY] = self.logger
+        state[GeospatialImageFile.SRS_KEY] = None
+        srs = self._spatialReference
+
+        if srs and srs.Validate() == 0:
+
+            if srs.GetAuthorityName(None) == 'EPSG' and \
+               srs.GetAuthorityCode(None):
+
+                definition = 'EPSG:' + srs.GetAuthorityCode(None)
+
+            else:
+                definition = srs.ExportToWkt()
+
+            state[GeospatialImageFile.SRS_KEY] = \
+                (definition, srs.GetAxisMappingStrategy())
 
         return state
 
@@ -255,10 +333,32 @@ class GeospatialImageFile(ImageFile):
     # -------------------------------------------------------------------------
     def __setstate__(self, state):
 
-        srs = SpatialReference()
-        srs.ImportFromProj4(state[GeospatialImageFile.SRS_KEY])
+        srs = None
+        srsState = state[GeospatialImageFile.SRS_KEY]
+
+        # Earlier versions pickled the Proj4 string of the SRS.
+        if isinstance(srsState, str):
+
+            srs = SpatialReference()
+            srs.ImportFromProj4(srsState)
+
+        elif srsState:
+
+            definition, axisMappingStrategy = srsState
+            srs = SpatialReference()
+
+            if definition.startswith('EPSG:'):
+                srs.ImportFromEPSG(int(definition[5:]))
+
+            else:
+                srs.ImportFromWkt(definition)
+
+            srs.SetAxisMappingStrategy(axisMappingStrategy)
 
         self.__init__(state[GeospatialImageFile.FILE_KEY],
                       srs,
                       state[GeospatialImageFile.SUBDATASET_KEY],
-                      state[GeospatialImageFile.LOGGER_KEY])
+                      state[GeospatialImageFile.LOGGER_KEY],
+                      lazy=True)
+
+        self._metadata = state.get(GeospatialImageFile.METADATA_KEY)
@@ -1,10 +1,34 @@
 #!/usr/bin/env python2
 # -*- coding: utf-8 -*-
 
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+import math
+import time
+import weakref
+
+try:
+    import dask.array
+    from dask.base import tokenize
+
+except ImportError:
+    dask = None
+
+try:
+    import xarray
+
+except ImportError:
+    xarray = None
+
 from osgeo import gdal
+from osgeo import gdal_array
 from osgeo import gdalconst
 
+import numpy as np
+
 from core.model.BaseFile import BaseFile
+from core.model.ChunkCache import ChunkCache
+from core.model.MetadataCache import MetadataCache
 
 
 # -----------------------------------------------------------------------------
@@ -14,27 +38,199 @@ from core.model.BaseFile import BaseFile
 # -----------------------------------------------------------------------------
 class ImageFile(BaseFile):
 
+    DEFAULT_DASK_CHUNK_PIXELS = 1024 * 1024
+
+    # openMany() does not send these constructor arguments to processes.
+    PROCESS_LOCAL_KWARGS = ('pool', 'metadataCache', 'logger')
+
+    FILE_KEY = 'PathToFile'
+    SUBDATASET_KEY = 'subdataset'
+    READ_ONLY_KEY = 'readOnly'
+    METADATA_KEY = 'metadata'
+
     # -------------------------------------------------------------------------
     # __init__
+    #
+    # When lazy is true, the dataset is opened on first use, rather than here,
+    # so building many ImageFiles costs little more than checking that their
+    # files exist.  Call validate() to open it early.  With a DatasetPool, the
+    # dataset is borrowed from the pool.  See setPool().  With a
+    # MetadataCache, metadata is read from the cache, when the file has not
+    # changed, without opening the dataset.  See getMetadata().
     # -------------------------------------------------------------------------
-    def __init__(self, pathToFile, subdataset=None, readOnly=True):
+    def __init__(self, pathToFile, subdataset=None, readOnly=True,
+                 lazy=False, pool=None, metadataCache=None):
 
         # Initialize the base class.
         super(ImageFile, self).__init__(pathToFile)
 
+        self._dataset = None
+        self._subdataset = subdataset
+        self._readOnly = readOnly
+        self._cache = None
+        self._pool = pool
+        self._poolToken = None
+        self._releaseHandle = None
+        self._metadataCache = metadataCache
+        self._metadata = None
+
         # ---
         # Corrupt files tend to fail when they are opened in _getDataset(),
         # so try it here and fail early.
         # ---
-        self._dataset = None
-        self._subdataset = subdataset
+        if not lazy:
+            self._open()
+
+    # -------------------------------------------------------------------------
+    # asMemmap
+    #
+    # This maps the pixels of one band, numbered from 1, or of every band,
+    # into memory without copying them, so random access costs only page
+    # faults.  The result is a (row, column) array of one band, or a
+    # (band, row, column) array.  It is writable when the ImageFile is.
+    #
+    # Uncompressed, striped GeoTIFFs whose strips are contiguous are mapped
+    # directly with numpy.memmap.  Other formats, like ENVI, EHdr or the .bin
+    # files of DgFile.toBandInterleavedBinary(), use GDAL's virtual memory,
+    # which must stay valid, so the ImageFile must not be pooled.  Otherwise,
+    # this raises RuntimeError; use readWindow().
+    # -------------------------------------------------------------------------
+    def asMemmap(self, band=None):
+
+        dataset = self.getDataset()
+
+        bands = [band] if band else \
+            list(range(1, dataset.RasterCount + 1))
+
+        array = self._mapTiff(dataset, bands)
+
+        if array is None:
+            array = self._mapVirtualMemory(dataset, bands)
+
+        if array is None:
+
+            raise RuntimeError('The pixels of ' +
+                               self._filePath +
+                               ' cannot be memory mapped, because they are ' +
+                               'compressed, tiled or not contiguous.  ' +
+                               'Use readWindow() instead.')
+
+        return array[0] if band else array
+
+    # -------------------------------------------------------------------------
+    # getDataset
+    # -------------------------------------------------------------------------
+    def getDataset(self):
+
+        # The pool may drop the dataset from another thread.
+        dataset = self._dataset
+
+        if dataset is None:
+            dataset = self._open()
+
+        elif self._poolToken is not None:
+            self._pool.touch(self._poolToken)
+
+        return dataset
+
+    # -------------------------------------------------------------------------
+    # getCache
+    # -------------------------------------------------------------------------
+    def getCache(self):
+
+        return self._cache
+
+    # -------------------------------------------------------------------------
+    # getMetadata
+    #
+    # This returns the image's metadata, as described by
+    # MetadataCache.describe(), from the metadata cache, if there is one and
+    # it is current.  Otherwise, the dataset is described and the cache
+    # updated.
+    # -------------------------------------------------------------------------
+    def getMetadata(self):
+
+        if self._metadata is None:
+
+            cache = self._metadataCache
+            metadata = None
+
+            if cache is not None:
+                metadata = cache.get(self._filePath, self._subdataset)
+
+            if metadata is None:
+
+                metadata = MetadataCache.describe(self.getDataset())
+
+                if cache is not None:
+                    cache.put(self._filePath, metadata, self._subdataset)
+
+            self._metadata = metadata
+
+        return self._metadata
+
+    # -------------------------------------------------------------------------
+    # getMetadataCache
+    # -------------------------------------------------------------------------
+    def getMetadataCache(self):
+
+        return self._metadataCache
+
+    # -------------------------------------------------------------------------
+    # getPool
+    # -------------------------------------------------------------------------
+    def getPool(self):
+
+        return self._pool
+
+    # -------------------------------------------------------------------------
+    # _invalidateCache
+    #
+    # Call this after rewriting the file in place.  The dataset, and pooled
+    # handles of the file, are released, so the next use reopens it.
+    # -------------------------------------------------------------------------
+    def _invalidateCache(self):
+
+        self._releaseDataset()
+        self._metadata = None
+
+        if self._cache is not None:
+            self._cache.invalidate(self._filePath)
+
+        if self._pool is not None:
+            self._pool.invalidate(self._filePath)
+
+    # -------------------------------------------------------------------------
+    # _initDataset
+    #
+    # This is called when the dataset is opened, for subclasses to prepare it.
+    # -------------------------------------------------------------------------
+    def _initDataset(self):
+        pass
+
+    # -------------------------------------------------------------------------
+    # _open
+    # -------------------------------------------------------------------------
+    def _open(self):
+
+        name = self._subdataset or self._filePath
+        token = None
 
         try:
-            ro = gdalconst.GA_ReadOnly if readOnly else gdalconst.GF_Write
-            self._dataset = gdal.Open(subdataset, ro) \
-                if subdataset else gdal.Open(pathToFile, ro)
+            if self._pool is None:
+
+                ro = gdalconst.GA_ReadOnly if self._readOnly \
+                    else gdalconst.GF_Write
+
+                dataset = gdal.Open(name, ro)
 
-            if not self._dataset:
+            else:
+
+                token, dataset = self._pool.acquire(name,
+                                                    self._readOnly,
+                                                    self._makeOnEvict())
+
+            if not dataset:
 
                 raise RuntimeError('GDAL returned an null data set ' +
                                    'when opening ' +
@@ -46,9 +242,534 @@ class ImageFile(BaseFile):
             raise RuntimeError('GDAL raised an exception when opening ' +
                                self._filePath + '.')
 
+        self._dataset = dataset
+
+        if token is not None:
+
+            self._releaseHandle = weakref.finalize(self,
+                                                   self._pool.release,
+                                                   token)
+
+            self._poolToken = token
+
+        # A dataset that fails preparation is not kept, so it fails again.
+        try:
+            self._initDataset()
+
+        except Exception:
+
+            self._releaseDataset()
+            raise
+
+        return dataset
+
     # -------------------------------------------------------------------------
-    # getDataset
+    # _makeOnEvict
+    #
+    # This makes the callback by which a pool drops this ImageFile's dataset.
+    # It holds only a weak reference, so the ImageFile may still be collected,
+    # releasing its handle.
     # -------------------------------------------------------------------------
-    def getDataset(self):
+    def _makeOnEvict(self):
+
+        imageFileRef = weakref.ref(self)
+
+        def onEvict(token):
+
+            imageFile = imageFileRef()
+
+            if imageFile is None or imageFile._poolToken != token:
+                return
+
+            # The owner may be releasing the dataset in its own thread.
+            releaseHandle = imageFile._releaseHandle
+            imageFile._poolToken = None
+            imageFile._releaseHandle = None
+            imageFile._dataset = None
+
+            if releaseHandle is not None:
+                releaseHandle.detach()
+
+        return onEvict
+
+    # -------------------------------------------------------------------------
+    # _mapTiff
+    #
+    # This maps the bands of an uncompressed, striped GeoTIFF, band or pixel
+    # interleaved, with numpy.memmap, or returns None.  Pixels with fewer
+    # bits than their data type, set by NBITS, are not mapped.
+    # -------------------------------------------------------------------------
+    def _mapTiff(self, dataset, bands):
+
+        if self._subdataset or \
+           dataset.GetDriver().ShortName != 'GTiff' or \
+           dataset.GetMetadataItem('COMPRESSION', 'IMAGE_STRUCTURE'):
+
+            return None
+
+        xSize = dataset.RasterXSize
+        ySize = dataset.RasterYSize
+        numBands = dataset.RasterCount
+        firstBand = dataset.GetRasterBand(bands[0])
+        xBlock, yBlock = firstBand.GetBlockSize()
+
+        if xBlock != xSize:
+            return None
+
+        with open(self._filePath, 'rb') as tiff:
+            byteOrder = '<' if tiff.read(2) == b'II' else '>'
+
+        dataType = np.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(
+            firstBand.DataType)).newbyteorder(byteOrder)
+
+        # Bit-packed pixels, like 12-bit UInt16 ones, are not whole values.
+        nBits = firstBand.GetMetadataItem('NBITS', 'IMAGE_STRUCTURE')
+
+        if nBits and int(nBits) != dataType.itemsize * 8:
+            return None
+
+        interleaved = numBands > 1 and \
+            dataset.GetMetadataItem('INTERLEAVE', 'IMAGE_STRUCTURE') == 'PIXEL'
+
+        rowBytes = xSize * dataType.itemsize * (numBands if interleaved else 1)
+
+        # Each band's strips must follow one another.
+        starts = []
+
+        for band in [1] if interleaved else bands:
+
+            rasterBand = dataset.GetRasterBand(band)
+
+            offsets = [rasterBand.GetMetadataItem('BLOCK_OFFSET_0_' + str(i),
+                                                  'TIFF')
+                       for i in range(math.ceil(ySize / yBlock))]
+
+            if None in offsets:
+                return None
+
+            offsets = [int(offset) for offset in offsets]
+
+            if offsets != [offsets[0] + i * yBlock * rowBytes
+                           for i in range(len(offsets))]:
+
+                return None
+
+            starts.append(offsets[0])
+
+        # The bands must follow one another, too.
+        if starts != [starts[0] + i * ySize * rowBytes
+                      for i in range(len(starts))]:
+
+            return None
+
+        mode = 'r' if self._readOnly else 'r+'
+
+        if not interleaved:
+
+            return np.memmap(self._filePath,
+                             dtype=dataType,
+                             mode=mode,
+                             offset=starts[0],
+                             shape=(len(bands), ySize, xSize))
+
+        pixels = np.memmap(self._filePath,
+                           dtype=dataType,
+                           mode=mode,
+                           offset=starts[0],
+                           shape=(ySize, xSize, numBands))
+
+        pixels = pixels.transpose(2, 0, 1)
+
+        return pixels if len(bands) == numBands else \
+            pixels[bands[0] - 1:bands[0]]
+
+    # -------------------------------------------------------------------------
+    # _mapVirtualMemory
+    #
+    # This maps one band with GDAL's virtual memory, for drivers that support
+    # it, or returns None.
+    # -------------------------------------------------------------------------
+    def _mapVirtualMemory(self, dataset, bands):
+
+        if len(bands) != 1:
+            return None
+
+        access = gdalconst.GF_Read if self._readOnly else gdalconst.GF_Write
+
+        try:
+            array = dataset.GetRasterBand(bands[0]). \
+                GetVirtualMemAutoArray(access)
+
+        except Exception:
+            return None
+
+        return None if array is None else array[np.newaxis]
+
+    # -------------------------------------------------------------------------
+    # openMany
+    #
+    # This opens and validates many files concurrently, for ingest steps
+    # where open latency, as on network file systems, dominates.  cls is
+    # ImageFile or a subclass, like GeospatialImageFile or DgFile, and kwargs
+    # are passed to its constructor.  It returns (imageFiles, failures,
+    # statistics).  imageFiles are the files that opened, in the order of
+    # paths.  failures is a list of (path, message).  statistics has the
+    # counts, the elapsed seconds, and the total, mean and maximum seconds of
+    # one open.
+    #
+    # Threads suit most cases, because GDAL releases the GIL while it opens.
+    # With useProcesses, files are validated in worker processes, and the
+    # returned files are lazy, so they open again on first use here.  The
+    # workers are not given PROCESS_LOCAL_KWARGS, like pool, which belong to
+    # this process; the returned files are.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def openMany(paths, workers=8, cls=None, useProcesses=False, **kwargs):
+
+        cls = cls or ImageFile
+        paths = list(paths)
+        start = time.perf_counter()
+
+        if useProcesses:
+
+            workerKwargs = {key: value for key, value in kwargs.items()
+                            if key not in ImageFile.PROCESS_LOCAL_KWARGS}
+
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+
+                results = list(executor.map(
+                    ImageFile._openOne,
+                    [cls] * len(paths),
+                    paths,
+                    [workerKwargs] * len(paths),
+                    [False] * len(paths),
+                    chunksize=max(1, len(paths) // (workers * 4))))
+
+        else:
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+
+                results = list(executor.map(ImageFile._openOne,
+                                            [cls] * len(paths),
+                                            paths,
+                                            [kwargs] * len(paths)))
+
+        imageFiles = []
+        failures = []
+        seconds = [result[2] for result in results]
+
+        for path, (imageFile, error, openSeconds) in zip(paths, results):
+
+            # The file may have changed since a worker validated it.
+            if error is None and useProcesses:
+
+                try:
+                    imageFile = cls(path, **dict(kwargs, lazy=True))
+
+                except Exception as e:
+                    error = str(e) or type(e).__name__
+
+            if error is not None:
+                failures.append((path, error))
+
+            else:
+                imageFiles.append(imageFile)
+
+        statistics = {'files': len(paths),
+                      'opened': len(imageFiles),
+                      'failed': len(failures),
+                      'seconds': time.perf_counter() - start,
+                      'openSeconds': sum(seconds),
+                      'meanOpenSeconds':
+                          sum(seconds) / len(seconds) if seconds else 0.0,
+                      'maxOpenSeconds': max(seconds) if seconds else 0.0}
+
+        return imageFiles, failures, statistics
+
+    # -------------------------------------------------------------------------
+    # _openOne
+    #
+    # This opens and validates one file for openMany(), returning
+    # (imageFile, error message or None, seconds).  The image file is
+    # returned only when keep is true.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _openOne(cls, pathToFile, kwargs, keep=True):
+
+        start = time.perf_counter()
+        imageFile = None
+        error = None
+
+        try:
+            imageFile = cls(pathToFile, **kwargs)
+            imageFile.validate()
+
+        except Exception as e:
+
+            imageFile = None
+            error = str(e) or type(e).__name__
+
+        return (imageFile if keep else None,
+                error,
+                time.perf_counter() - start)
+
+    # -------------------------------------------------------------------------
+    # _readBlock
+    #
+    # This reads one block of a dask array.  It runs in a dask task, which may
+    # be in another process, so it opens the image itself.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _readBlock(pathToFile, subdataset, bands, window):
+
+        block = ImageFile(pathToFile, subdataset).readWindow(*window,
+                                                             bands=bands)
+
+        return block.reshape((len(bands),) + block.shape[-2:])
+
+    # -------------------------------------------------------------------------
+    # readWindow
+    #
+    # This reads a window of the listed bands, numbered from 1 as in GDAL, in
+    # one call.  The result is in GDAL's (band, row, column) order, or
+    # (row, column) when one band is read.  When out is given, GDAL reads
+    # directly into it, following its strides, so it may be a view with any
+    # memory layout.  With a cache, windows read before are copied from it.
+    #
+    # bufSize, (x, y), reads the window decimated to that size, using the
+    # GDAL GRIORA_ resampling algorithm.  GDAL reads from the best overview,
+    # when there are any.
+    # -------------------------------------------------------------------------
+    def readWindow(self,
+                   xStart,
+                   yStart,
+                   xLen,
+                   yLen,
+                   bands=None,
+                   out=None,
+                   bufSize=None,
+                   resampling=gdalconst.GRIORA_NearestNeighbour):
+
+        xBuf, yBuf = bufSize or (None, None)
+
+        def read():
+
+            return self.getDataset().ReadAsArray(xStart,
+                                                 yStart,
+                                                 xLen,
+                                                 yLen,
+                                                 buf_obj=out,
+                                                 buf_xsize=xBuf,
+                                                 buf_ysize=yBuf,
+                                                 resample_alg=resampling,
+                                                 band_list=bands)
+
+        if self._cache is None:
+            return read()
+
+        key = ChunkCache.makeKey(self._filePath,
+                                 (xStart, yStart, xLen, yLen),
+                                 bands,
+                                 (self._subdataset,
+                                  tuple(bufSize) if bufSize else None,
+                                  resampling))
+
+        chunk = self._cache.get(key, out)
+
+        if chunk is None:
+
+            chunk = read()
+
+            # Cache it as GDAL returns a single band without out.
+            self._cache.put(key,
+                            chunk[0] if chunk.ndim == 3 and len(chunk) == 1
+                            else chunk)
+
+        return chunk
+
+    # -------------------------------------------------------------------------
+    # toDataArray
+    #
+    # This wraps toDaskArray() in a lazy xarray DataArray with (band, y, x)
+    # dimensions, whose x and y coordinates are pixel centers computed from
+    # the geotransform.  It requires xarray and a north-up image.
+    # -------------------------------------------------------------------------
+    def toDataArray(self, chunks=None, bands=None):
+
+        if not xarray:
+            raise RuntimeError('toDataArray() requires xarray.')
+
+        dataset = self.getDataset()
+        xform = dataset.GetGeoTransform()
+
+        if xform[2] or xform[4]:
+
+            raise RuntimeError(self._filePath +
+                               ' is rotated, so its coordinates cannot be ' +
+                               'expressed along x and y.')
+
+        array = self.toDaskArray(chunks, bands)
+        bands = bands or list(range(1, dataset.RasterCount + 1))
+        xCoords = [xform[0] + (x + 0.5) * xform[1]
+                   for x in range(dataset.RasterXSize)]
+
+        yCoords = [xform[3] + (y + 0.5) * xform[5]
+                   for y in range(dataset.RasterYSize)]
+
+        return xarray.DataArray(array,
+                                dims=('band', 'y', 'x'),
+                                coords={'band': bands,
+                                        'y': yCoords,
+                                        'x': xCoords},
+                                attrs={'crs': dataset.GetProjection(),
+                                       'transform': tuple(xform)})
+
+    # -------------------------------------------------------------------------
+    # toDaskArray
+    #
+    # This returns a lazy dask array of the image, in GDAL's (band, row,
+    # column) order, for out-of-core array code.  Each block is a windowed
+    # read, like a Chunker chunk, done by a task that opens the image itself,
+    # because GDAL datasets cannot be pickled.  So it works with dask's
+    # threaded, process and distributed schedulers.  chunks is (x, y), which
+    # defaults to a multiple of the image's blocks of about
+    # DEFAULT_DASK_CHUNK_PIXELS pixels.  bands, numbered from 1, defaults to
+    # every band.  It requires dask.
+    # -------------------------------------------------------------------------
+    def toDaskArray(self, chunks=None, bands=None):
+
+        if not dask:
+            raise RuntimeError('toDaskArray() requires dask.')
+
+        dataset = self.getDataset()
+        xImage = dataset.RasterXSize
+        yImage = dataset.RasterYSize
+        bands = list(bands or range(1, dataset.RasterCount + 1))
+
+        if not chunks:
+
+            xBlock, yBlock = dataset.GetRasterBand(1).GetBlockSize()
+
+            multiple = max(1, int(math.sqrt(
+                ImageFile.DEFAULT_DASK_CHUNK_PIXELS / (xBlock * yBlock))))
+
+            chunks = (min(xImage, xBlock * multiple),
+                      min(yImage, yBlock * multiple))
+
+        xChunk, yChunk = chunks
+        xStarts = range(0, xImage, xChunk)
+        yStarts = range(0, yImage, yChunk)
+        xLens = tuple(min(xChunk, xImage - x) for x in xStarts)
+        yLens = tuple(min(yChunk, yImage - y) for y in yStarts)
+
+        name = 'ImageFile-' + tokenize(self._filePath,
+                                       self._subdataset,
+                                       bands,
+                                       chunks)
+
+        graph = {(name, 0, row, col): (ImageFile._readBlock,
+                                       self._filePath,
+                                       self._subdataset,
+                                       bands,
+                                       (x, y, xLens[col], yLens[row]))
+                 for row, y in enumerate(yStarts)
+                 for col, x in enumerate(xStarts)}
+
+        dataType = gdal_array.GDALTypeCodeToNumericTypeCode(
+            dataset.GetRasterBand(bands[0]).DataType)
+
+        return dask.array.Array(graph,
+                                name,
+                                chunks=((len(bands),), yLens, xLens),
+                                dtype=dataType)
+
+    # -------------------------------------------------------------------------
+    # _releaseDataset
+    #
+    # This drops the dataset, returning it to the pool, if there is one.
+    # -------------------------------------------------------------------------
+    def _releaseDataset(self):
+
+        # The token goes first, so the pool's onEvict leaves the rest alone.
+        self._poolToken = None
+        releaseHandle = self._releaseHandle
+        self._releaseHandle = None
+        self._dataset = None
+
+        if releaseHandle:
+            releaseHandle()
+
+    # -------------------------------------------------------------------------
+    # setCache
+    #
+    # This keeps windows read by readWindow() in a ChunkCache, like
+    # ChunkCache.getDefault().  None stops caching.
+    # -------------------------------------------------------------------------
+    def setCache(self, cache=None):
+
+        self._cache = cache
+
+    # -------------------------------------------------------------------------
+    # setMetadataCache
+    #
+    # None stops caching metadata.
+    # -------------------------------------------------------------------------
+    def setMetadataCache(self, metadataCache=None):
+
+        self._metadataCache = metadataCache
+        self._metadata = None
+
+    # -------------------------------------------------------------------------
+    # setPool
+    #
+    # This borrows the dataset from a DatasetPool, like
+    # DatasetPool.getDefault(), from now on, so the number of open datasets in
+    # the process is bounded, and files are not reopened from scratch.  When
+    # the pool closes the dataset, because it is the least recently used, it
+    # is reopened, and prepared again, on the next use.  None stops pooling.
+    # The current dataset is released here, and reopened on the next use.
+    # -------------------------------------------------------------------------
+    def setPool(self, pool=None):
+
+        self._releaseDataset()
+        self._pool = pool
+
+    # -------------------------------------------------------------------------
+    # validate
+    #
+    # This opens the dataset of a lazy ImageFile now, raising RuntimeError if
+    # it cannot be opened.
+    # -------------------------------------------------------------------------
+    def validate(self):
+
+        self.getDataset()
+
+    # -------------------------------------------------------------------------
+    # __getstate__
+    #
+    # ImageFiles pickle compactly, for task queues, as their path, subdataset,
+    # mode and any metadata already read.  The dataset is not opened to
+    # pickle them, and the cache, pool and metadata cache, which belong to
+    # this process, are not included.
+    # -------------------------------------------------------------------------
+    def __getstate__(self):
+
+        return {ImageFile.FILE_KEY: self._filePath,
+                ImageFile.SUBDATASET_KEY: self._subdataset,
+                ImageFile.READ_ONLY_KEY: self._readOnly,
+                ImageFile.METADATA_KEY: self._metadata}
+
+    # -------------------------------------------------------------------------
+    # __setstate__
+    #
+    # The dataset opens lazily, on first use.  Metadata answers
+    # getMetadata() without opening it.
+    # -------------------------------------------------------------------------
+    def __setstate__(self, state):
+
+        self.__init__(state[ImageFile.FILE_KEY],
+                      state[ImageFile.SUBDATASET_KEY],
+                      state[ImageFile.READ_ONLY_KEY],
+                      lazy=True)
 
-        return self._dataset
+        self._metadata = state[ImageFile.METADATA_KEY]
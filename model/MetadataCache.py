@@ -0,0 +1,203 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import sqlite3
+import threading
+
+
+# -----------------------------------------------------------------------------
+# class MetadataCache
+#
+# This keeps the metadata of images in a local SQLite database, so scanning
+# the same files again does not open them.  Each entry holds an image's
+# dimensions, band count, data types, no-data values, geotransform,
+# projection and subdatasets, as described by describe().  Entries are keyed
+# by the file's absolute path, subdataset, size and modification time, so a
+# rewritten file is described again.  One cache may be shared by many threads
+# and processes.  getDefault() returns the cache in DEFAULT_PATH.
+#
+# cache = MetadataCache.getDefault()
+#
+# for path in paths:
+#     image = GeospatialImageFile(path, lazy=True, metadataCache=cache)
+#     print(image.envelope())
+# -----------------------------------------------------------------------------
+class MetadataCache(object):
+
+    DEFAULT_PATH = os.path.join(os.path.expanduser('~'),
+                                '.cache',
+                                'core',
+                                'metadata.sqlite')
+
+    _default = None
+    _defaultLock = threading.Lock()
+
+    # -------------------------------------------------------------------------
+    # __init__
+    #
+    # pathToDatabase is created when it does not exist.  ':memory:' keeps the
+    # cache in this process only.
+    # -------------------------------------------------------------------------
+    def __init__(self, pathToDatabase=DEFAULT_PATH):
+
+        if pathToDatabase != ':memory:':
+
+            directory = os.path.dirname(os.path.abspath(pathToDatabase))
+            os.makedirs(directory, exist_ok=True)
+
+        self._pathToDatabase = pathToDatabase
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+        self._connection = sqlite3.connect(pathToDatabase,
+                                           timeout=30,
+                                           check_same_thread=False,
+                                           isolation_level=None)
+
+        if pathToDatabase != ':memory:':
+            self._connection.execute('PRAGMA journal_mode=WAL')
+
+        self._connection.execute('CREATE TABLE IF NOT EXISTS metadata (' +
+                                 'path TEXT NOT NULL, ' +
+                                 'subdataset TEXT NOT NULL, ' +
+                                 'size INTEGER NOT NULL, ' +
+                                 'mtime INTEGER NOT NULL, ' +
+                                 'metadata TEXT NOT NULL, ' +
+                                 'PRIMARY KEY (path, subdataset))')
+
+    # -------------------------------------------------------------------------
+    # clear
+    # -------------------------------------------------------------------------
+    def clear(self):
+
+        self.invalidate()
+
+    # -------------------------------------------------------------------------
+    # describe
+    #
+    # This returns the metadata of an open dataset, as a dictionary that
+    # serializes to JSON.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def describe(dataset):
+
+        bands = [dataset.GetRasterBand(band)
+                 for band in range(1, dataset.RasterCount + 1)]
+
+        subdatasets = dataset.GetMetadata('SUBDATASETS') or {}
+        names = sorted(key for key in subdatasets if key.endswith('_NAME'))
+
+        return {'xSize': dataset.RasterXSize,
+                'ySize': dataset.RasterYSize,
+                'numBands': dataset.RasterCount,
+                'dataTypes': [band.DataType for band in bands],
+                'noDataValues': [band.GetNoDataValue() for band in bands],
+                'geoTransform': list(dataset.GetGeoTransform()),
+                'projection': dataset.GetProjection() or '',
+                'subdatasets': [[subdatasets[name],
+                                 subdatasets.get(name[:-5] + '_DESC', '')]
+                                for name in names]}
+
+    # -------------------------------------------------------------------------
+    # get
+    #
+    # This returns the metadata of a file or its subdataset, as put, or None
+    # when the file is not cached or has changed since.
+    # -------------------------------------------------------------------------
+    def get(self, pathToFile, subdataset=None):
+
+        path, size, mtime = MetadataCache._stat(pathToFile)
+
+        with self._lock:
+
+            row = self._connection.execute(
+                'SELECT metadata FROM metadata WHERE path = ? AND ' +
+                'subdataset = ? AND size = ? AND mtime = ?',
+                (path, subdataset or '', size, mtime)).fetchone()
+
+            if row is None:
+
+                self._misses += 1
+                return None
+
+            self._hits += 1
+
+        return json.loads(row[0])
+
+    # -------------------------------------------------------------------------
+    # getDefault
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def getDefault():
+
+        with MetadataCache._defaultLock:
+
+            if MetadataCache._default is None:
+                MetadataCache._default = MetadataCache()
+
+            return MetadataCache._default
+
+    # -------------------------------------------------------------------------
+    # invalidate
+    #
+    # This removes the entries of one file, or every entry when no file is
+    # given.
+    # -------------------------------------------------------------------------
+    def invalidate(self, pathToFile=None):
+
+        with self._lock:
+
+            if pathToFile is None:
+                self._connection.execute('DELETE FROM metadata')
+
+            else:
+
+                self._connection.execute('DELETE FROM metadata ' +
+                                         'WHERE path = ?',
+                                         (os.path.abspath(pathToFile),))
+
+    # -------------------------------------------------------------------------
+    # put
+    # -------------------------------------------------------------------------
+    def put(self, pathToFile, metadata, subdataset=None):
+
+        path, size, mtime = MetadataCache._stat(pathToFile)
+
+        with self._lock:
+
+            self._connection.execute(
+                'INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?)',
+                (path, subdataset or '', size, mtime, json.dumps(metadata)))
+
+    # -------------------------------------------------------------------------
+    # _stat
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _stat(pathToFile):
+
+        stat = os.stat(pathToFile)
+
+        return os.path.abspath(pathToFile), stat.st_size, stat.st_mtime_ns
+
+    # -------------------------------------------------------------------------
+    # statistics
+    # -------------------------------------------------------------------------
+    def statistics(self):
+
+        with self._lock:
+            hits, misses = self._hits, self._misses
+
+        return {'hits': hits, 'misses': misses, 'entries': len(self)}
+
+    # -------------------------------------------------------------------------
+    # __len__
+    # -------------------------------------------------------------------------
+    def __len__(self):
+
+        with self._lock:
+
+            return self._connection.execute(
+                'SELECT COUNT(*) FROM metadata').fetchone()[0]
@@ -0,0 +1,152 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import math
+
+import numpy as np
+
+
+# -----------------------------------------------------------------------------
+# class QuantileSketch
+#
+# This estimates quantiles of a stream of values in constant memory, without
+# knowing their range in advance.  Values are counted in logarithmic bins, so
+# any quantile is within relativeAccuracy of a true value, and the number of
+# bins grows only with the logarithm of the values' range.  Sketches with the
+# same accuracy merge exactly, so partial sketches from threads, processes or
+# Celery tasks combine into the sketch of all their values.  This is the
+# DDSketch algorithm of Masson, Rim and Lee.
+# -----------------------------------------------------------------------------
+class QuantileSketch(object):
+
+    DEFAULT_ACCURACY = 0.01
+    MIN_VALUE = 1e-9
+
+    # -------------------------------------------------------------------------
+    # __init__
+    # -------------------------------------------------------------------------
+    def __init__(self, relativeAccuracy=DEFAULT_ACCURACY):
+
+        if not 0 < relativeAccuracy < 1:
+
+            raise RuntimeError('The relative accuracy must be between ' +
+                               '0 and 1.')
+
+        self._accuracy = relativeAccuracy
+        self._gamma = (1 + relativeAccuracy) / (1 - relativeAccuracy)
+        self._logGamma = math.log(self._gamma)
+        self._positive = {}
+        self._negative = {}
+        self._zeros = 0
+
+    # -------------------------------------------------------------------------
+    # add
+    #
+    # This adds an array of values, which must not contain NaN.
+    # -------------------------------------------------------------------------
+    def add(self, values):
+
+        values = np.asarray(values, dtype=np.float64).ravel()
+        magnitudes = np.abs(values)
+        isZero = magnitudes < QuantileSketch.MIN_VALUE
+        self._zeros += int(isZero.sum())
+
+        self._addBins(self._positive, magnitudes[(values > 0) & ~isZero])
+        self._addBins(self._negative, magnitudes[(values < 0) & ~isZero])
+
+    # -------------------------------------------------------------------------
+    # _addBins
+    # -------------------------------------------------------------------------
+    def _addBins(self, bins, magnitudes):
+
+        if not magnitudes.size:
+            return
+
+        indices = np.ceil(np.log(magnitudes) / self._logGamma).astype(np.int64)
+        first = indices.min()
+        counts = np.bincount(indices - first)
+
+        for offset in np.flatnonzero(counts):
+
+            index = int(first + offset)
+            bins[index] = bins.get(index, 0) + int(counts[offset])
+
+    # -------------------------------------------------------------------------
+    # count
+    # -------------------------------------------------------------------------
+    def count(self):
+
+        return self._zeros + sum(self._positive.values()) + \
+            sum(self._negative.values())
+
+    # -------------------------------------------------------------------------
+    # merge
+    #
+    # This adds the values of another sketch, and returns this sketch.
+    # -------------------------------------------------------------------------
+    def merge(self, other):
+
+        if other._accuracy != self._accuracy:
+
+            raise RuntimeError('Sketches with different accuracies, ' +
+                               str(self._accuracy) +
+                               ' and ' +
+                               str(other._accuracy) +
+                               ', cannot be merged.')
+
+        for bins, otherBins in ((self._positive, other._positive),
+                                (self._negative, other._negative)):
+
+            for index, count in otherBins.items():
+                bins[index] = bins.get(index, 0) + count
+
+        self._zeros += other._zeros
+
+        return self
+
+    # -------------------------------------------------------------------------
+    # quantile
+    #
+    # q is from 0 to 1.  When the sketch is empty, this returns NaN.
+    # -------------------------------------------------------------------------
+    def quantile(self, q):
+
+        if not 0 <= q <= 1:
+            raise RuntimeError('The quantile must be from 0 to 1.')
+
+        total = self.count()
+
+        if not total:
+            return float('nan')
+
+        rank = q * (total - 1)
+        seen = 0
+
+        # Bins in ascending order of value: negatives, zeros, then positives.
+        for index in sorted(self._negative, reverse=True):
+
+            seen += self._negative[index]
+
+            if seen > rank:
+                return -self._binValue(index)
+
+        seen += self._zeros
+
+        if seen > rank:
+            return 0.0
+
+        for index in sorted(self._positive):
+
+            seen += self._positive[index]
+
+            if seen > rank:
+                return self._binValue(index)
+
+        return self._binValue(max(self._positive))
+
+    # -------------------------------------------------------------------------
+    # _binValue
+    # -------------------------------------------------------------------------
+    def _binValue(self, index):
+
+        return 2 * self._gamma ** index / (self._gamma + 1)
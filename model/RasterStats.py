@@ -0,0 +1,294 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from core.model.Chunker import Chunker
+from core.model.QuantileSketch import QuantileSketch
+
+
+# -----------------------------------------------------------------------------
+# class RasterStats
+#
+# This computes per-band statistics of an image in one streaming pass over its
+# chunks, so memory does not depend on the image size.  Each band has its
+# count, minimum, maximum, mean and variance, an approximate quantile sketch
+# and, when histRange is given, a histogram with fixed bins.  No-data pixels
+# and NaNs are excluded.
+#
+# Partial statistics merge exactly.  Means and variances combine with Chan's
+# parallel form of Welford's algorithm, histograms with the same bins add, and
+# sketches merge.  RasterStats pickle, so partial results may come from
+# threads, processes or Celery tasks.  For example, with ChunkedMapReduce,
+# map chunks to RasterStats and reduce them with RasterStats.merge.
+#
+# stats = RasterStats.fromImage(path, histRange=(0, 255), workers=4)
+# print(stats.mean(), stats.std(), stats.percentile(50))
+# -----------------------------------------------------------------------------
+class RasterStats(object):
+
+    DEFAULT_NUM_BINS = 256
+
+    # -------------------------------------------------------------------------
+    # __init__
+    #
+    # noDataValue is one value for every band, or a list with one per band.
+    # histRange is the (low, high) range of the histograms' bins.
+    # -------------------------------------------------------------------------
+    def __init__(self,
+                 numBands=1,
+                 noDataValue=None,
+                 histRange=None,
+                 numBins=DEFAULT_NUM_BINS,
+                 relativeAccuracy=QuantileSketch.DEFAULT_ACCURACY):
+
+        if numBands < 1:
+            raise RuntimeError('The number of bands must be at least one.')
+
+        if not isinstance(noDataValue, (list, tuple)):
+            noDataValue = [noDataValue] * numBands
+
+        if len(noDataValue) != numBands:
+
+            raise RuntimeError('There must be one no-data value per band, ' +
+                               'but there are ' +
+                               str(len(noDataValue)) +
+                               ' for ' +
+                               str(numBands) +
+                               ' bands.')
+
+        self._numBands = numBands
+        self._noData = list(noDataValue)
+        self._count = np.zeros(numBands, dtype=np.int64)
+        self._min = np.full(numBands, np.inf)
+        self._max = np.full(numBands, -np.inf)
+        self._mean = np.zeros(numBands)
+        self._m2 = np.zeros(numBands)
+
+        self._sketches = [QuantileSketch(relativeAccuracy)
+                          for band in range(numBands)]
+
+        self._edges = None
+        self._histograms = None
+
+        if histRange:
+
+            self._edges = np.linspace(histRange[0], histRange[1], numBins + 1)
+
+            self._histograms = np.zeros((numBands, numBins),
+                                        dtype=np.int64)
+
+    # -------------------------------------------------------------------------
+    # _combine
+    #
+    # This merges the moments of other values into a band's.
+    # -------------------------------------------------------------------------
+    def _combine(self, band, count, mean, m2, minimum, maximum):
+
+        total = self._count[band] + count
+        delta = mean - self._mean[band]
+        self._mean[band] += delta * count / total
+
+        self._m2[band] += m2 + \
+            delta * delta * self._count[band] * count / total
+
+        self._count[band] = total
+        self._min[band] = min(self._min[band], minimum)
+        self._max[band] = max(self._max[band], maximum)
+
+    # -------------------------------------------------------------------------
+    # count
+    # -------------------------------------------------------------------------
+    def count(self):
+
+        return self._count.copy()
+
+    # -------------------------------------------------------------------------
+    # fromImage
+    #
+    # This computes the statistics of an image's bands, numbered from 1, or of
+    # every band.  noDataValue defaults to each band's own.  Chunks follow the
+    # image's blocks, and workers threads read them.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def fromImage(pathToFile,
+                  bands=None,
+                  noDataValue=None,
+                  histRange=None,
+                  numBins=DEFAULT_NUM_BINS,
+                  workers=1):
+
+        chunker = Chunker(pathToFile)
+        chunker.setBands(bands)
+        chunker.setLayout(Chunker.LAYOUT_BXY)
+        chunker.setChunkToBlocks()
+
+        dataset = chunker.getImageFile().getDataset()
+        bands = bands or list(range(1, dataset.RasterCount + 1))
+
+        if noDataValue is None:
+
+            noDataValue = [dataset.GetRasterBand(band).GetNoDataValue()
+                           for band in bands]
+
+        stats = RasterStats(len(bands), noDataValue, histRange, numBins)
+
+        for loc, chunk in chunker.iterChunks(workers=workers):
+            stats.update(chunk)
+
+        return stats
+
+    # -------------------------------------------------------------------------
+    # histogram
+    #
+    # This returns a band's bin counts and the bins' edges.
+    # -------------------------------------------------------------------------
+    def histogram(self, band=0):
+
+        if self._histograms is None:
+
+            raise RuntimeError('There is no histogram, because no ' +
+                               'histogram range was given.')
+
+        return self._histograms[band].copy(), self._edges.copy()
+
+    # -------------------------------------------------------------------------
+    # maximum
+    # -------------------------------------------------------------------------
+    def maximum(self):
+
+        return np.where(self._count > 0, self._max, np.nan)
+
+    # -------------------------------------------------------------------------
+    # mean
+    # -------------------------------------------------------------------------
+    def mean(self):
+
+        return np.where(self._count > 0, self._mean, np.nan)
+
+    # -------------------------------------------------------------------------
+    # merge
+    #
+    # This adds the statistics of another RasterStats with the same bands and
+    # histogram bins, and returns this RasterStats.
+    # -------------------------------------------------------------------------
+    def merge(self, other):
+
+        if other._numBands != self._numBands:
+
+            raise RuntimeError('Statistics of ' +
+                               str(other._numBands) +
+                               ' bands cannot be merged with statistics of ' +
+                               str(self._numBands) +
+                               ' bands.')
+
+        if (self._edges is None) != (other._edges is None) or \
+           (self._edges is not None and
+                not np.array_equal(self._edges, other._edges)):
+
+            raise RuntimeError('Statistics with different histogram ' +
+                               'bins cannot be merged.')
+
+        for band in range(self._numBands):
+
+            if other._count[band]:
+
+                self._combine(band,
+                              other._count[band],
+                              other._mean[band],
+                              other._m2[band],
+                              other._min[band],
+                              other._max[band])
+
+            self._sketches[band].merge(other._sketches[band])
+
+        if self._histograms is not None:
+            self._histograms += other._histograms
+
+        return self
+
+    # -------------------------------------------------------------------------
+    # minimum
+    # -------------------------------------------------------------------------
+    def minimum(self):
+
+        return np.where(self._count > 0, self._min, np.nan)
+
+    # -------------------------------------------------------------------------
+    # percentile
+    #
+    # This estimates each band's percentile, from 0 to 100, from its sketch.
+    # -------------------------------------------------------------------------
+    def percentile(self, percent):
+
+        return np.array([sketch.quantile(percent / 100.0)
+                         for sketch in self._sketches])
+
+    # -------------------------------------------------------------------------
+    # std
+    # -------------------------------------------------------------------------
+    def std(self):
+
+        return np.sqrt(self.variance())
+
+    # -------------------------------------------------------------------------
+    # update
+    #
+    # This adds a chunk of (band, x, y) or (band, y, x) pixels, as read with
+    # LAYOUT_BXY or LAYOUT_BYX.  A chunk of one band may be two dimensional.
+    # -------------------------------------------------------------------------
+    def update(self, chunk):
+
+        chunk = np.asarray(chunk)
+
+        if chunk.ndim == 2:
+            chunk = chunk[np.newaxis]
+
+        if len(chunk) != self._numBands:
+
+            raise RuntimeError('The chunk has ' +
+                               str(len(chunk)) +
+                               ' bands, but the statistics have ' +
+                               str(self._numBands) +
+                               '.')
+
+        for band in range(self._numBands):
+
+            values = chunk[band].ravel()
+            noData = self._noData[band]
+
+            if values.dtype.kind == 'f':
+                values = values[~np.isnan(values)]
+
+            if noData is not None and not np.isnan(noData):
+                values = values[values != noData]
+
+            if not values.size:
+                continue
+
+            mean = values.mean(dtype=np.float64)
+            m2 = np.square(values - mean).sum()
+
+            self._combine(band,
+                          values.size,
+                          mean,
+                          m2,
+                          values.min(),
+                          values.max())
+
+            self._sketches[band].add(values)
+
+            if self._histograms is not None:
+
+                self._histograms[band] += \
+                    np.histogram(values, bins=self._edges)[0]
+
+    # -------------------------------------------------------------------------
+    # variance
+    #
+    # This is the population variance.
+    # -------------------------------------------------------------------------
+    def variance(self):
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self._count > 0, self._m2 / self._count, np.nan)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor
+import math
+
+import numpy as np
+
+from osgeo import gdal_array
+
+from core.model.Chunker import Chunker
+
+
+# -----------------------------------------------------------------------------
+# class StackChunker
+#
+# This chunks a stack of co-registered images, like a time series, reading
+# the same window of every image.  The images' sizes, geotransforms and SRSs
+# are checked once, when the StackChunker is created.  Each chunk is an array
+# of (image, x, y), in the order of the paths, of one band of each image.
+#
+# Each image has its own Chunker, and so its own dataset.  The images of a
+# window are read concurrently, each by one thread, directly into the stack.
+# While the caller works on a chunk, the next window is already being read.
+#
+# stack = StackChunker(sorted(glob.glob('merra/*.nc')))
+# stack.setChunkToBlocks()
+#
+# for loc, chunk in stack.iterChunks():
+#     trend = fitTrend(chunk)
+# -----------------------------------------------------------------------------
+class StackChunker(object):
+
+    # Origins may differ by this fraction of a pixel.
+    ORIGIN_TOLERANCE = 1e-3
+
+    # -------------------------------------------------------------------------
+    # __init__
+    #
+    # band is the band, numbered from 1, read from every image.  workers is
+    # the number of reading threads, defaulting to one per image.
+    # -------------------------------------------------------------------------
+    def __init__(self, imageFileNames, band=1, workers=None):
+
+        if not imageFileNames:
+            raise RuntimeError('A stack requires at least one image.')
+
+        self._chunkers = [Chunker(name) for name in imageFileNames]
+        self._workers = workers or len(self._chunkers)
+
+        for chunker in self._chunkers:
+            chunker.setBands([band])
+
+        reference = self._chunkers[0].getImageFile()
+
+        for chunker in self._chunkers[1:]:
+            self._checkAlignment(reference, chunker.getImageFile())
+
+        self._dataTypes = [gdal_array.GDALTypeCodeToNumericTypeCode(
+            chunker.getImageFile().getDataset().GetRasterBand(band).DataType)
+            for chunker in self._chunkers]
+
+        self._dataType = np.result_type(*self._dataTypes)
+
+    # -------------------------------------------------------------------------
+    # _checkAlignment
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _checkAlignment(reference, imageFile):
+
+        refDataset = reference.getDataset()
+        dataset = imageFile.getDataset()
+        refSrs = refDataset.GetSpatialRef()
+        srs = dataset.GetSpatialRef()
+
+        if (refDataset.RasterXSize, refDataset.RasterYSize) != \
+           (dataset.RasterXSize, dataset.RasterYSize):
+
+            reason = 'size'
+
+        elif not StackChunker._isAligned(refDataset.GetGeoTransform(),
+                                         dataset.GetGeoTransform()):
+
+            reason = 'geotransform'
+
+        elif bool(refSrs) != bool(srs) or (srs and not srs.IsSame(refSrs)):
+            reason = 'SRS'
+
+        else:
+            return
+
+        raise RuntimeError('The ' +
+                           reason +
+                           ' of ' +
+                           imageFile.fileName() +
+                           ' differs from that of ' +
+                           reference.fileName() +
+                           '.')
+
+    # -------------------------------------------------------------------------
+    # _isAligned
+    #
+    # Pixel sizes and rotations must be identical, and origins within
+    # ORIGIN_TOLERANCE of a pixel.  A relative tolerance would grow with the
+    # coordinates, and allow many pixels of misalignment on projected grids.
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _isAligned(refXform, xform):
+
+        if [refXform[i] for i in (1, 2, 4, 5)] != \
+           [xform[i] for i in (1, 2, 4, 5)]:
+
+            return False
+
+        tolerance = StackChunker.ORIGIN_TOLERANCE * \
+            min(math.hypot(refXform[1], refXform[4]),
+                math.hypot(refXform[2], refXform[5]))
+
+        return abs(xform[0] - refXform[0]) <= tolerance and \
+            abs(xform[3] - refXform[3]) <= tolerance
+
+    # -------------------------------------------------------------------------
+    # getChunkPlan
+    # -------------------------------------------------------------------------
+    def getChunkPlan(self):
+
+        return self._chunkers[0].getChunkPlan()
+
+    # -------------------------------------------------------------------------
+    # iterChunks
+    #
+    # This yields ((xStart, yStart), chunk) for every window of
+    # getChunkPlan(), or for the given chunk numbers, in order.
+    # -------------------------------------------------------------------------
+    def iterChunks(self, indices=None):
+
+        windows = iter(self.getChunkPlan().windows(indices).tolist())
+
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+
+            window = next(windows, None)
+            pending = self._submitWindow(executor, window) if window else None
+
+            while pending:
+
+                stack, futures = pending
+
+                for future in futures:
+                    future.result()
+
+                # Start reading the next window before yielding this one.
+                nextWindow = next(windows, None)
+
+                pending = self._submitWindow(executor, nextWindow) \
+                    if nextWindow else None
+
+                yield (tuple(window[:2]), stack)
+
+                window = nextWindow
+
+    # -------------------------------------------------------------------------
+    # readWindow
+    #
+    # This reads one window of every image into an (image, x, y) array.
+    # -------------------------------------------------------------------------
+    def readWindow(self, xStart, yStart, xLen, yLen):
+
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+
+            stack, futures = self._submitWindow(executor,
+                                                (xStart, yStart, xLen, yLen))
+
+            for future in futures:
+                future.result()
+
+        return stack
+
+    # -------------------------------------------------------------------------
+    # _readInto
+    #
+    # Images of the stack's data type are read directly into their layer.
+    # -------------------------------------------------------------------------
+    def _readInto(self, index, window, layer):
+
+        chunker = self._chunkers[index]
+
+        if self._dataTypes[index] == layer.dtype:
+            chunker.readWindow(*window, out=layer)
+
+        else:
+            layer[...] = chunker.readWindow(*window)
+
+    # -------------------------------------------------------------------------
+    # setChunkSize
+    # -------------------------------------------------------------------------
+    def setChunkSize(self, xSize, ySize):
+
+        self._chunkers[0].setChunkSize(xSize, ySize)
+
+    # -------------------------------------------------------------------------
+    # setChunkToBlocks
+    #
+    # This sets block-aligned chunks of the first image, so that a whole stack
+    # holds, at most, about maxPixels pixels.
+    # -------------------------------------------------------------------------
+    def setChunkToBlocks(self,
+                         multiple=None,
+                         maxPixels=Chunker.DEFAULT_CHUNK_PIXELS):
+
+        self._chunkers[0].setChunkToBlocks(
+            multiple,
+            max(1, maxPixels // len(self._chunkers)))
+
+    # -------------------------------------------------------------------------
+    # _submitWindow
+    #
+    # This allocates a window's stack and starts reading each image into it.
+    # -------------------------------------------------------------------------
+    def _submitWindow(self, executor, window):
+
+        stack = np.empty((len(self._chunkers), window[2], window[3]),
+                         dtype=self._dataType)
+
+        futures = [executor.submit(self._readInto, i, window, stack[i])
+                   for i in range(len(self._chunkers))]
+
+        return stack, futures
+
+    # -------------------------------------------------------------------------
+    # __len__
+    # -------------------------------------------------------------------------
+    def __len__(self):
+
+        return len(self._chunkers)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from core.model.ChunkCache import ChunkCache
+
+
+# -----------------------------------------------------------------------------
+# class ChunkCacheTestCase
+#
+# python -m unittest discover model/tests/
+# python -m unittest core.model.tests.test_ChunkCache
+# -----------------------------------------------------------------------------
+class ChunkCacheTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._testFile = tempfile.mkstemp()[1]
+        self.addCleanup(os.remove, self._testFile)
+
+    # -------------------------------------------------------------------------
+    # testGetAndPut
+    # -------------------------------------------------------------------------
+    def testGetAndPut(self):
+
+        cache = ChunkCache()
+        key = ChunkCache.makeKey(self._testFile, (0, 0, 10, 10), [1])
+        self.assertIsNone(cache.get(key))
+
+        array = np.arange(100, dtype=np.int32).reshape(10, 10)
+        cache.put(key, array)
+
+        # Callers cannot modify the cached array.
+        array[0, 0] = -1
+        chunk = cache.get(key)
+        self.assertEqual(chunk[0, 0], 0)
+        chunk[0, 0] = -1
+        self.assertEqual(cache.get(key)[0, 0], 0)
+
+        out = np.empty((10, 10), dtype=np.int32)
+        self.assertIs(cache.get(key, out), out)
+        self.assertEqual(out[9, 9], 99)
+
+        stats = cache.statistics()
+        self.assertEqual(stats['hits'], 3)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['bytes'], 400)
+
+    # -------------------------------------------------------------------------
+    # testEviction
+    # -------------------------------------------------------------------------
+    def testEviction(self):
+
+        cache = ChunkCache(maxBytes=1000)
+        keys = [ChunkCache.makeKey(self._testFile, (i, 0, 10, 10))
+                for i in range(3)]
+
+        cache.put(keys[0], np.zeros(400, dtype=np.uint8))
+        cache.put(keys[1], np.zeros(400, dtype=np.uint8))
+        cache.get(keys[0])
+        cache.put(keys[2], np.zeros(400, dtype=np.uint8))
+
+        # The least recently used entry was evicted.
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[2]))
+        self.assertEqual(cache.statistics()['evictions'], 1)
+        self.assertEqual(cache.statistics()['bytes'], 800)
+
+        # Arrays larger than the cache are not kept.
+        cache.put(keys[1], np.zeros(2000, dtype=np.uint8))
+        self.assertIsNone(cache.get(keys[1]))
+
+        cache.setMaxBytes(500)
+        self.assertEqual(len(cache), 1)
+
+        with self.assertRaisesRegex(RuntimeError, 'must not be negative'):
+            cache.setMaxBytes(-1)
+
+    # -------------------------------------------------------------------------
+    # testInvalidate
+    # -------------------------------------------------------------------------
+    def testInvalidate(self):
+
+        cache = ChunkCache()
+        otherFile = tempfile.mkstemp()[1]
+        self.addCleanup(os.remove, otherFile)
+
+        key = ChunkCache.makeKey(self._testFile, (0, 0, 1, 1))
+        otherKey = ChunkCache.makeKey(otherFile, (0, 0, 1, 1))
+        cache.put(key, np.zeros(1))
+        cache.put(otherKey, np.zeros(1))
+
+        cache.invalidate(self._testFile)
+        self.assertIsNone(cache.get(key))
+        self.assertIsNotNone(cache.get(otherKey))
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.statistics()['bytes'], 0)
+
+        # Rewriting a file changes its keys.
+        with open(self._testFile, 'w') as f:
+            f.write('rewritten')
+
+        self.assertNotEqual(ChunkCache.makeKey(self._testFile, (0, 0, 1, 1)),
+                            key)
+
+    # -------------------------------------------------------------------------
+    # testGetDefault
+    # -------------------------------------------------------------------------
+    def testGetDefault(self):
+
+        self.assertIs(ChunkCache.getDefault(), ChunkCache.getDefault())
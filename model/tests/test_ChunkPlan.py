@@ -0,0 +1,123 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import pickle
+import time
+import unittest
+
+import numpy as np
+
+from core.model.ChunkPlan import ChunkPlan
+
+
+# -----------------------------------------------------------------------------
+# class ChunkPlanTestCase
+#
+# python -m unittest discover model/tests/
+# python -m unittest core.model.tests.test_ChunkPlan
+# -----------------------------------------------------------------------------
+class ChunkPlanTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # testInit
+    # -------------------------------------------------------------------------
+    def testInit(self):
+
+        with self.assertRaisesRegex(RuntimeError, 'image size must be'):
+            ChunkPlan(0, 10, 1, 1)
+
+        with self.assertRaisesRegex(RuntimeError, 'chunk size must be'):
+            ChunkPlan(10, 10, 1, 0)
+
+    # -------------------------------------------------------------------------
+    # testWindows
+    # -------------------------------------------------------------------------
+    def testWindows(self):
+
+        # These match testGetChunkBookkeeping in test_Chunker.
+        plan = ChunkPlan(578, 464, 250, 200)
+        self.assertEqual(len(plan), 9)
+        self.assertEqual(plan[0], (0, 0, 250, 200))
+        self.assertEqual(plan[2], (500, 0, 78, 200))
+        self.assertEqual(plan[3], (0, 200, 250, 200))
+        self.assertEqual(plan[8], (500, 400, 78, 64))
+        self.assertEqual(plan[-1], plan[8])
+
+        with self.assertRaises(IndexError):
+            plan[9]
+
+        windows = plan.windows()
+        self.assertEqual(windows.shape, (9, 4))
+        self.assertEqual([tuple(w) for w in windows], list(plan))
+        self.assertTrue(np.array_equal(plan[3:5], windows[3:5]))
+        self.assertTrue(np.array_equal(plan.windows([8, 0]), windows[[8, 0]]))
+
+        with self.assertRaises(IndexError):
+            plan.windows([9])
+
+        self.assertEqual(plan.indexOf(250, 200), 4)
+
+        with self.assertRaisesRegex(RuntimeError, 'No chunk starts'):
+            plan.indexOf(251, 200)
+
+    # -------------------------------------------------------------------------
+    # testBatches
+    # -------------------------------------------------------------------------
+    def testBatches(self):
+
+        plan = ChunkPlan(578, 464, 250, 200)
+        batches = plan.batches(4)
+        self.assertEqual(batches, [range(0, 4), range(4, 8), range(8, 9)])
+
+        windows = np.concatenate([plan.windows(b) for b in batches])
+        self.assertTrue(np.array_equal(windows, plan.windows()))
+
+        with self.assertRaisesRegex(RuntimeError, 'batch size must be'):
+            plan.batches(0)
+
+    # -------------------------------------------------------------------------
+    # testSerialization
+    # -------------------------------------------------------------------------
+    def testSerialization(self):
+
+        plan = ChunkPlan(40000, 40000, 256, 256)
+        self.assertEqual(pickle.loads(pickle.dumps(plan)), plan)
+        self.assertLess(len(pickle.dumps(plan)), 100)
+        self.assertEqual(ChunkPlan.fromJson(plan.toJson()), plan)
+
+    # -------------------------------------------------------------------------
+    # testLargePlan
+    # -------------------------------------------------------------------------
+    def testLargePlan(self):
+
+        start = time.time()
+        plan = ChunkPlan(100000, 100000, 100, 50)
+        windows = plan.windows()
+        elapsed = time.time() - start
+
+        self.assertEqual(len(plan), 2000000)
+        self.assertEqual(tuple(windows[-1]), plan[len(plan) - 1])
+        self.assertLess(elapsed, 2.0)
+
+    # -------------------------------------------------------------------------
+    # testRegion
+    # -------------------------------------------------------------------------
+    def testRegion(self):
+
+        plan = ChunkPlan(578, 464, 100, 100, region=(150, 30, 220, 120))
+        self.assertEqual(plan.region(), (150, 30, 220, 120))
+        self.assertEqual(len(plan), 6)
+        self.assertEqual(plan[0], (150, 30, 100, 100))
+        self.assertEqual(plan[2], (350, 30, 20, 100))
+        self.assertEqual(plan[5], (350, 130, 20, 20))
+        self.assertEqual([tuple(w) for w in plan.windows()], list(plan))
+        self.assertEqual(plan.indexOf(250, 130), 4)
+        self.assertNotEqual(plan, ChunkPlan(578, 464, 100, 100))
+        self.assertEqual(pickle.loads(pickle.dumps(plan)), plan)
+        self.assertEqual(ChunkPlan.fromJson(plan.toJson()), plan)
+
+        with self.assertRaisesRegex(RuntimeError, 'No chunk starts'):
+            plan.indexOf(0, 0)
+
+        with self.assertRaisesRegex(RuntimeError, 'within the image'):
+            ChunkPlan(578, 464, 100, 100, region=(500, 0, 100, 10))
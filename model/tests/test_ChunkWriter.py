@@ -0,0 +1,137 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from osgeo import gdal
+
+from core.model.Chunker import Chunker
+from core.model.ChunkWriter import ChunkWriter
+from core.model.GeospatialImageFile import GeospatialImageFile
+
+
+# -----------------------------------------------------------------------------
+# class ChunkWriterTestCase
+#
+# python -m unittest discover model/tests/
+# python -m unittest core.model.tests.test_ChunkWriter
+# -----------------------------------------------------------------------------
+class ChunkWriterTestCase(unittest.TestCase):
+
+    TEST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'gsenm_250m_eucl_dist_streams.tif')
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._outFile = tempfile.mkstemp(suffix='.tif')[1]
+        self.addCleanup(os.remove, self._outFile)
+        self._source = GeospatialImageFile(ChunkWriterTestCase.TEST_FILE)
+
+        c = Chunker(ChunkWriterTestCase.TEST_FILE)
+        c.setChunkToImage()
+        self._image = c.getChunk()[1]
+
+    # -------------------------------------------------------------------------
+    # testWrite
+    # -------------------------------------------------------------------------
+    def testWrite(self):
+
+        c = Chunker(ChunkWriterTestCase.TEST_FILE)
+        c.setChunkSize(250, 200)
+
+        with ChunkWriter(self._outFile,
+                         self._source,
+                         dataType=gdal.GDT_Int16,
+                         queueSize=2) as writer:
+
+            # Write from several threads, in any order.
+            def process(item):
+
+                loc, chunk = item
+                writer.write(loc, chunk.astype(np.int16) - 1)
+
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                list(executor.map(process, c.iterChunks(workers=2)))
+
+        out = gdal.Open(self._outFile)
+        self.assertEqual(out.GetGeoTransform(),
+                         self._source.getDataset().GetGeoTransform())
+
+        self.assertTrue(out.GetSpatialRef().IsSame(self._source.srs()))
+        self.assertEqual(out.GetRasterBand(1).DataType, gdal.GDT_Int16)
+
+        self.assertTrue(np.array_equal(out.ReadAsArray().transpose(),
+                                       self._image.astype(np.int16) - 1))
+
+    # -------------------------------------------------------------------------
+    # testLayouts
+    # -------------------------------------------------------------------------
+    def testLayouts(self):
+
+        c = Chunker(ChunkWriterTestCase.TEST_FILE)
+        c.setChunkSize(250, 200)
+        c.setLayout(Chunker.LAYOUT_BXY)
+
+        with ChunkWriter(self._outFile,
+                         self._source,
+                         numBands=2,
+                         layout=Chunker.LAYOUT_BXY) as writer:
+
+            for loc, chunk in c.iterChunks():
+                writer.write(loc, np.concatenate([chunk, chunk + 1]))
+
+        out = gdal.Open(self._outFile)
+        self.assertEqual(out.RasterCount, 2)
+
+        self.assertTrue(np.array_equal(
+            out.GetRasterBand(2).ReadAsArray().transpose(),
+            self._image + 1))
+
+    # -------------------------------------------------------------------------
+    # testBufferRing
+    # -------------------------------------------------------------------------
+    def testBufferRing(self):
+
+        # Each chunk's buffer is reused by the next getChunk().
+        c = Chunker(ChunkWriterTestCase.TEST_FILE)
+        c.setChunkSize(100, 100)
+        c.setBufferRing(1)
+
+        with ChunkWriter(self._outFile, self._source) as writer:
+
+            while not c.isComplete():
+
+                loc, chunk = c.getChunk()
+
+                if loc:
+                    writer.write(loc, chunk)
+
+        out = gdal.Open(self._outFile)
+
+        self.assertTrue(np.array_equal(out.ReadAsArray().transpose(),
+                                       self._image))
+
+    # -------------------------------------------------------------------------
+    # testErrors
+    # -------------------------------------------------------------------------
+    def testErrors(self):
+
+        with self.assertRaisesRegex(RuntimeError, 'Layout.*must be one of'):
+            ChunkWriter(self._outFile, self._source, layout='yxb')
+
+        writer = ChunkWriter(self._outFile, self._source)
+        writer.write((0, 0), np.zeros((10, 10, 2), dtype=np.uint8))
+
+        with self.assertRaisesRegex(RuntimeError, 'has 2 bands'):
+            writer.close()
+
+        with self.assertRaisesRegex(RuntimeError, 'is closed'):
+            writer.write((0, 0), np.zeros((10, 10), dtype=np.uint8))
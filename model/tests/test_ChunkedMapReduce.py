@@ -0,0 +1,169 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import operator
+import os
+import unittest
+
+from kombu.serialization import dumps
+from kombu.serialization import loads
+import numpy as np
+
+os.environ.setdefault('REDIS_PORT', '6379')
+
+from core.model.CeleryConfiguration import app
+from core.model.ChunkedMapReduce import chunkedMapReduce
+from core.model.Chunker import Chunker
+from core.model.ChunkedMapReduce import _loadPartial
+from core.model.ChunkedMapReduce import mapChunkBatch
+
+
+# -----------------------------------------------------------------------------
+# Functions sent to the tasks must be defined at module level.
+# -----------------------------------------------------------------------------
+def sumChunk(loc, chunk):
+    return int(chunk.sum())
+
+
+def maxChunk(loc, chunk):
+    return (chunk.max(), loc)
+
+
+def locateChunk(loc, chunk):
+    return [loc]
+
+
+def failChunk(loc, chunk):
+    raise ValueError('Chunk ' + str(loc) + ' failed.')
+
+
+# -----------------------------------------------------------------------------
+# class ChunkedMapReduceTestCase
+#
+# The tasks run in Celery's eager mode, so no broker or workers are needed.
+#
+# python -m unittest core.model.tests.test_ChunkedMapReduce
+# -----------------------------------------------------------------------------
+class ChunkedMapReduceTestCase(unittest.TestCase):
+
+    TEST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'gsenm_250m_eucl_dist_streams.tif')
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._eager = app.conf.task_always_eager
+        app.conf.task_always_eager = True
+
+        c = Chunker(ChunkedMapReduceTestCase.TEST_FILE)
+        c.setChunkToImage()
+        self._image = c.getChunk()[1]
+
+    # -------------------------------------------------------------------------
+    # tearDown
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        app.conf.task_always_eager = self._eager
+
+    # -------------------------------------------------------------------------
+    # testSum
+    # -------------------------------------------------------------------------
+    def testSum(self):
+
+        total = chunkedMapReduce(ChunkedMapReduceTestCase.TEST_FILE,
+                                 sumChunk,
+                                 operator.add,
+                                 (250, 200),
+                                 batchSize=4)
+
+        self.assertEqual(total, int(self._image.sum()))
+
+    # -------------------------------------------------------------------------
+    # testDefaultBatchSize
+    # -------------------------------------------------------------------------
+    def testDefaultBatchSize(self):
+
+        total = chunkedMapReduce(ChunkedMapReduceTestCase.TEST_FILE,
+                                 sumChunk,
+                                 operator.add,
+                                 (578, 1))
+
+        self.assertEqual(total, int(self._image.sum()))
+
+    # -------------------------------------------------------------------------
+    # testMax
+    # -------------------------------------------------------------------------
+    def testMax(self):
+
+        maxValue, loc = chunkedMapReduce(ChunkedMapReduceTestCase.TEST_FILE,
+                                         maxChunk,
+                                         max,
+                                         (100, 100))
+
+        self.assertEqual(maxValue, self._image.max())
+        chunk = self._image[loc[0]:loc[0] + 100, loc[1]:loc[1] + 100]
+        self.assertEqual(chunk.max(), maxValue)
+        self.assertIsInstance(loc, tuple)
+
+    # -------------------------------------------------------------------------
+    # testResultSerializer
+    #
+    # Eager tasks do not serialize their results, so round-trip a partial
+    # result as the backend would.
+    # -------------------------------------------------------------------------
+    def testResultSerializer(self):
+
+        c = Chunker(ChunkedMapReduceTestCase.TEST_FILE)
+        c.setChunkSize(100, 100)
+        plan = c.getChunkPlan()
+
+        partial = mapChunkBatch(ChunkedMapReduceTestCase.TEST_FILE,
+                                plan,
+                                [0, 1],
+                                maxChunk,
+                                max)
+
+        contentType, encoding, data = dumps(
+            partial,
+            serializer=app.conf.result_serializer)
+
+        result = loads(data,
+                       contentType,
+                       encoding,
+                       accept=app.conf.accept_content)
+
+        self.assertEqual(result, partial)
+        partial = _loadPartial(result)
+        self.assertIsInstance(partial[0], np.generic)
+        self.assertIsInstance(partial[1], tuple)
+
+    # -------------------------------------------------------------------------
+    # testReduceOrder
+    # -------------------------------------------------------------------------
+    def testReduceOrder(self):
+
+        # Concatenation is not commutative, so this shows the order.
+        locs = chunkedMapReduce(ChunkedMapReduceTestCase.TEST_FILE,
+                                locateChunk,
+                                operator.add,
+                                (100, 100),
+                                batchSize=3)
+
+        c = Chunker(ChunkedMapReduceTestCase.TEST_FILE)
+        c.setChunkSize(100, 100)
+        self.assertEqual(locs, [window[:2] for window in c.getChunkPlan()])
+
+    # -------------------------------------------------------------------------
+    # testTaskFailure
+    # -------------------------------------------------------------------------
+    def testTaskFailure(self):
+
+        with self.assertRaisesRegex(ValueError, 'failed'):
+
+            chunkedMapReduce(ChunkedMapReduceTestCase.TEST_FILE,
+                             failChunk,
+                             operator.add,
+                             (100, 100))
@@ -1,12 +1,39 @@
 #!/usr/bin/env python2
 # -*- coding: utf-8 -*-
 
+import asyncio
+import gc
 import os
+import pickle
+import tempfile
 import unittest
+import warnings
 
 import numpy as np
 
+from osgeo import gdal
+from osgeo import ogr
+from osgeo.osr import SpatialReference
+
+from core.model.ChunkCache import ChunkCache
 from core.model.Chunker import Chunker
+from core.model.DatasetPool import DatasetPool
+from core.model.Envelope import Envelope
+
+
+# -----------------------------------------------------------------------------
+# Functions for processMap must be defined at module level.
+# -----------------------------------------------------------------------------
+def doubleChunk(loc, chunk):
+    return chunk.astype(np.int32) * 2
+
+
+def sumNeighbors(loc, chunk):
+
+    padded = np.pad(chunk.astype(np.int32), 1)
+
+    return padded[:-2, 1:-1] + padded[2:, 1:-1] + \
+        padded[1:-1, :-2] + padded[1:-1, 2:]
 
 
 # -----------------------------------------------------------------------------
@@ -17,6 +44,38 @@ from core.model.Chunker import Chunker
 # -----------------------------------------------------------------------------
 class ChunkerTestCase(unittest.TestCase):
 
+    # -------------------------------------------------------------------------
+    # _createTiledFile
+    #
+    # This creates a tiled, LZW-compressed GeoTIFF whose pixel values are
+    # band * 100000 + row * xSize + column, so every pixel is unique.
+    # -------------------------------------------------------------------------
+    def _createTiledFile(self, xSize=300, ySize=200, bands=1, blockSize=64):
+
+        testFile = tempfile.mkstemp(suffix='.tif')[1]
+        self.addCleanup(os.remove, testFile)
+
+        ds = gdal.GetDriverByName('GTiff').Create(
+            testFile,
+            xSize,
+            ySize,
+            bands,
+            gdal.GDT_Int32,
+            options=['TILED=YES',
+                     'COMPRESS=LZW',
+                     'BLOCKXSIZE=' + str(blockSize),
+                     'BLOCKYSIZE=' + str(blockSize)])
+
+        pixels = np.arange(xSize * ySize, dtype=np.int32).reshape(ySize,
+                                                                   xSize)
+
+        for band in range(1, bands + 1):
+            ds.GetRasterBand(band).WriteArray(pixels + band * 100000)
+
+        ds = None
+
+        return testFile
+
     # -------------------------------------------------------------------------
     # testInit
     # -------------------------------------------------------------------------
@@ -334,3 +393,863 @@ class ChunkerTestCase(unittest.TestCase):
 
         loc, chunk = c.getChunk()
         self.assertAlmostEqual(chunk[0, 70, 0], 0.0045041959, 7)  # 50, 70, 1
+
+    # -------------------------------------------------------------------------
+    # testIterChunks
+    # -------------------------------------------------------------------------
+    def testIterChunks(self):
+
+        # 578 x 464
+        testFile = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'gsenm_250m_eucl_dist_streams.tif')
+
+        c = Chunker(testFile)
+        c.setChunkSize(250, 200)
+        serial = []
+        loc, chunk = c.getChunk()
+
+        while loc and chunk.size:
+
+            serial.append((loc, chunk))
+            loc, chunk = c.getChunk()
+
+        # Ordered chunks match the serial loop exactly.
+        ordered = list(c.iterChunks(workers=4, ordered=True))
+        self.assertEqual(len(ordered), 9)
+        self.assertEqual([l for l, ch in ordered], [l for l, ch in serial])
+
+        for (sLoc, sChunk), (oLoc, oChunk) in zip(serial, ordered):
+            self.assertTrue(np.array_equal(sChunk, oChunk))
+
+        # Unordered chunks cover the same windows.
+        unordered = dict(c.iterChunks(workers=4))
+        self.assertEqual(len(unordered), 9)
+
+        for sLoc, sChunk in serial:
+            self.assertTrue(np.array_equal(sChunk, unordered[sLoc]))
+
+        with self.assertRaisesRegex(RuntimeError, 'number of workers'):
+            list(c.iterChunks(workers=0))
+
+    # -------------------------------------------------------------------------
+    # testSetChunkToBlocks
+    # -------------------------------------------------------------------------
+    def testSetChunkToBlocks(self):
+
+        # 300 x 200, with 64 x 64 tiles
+        c = Chunker(self._createTiledFile())
+        self.assertEqual(c.getBlockSize(), (64, 64))
+
+        c.setChunkToBlocks(2)
+        self.assertEqual((c._xSize, c._ySize), (128, 128))
+
+        # Chunks are limited to the image.
+        c.setChunkToBlocks(4)
+        self.assertEqual((c._xSize, c._ySize), (256, 200))
+
+        # Automatic sizing picks the largest multiple within the budget.
+        c.setChunkToBlocks(maxPixels=200 * 200)
+        self.assertEqual((c._xSize, c._ySize), (192, 192))
+
+        c.setChunkToBlocks(maxPixels=1)
+        self.assertEqual((c._xSize, c._ySize), (64, 64))
+
+        c.setChunkToBlocks()
+        self.assertEqual((c._xSize, c._ySize), (300, 200))
+
+        with self.assertRaisesRegex(RuntimeError, 'multiple must be greater'):
+            c.setChunkToBlocks(0)
+
+    # -------------------------------------------------------------------------
+    # testMisalignedChunkSize
+    # -------------------------------------------------------------------------
+    def testMisalignedChunkSize(self):
+
+        c = Chunker(self._createTiledFile())
+
+        with self.assertWarnsRegex(UserWarning, 'not aligned'):
+            c.setChunkSize(100, 64)
+
+        with warnings.catch_warnings():
+
+            warnings.simplefilter('error')
+            c.setChunkSize(128, 64)
+            c.setChunkSize(300, 200)
+
+    # -------------------------------------------------------------------------
+    # testSetChunkSizeForMemory
+    # -------------------------------------------------------------------------
+    def testSetChunkSizeForMemory(self):
+
+        # 300 x 200 x 2 bands of 4-byte pixels, with 64 x 64 tiles
+        c = Chunker(self._createTiledFile(bands=2))
+
+        # One tile of both bands, plus the copy.
+        c.setChunkSizeForMemory(64 * 64 * 4 * 2 * 2)
+        self.assertEqual((c._xSize, c._ySize), (64, 64))
+        self.assertEqual(c.getChunkBytes(), 64 * 64 * 4 * 2 * 2)
+
+        # Three tiles, without the copy.
+        c.setChunkSizeForMemory(3 * 64 * 64 * 4 * 2, includeCopy=False)
+        self.assertEqual((c._xSize, c._ySize), (192, 64))
+
+        # Two full-width tile rows of one band.
+        c.setChunkSizeForMemory(300 * 150 * 4 * 2, bands=[2])
+        self.assertEqual((c._xSize, c._ySize), (300, 128))
+        self.assertLessEqual(c.getChunkBytes(bands=[2]), 300 * 150 * 4 * 2)
+        self.assertEqual(c.getChunkBytes(bands=[1, 2]), c.getChunkBytes())
+
+        # The selected bands are the default.
+        c.setBands([1])
+        self.assertEqual(c.getChunkBytes(), c.getChunkBytes(bands=[2]))
+        c.setBands(None)
+
+        # Less than one tile.
+        c.setChunkSizeForMemory(100 * 4 * 2 * 2)
+        self.assertEqual((c._xSize, c._ySize), (64, 1))
+
+        with self.assertRaisesRegex(RuntimeError, 'too small'):
+            c.setChunkSizeForMemory(8)
+
+    # -------------------------------------------------------------------------
+    # testSetBandsAndLayout
+    # -------------------------------------------------------------------------
+    def testSetBandsAndLayout(self):
+
+        # 300 x 200 x 3 bands
+        c = Chunker(self._createTiledFile(bands=3))
+        c.setChunkSize(128, 64)
+        c.setBands([3, 1])
+
+        def expected(band, x, y):
+            return band * 100000 + y * 300 + x
+
+        # The original layout is (x, y, band).
+        c.setLayout(Chunker.LAYOUT_XYB)
+        loc, chunk = c.getChunk(128, 64)
+        self.assertEqual(chunk.shape, (128, 64, 2))
+        self.assertTrue(chunk.flags['C_CONTIGUOUS'])
+        self.assertEqual(chunk[5, 7, 0], expected(3, 133, 71))
+        self.assertEqual(chunk[5, 7, 1], expected(1, 133, 71))
+
+        c.setLayout(Chunker.LAYOUT_BXY)
+        loc, chunk = c.getChunk(128, 64)
+        self.assertEqual(chunk.shape, (2, 128, 64))
+        self.assertTrue(chunk.flags['C_CONTIGUOUS'])
+        self.assertEqual(chunk[0, 5, 7], expected(3, 133, 71))
+        self.assertEqual(chunk[1, 5, 7], expected(1, 133, 71))
+
+        c.setLayout(Chunker.LAYOUT_BYX)
+        loc, chunk = c.getChunk(128, 64)
+        self.assertEqual(chunk.shape, (2, 64, 128))
+        self.assertTrue(chunk.flags['C_CONTIGUOUS'])
+        self.assertEqual(chunk[0, 7, 5], expected(3, 133, 71))
+
+        # A single band keeps the original (x, y) shape.
+        c.setLayout(Chunker.LAYOUT_XYB)
+        c.setBands([2])
+        loc, chunk = c.getChunk(128, 64)
+        self.assertEqual(chunk.shape, (128, 64))
+        self.assertEqual(chunk[5, 7], expected(2, 133, 71))
+
+        with self.assertRaisesRegex(RuntimeError, 'Band 4 must be between'):
+            c.setBands([1, 4])
+
+        with self.assertRaisesRegex(RuntimeError, 'Layout.*must be one of'):
+            c.setLayout('yxb')
+
+    # -------------------------------------------------------------------------
+    # testReadIntoBuffer
+    # -------------------------------------------------------------------------
+    def testReadIntoBuffer(self):
+
+        # 578 x 464
+        testFile = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'gsenm_250m_eucl_dist_streams.tif')
+
+        c = Chunker(testFile)
+        c.setChunkToImage()
+        expected = c.getChunk()[1]
+
+        # The chunk is a view of the caller's buffer.
+        c.reset()
+        out = np.zeros(578 * 464 + 10, dtype=np.uint8)
+        loc, chunk = c.getChunk(out=out)
+        self.assertTrue(np.shares_memory(chunk, out))
+        self.assertTrue(np.array_equal(chunk, expected))
+
+        with self.assertRaisesRegex(RuntimeError, 'must match the image'):
+            c.reset()
+            c.getChunk(out=np.empty(578 * 464, dtype=np.float32))
+
+        with self.assertRaisesRegex(RuntimeError, 'but the chunk needs'):
+            c.reset()
+            c.getChunk(out=np.empty(100, dtype=np.uint8))
+
+    # -------------------------------------------------------------------------
+    # testSetBufferRing
+    # -------------------------------------------------------------------------
+    def testSetBufferRing(self):
+
+        # 578 x 464
+        testFile = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'gsenm_250m_eucl_dist_streams.tif')
+
+        c = Chunker(testFile)
+        c.setChunkToImage()
+        image = c.getChunk()[1]
+
+        c.setChunkAsRow()
+        c.setBufferRing(2)
+        c.reset()
+        loc0, row0 = c.getChunk()
+        loc1, row1 = c.getChunk()
+        self.assertTrue(np.array_equal(row0, image[:, 0:1]))
+        self.assertTrue(np.array_equal(row1, image[:, 1:2]))
+        self.assertFalse(np.shares_memory(row0, row1))
+
+        # The third row reuses the first row's buffer.
+        loc2, row2 = c.getChunk()
+        self.assertTrue(np.shares_memory(row0, row2))
+        self.assertTrue(np.array_equal(row2, image[:, 2:3]))
+
+        with self.assertRaisesRegex(RuntimeError, 'cannot be negative'):
+            c.setBufferRing(-1)
+
+    # -------------------------------------------------------------------------
+    # testSetPrefetch
+    # -------------------------------------------------------------------------
+    def testSetPrefetch(self):
+
+        # 578 x 464
+        testFile = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'gsenm_250m_eucl_dist_streams.tif')
+
+        c = Chunker(testFile)
+        c.setChunkSize(250, 200)
+        expected = dict(c.iterChunks(workers=2))
+
+        c.setPrefetch(3)
+        loc, chunk = c.getChunk()
+        numChunks = 0
+
+        while loc:
+
+            self.assertTrue(np.array_equal(chunk, expected[loc]))
+            numChunks += 1
+            loc, chunk = c.getChunk()
+
+        self.assertEqual(numChunks, 9)
+
+        # Reset cancels the read-ahead, and reading starts over.
+        c.reset()
+        self.assertIsNone(c._prefetchThread)
+        c.getChunk()
+        self.assertIsNotNone(c._prefetchThread)
+        c.reset()
+        self.assertIsNone(c._prefetchThread)
+        loc, chunk = c.getChunk()
+        self.assertEqual(loc, (0, 0))
+
+        # Jumping to another chunk restarts the read-ahead there.
+        loc, chunk = c.getChunk(250, 200)
+        self.assertEqual(loc, (250, 200))
+        self.assertTrue(np.array_equal(chunk, expected[loc]))
+        loc, chunk = c.getChunk()
+        self.assertEqual(loc, (500, 200))
+        self.assertTrue(np.array_equal(chunk, expected[loc]))
+
+        with self.assertRaisesRegex(RuntimeError, 'cannot be negative'):
+            c.setPrefetch(-1)
+
+    # -------------------------------------------------------------------------
+    # testSetHalo
+    # -------------------------------------------------------------------------
+    def testSetHalo(self):
+
+        # 578 x 464
+        testFile = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'gsenm_250m_eucl_dist_streams.tif')
+
+        c = Chunker(testFile)
+        c.setChunkToImage()
+        image = c.getChunk()[1]
+
+        c.setChunkSize(250, 200)
+        c.setHalo(2)
+
+        # The first chunk is clipped at the top and left edges.
+        c.reset()
+        loc, chunk = c.getChunk()
+        self.assertEqual(chunk.shape, (252, 202))
+        self.assertTrue(np.array_equal(chunk, image[0:252, 0:202]))
+
+        loc, chunk = c.getChunk(250, 200)
+        self.assertEqual(chunk.shape, (254, 204))
+        self.assertTrue(np.array_equal(chunk, image[248:502, 198:402]))
+
+        # The last chunk is clipped at the bottom and right edges.
+        loc, chunk = c.getChunk(500, 400)
+        self.assertEqual(chunk.shape, (80, 66))
+        self.assertTrue(np.array_equal(chunk, image[498:578, 398:464]))
+
+        # The inner regions reassemble the image without seams.
+        output = np.zeros_like(image)
+
+        for loc, chunk in c.iterChunks(workers=3):
+
+            inner = c.getInnerChunk(loc, chunk)
+            xEnd = loc[0] + inner.shape[0]
+            yEnd = loc[1] + inner.shape[1]
+            self.assertFalse(output[loc[0]:xEnd, loc[1]:yEnd].any())
+            output[loc[0]:xEnd, loc[1]:yEnd] = inner + 1
+
+        self.assertTrue(np.array_equal(output, image + 1))
+
+        c.setLayout(Chunker.LAYOUT_BXY)
+        c.reset()
+        loc, chunk = c.getChunk(250, 200)
+        self.assertEqual(chunk.shape, (1, 254, 204))
+        inner = c.getInnerChunk(loc, chunk)
+        self.assertTrue(np.array_equal(inner[0], image[250:500, 200:400]))
+
+        with self.assertRaisesRegex(RuntimeError, 'halo cannot be negative'):
+            c.setHalo(-1)
+
+    # -------------------------------------------------------------------------
+    # testSetChunkSizeForMemoryWithHalo
+    # -------------------------------------------------------------------------
+    def testSetChunkSizeForMemoryWithHalo(self):
+
+        # 300 x 200 of 4-byte pixels, with 64 x 64 tiles
+        c = Chunker(self._createTiledFile())
+        c.setHalo(8)
+
+        # Two tiles fit, but not with their halos.
+        c.setChunkSizeForMemory(128 * 64 * 4, includeCopy=False)
+        self.assertEqual((c._xSize, c._ySize), (64, 64))
+        self.assertLessEqual(c.getChunkBytes(includeCopy=False), 128 * 64 * 4)
+
+    # -------------------------------------------------------------------------
+    # testGetChunkPlan
+    # -------------------------------------------------------------------------
+    def testGetChunkPlan(self):
+
+        # 578 x 464
+        testFile = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'gsenm_250m_eucl_dist_streams.tif')
+
+        c = Chunker(testFile)
+        c.setChunkSize(250, 200)
+        plan = c.getChunkPlan()
+        self.assertEqual(len(plan), 9)
+
+        # A separate Chunker reads windows from the plan.
+        expected = dict(c.iterChunks())
+        worker = Chunker(testFile)
+
+        for index in plan.batches(4)[1]:
+
+            window = plan[index]
+            chunk = worker.readWindow(*window)
+            self.assertTrue(np.array_equal(chunk, expected[window[:2]]))
+
+        chunks = list(c.iterChunks(workers=2, ordered=True, indices=[8, 0]))
+        self.assertEqual([loc for loc, chunk in chunks], [(500, 400), (0, 0)])
+
+    # -------------------------------------------------------------------------
+    # testProcessMap
+    # -------------------------------------------------------------------------
+    def testProcessMap(self):
+
+        # 578 x 464
+        testFile = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'gsenm_250m_eucl_dist_streams.tif')
+
+        c = Chunker(testFile)
+        c.setChunkToImage()
+        image = c.getChunk()[1].astype(np.int32)
+
+        c.setChunkSize(250, 200)
+        output = c.processMap(doubleChunk, workers=2, dataType=np.int32)
+        self.assertEqual(output.shape, (578, 464))
+        self.assertEqual(output.dtype, np.int32)
+        self.assertTrue(np.array_equal(output, image * 2))
+
+        # With a halo, only the inner part of each result is kept.
+        c.setHalo(1)
+        output = c.processMap(sumNeighbors, workers=2, dataType=np.int32)
+        padded = np.pad(image, 1)
+
+        expected = padded[:-2, 1:-1] + padded[2:, 1:-1] + \
+            padded[1:-1, :-2] + padded[1:-1, 2:]
+
+        # Pixels on the image edge have no neighbor on one side.
+        self.assertTrue(np.array_equal(output[1:-1, 1:-1],
+                                       expected[1:-1, 1:-1]))
+
+    # -------------------------------------------------------------------------
+    # testSetSkipEmpty
+    # -------------------------------------------------------------------------
+    def testSetSkipEmpty(self):
+
+        # A sparse file with data only in the block at (64, 0).
+        sparseFile = tempfile.mkstemp(suffix='.tif')[1]
+        self.addCleanup(os.remove, sparseFile)
+
+        ds = gdal.GetDriverByName('GTiff').Create(
+            sparseFile,
+            300,
+            200,
+            1,
+            gdal.GDT_Int32,
+            options=['TILED=YES',
+                     'SPARSE_OK=TRUE',
+                     'BLOCKXSIZE=64',
+                     'BLOCKYSIZE=64'])
+
+        ds.GetRasterBand(1).WriteArray(np.full((64, 64), 7, np.int32), 64, 0)
+        ds = None
+
+        c = Chunker(sparseFile)
+        c.setChunkSize(64, 64)
+        c.setSkipEmpty()
+
+        loc, chunk = c.getChunk()
+        self.assertEqual(loc, (64, 0))
+        self.assertTrue((chunk == 7).all())
+        self.assertEqual(c.getSkippedWindows(), [(0, 0, 64, 64)])
+
+        loc, chunk = c.getChunk()
+        self.assertIsNone(loc)
+        self.assertEqual(len(c.getSkippedWindows()), 19)
+
+        # An explicitly requested empty chunk is returned as None.
+        c.reset()
+        self.assertEqual(c.getChunk(128, 64)[1], None)
+        self.assertEqual(c.getSkippedWindows(), [(128, 64, 64, 64)])
+
+        locs = [loc for loc, chunk in c.iterChunks(workers=2)]
+        self.assertEqual(locs, [(64, 0)])
+
+        # A dense file whose pixels are no-data, except one block.
+        testFile = self._createTiledFile()
+        ds = gdal.Open(testFile, gdal.GA_Update)
+        ds.GetRasterBand(1).WriteArray(np.full((200, 300), -1, np.int32))
+        ds.GetRasterBand(1).WriteArray(np.ones((64, 64), np.int32), 128, 128)
+        ds.GetRasterBand(1).SetNoDataValue(-1)
+        ds = None
+
+        c = Chunker(testFile)
+        c.setChunkSize(64, 64)
+        c.setSkipEmpty()
+        self.assertEqual([loc for loc, chunk in c.iterChunks()], [(128, 128)])
+
+        # Without reading the empty chunks, using a coarse mask.
+        c.setSkipEmpty(useOverview=True)
+        self.assertEqual(c.getChunk()[0], (128, 128))
+        self.assertIsNone(c.getChunk()[0])
+
+        # The no-data value can be given, and skipping can be turned off.
+        c.setSkipEmpty(noDataValue=1)
+        self.assertEqual(len(list(c.iterChunks())), 19)
+
+        c.setSkipEmpty(False)
+        self.assertEqual(len(list(c.iterChunks())), 20)
+
+        # Skipped chunks are left as zeros by processMap().
+        c.setSkipEmpty()
+        output = c.processMap(doubleChunk, workers=2, dataType=np.int32)
+        self.assertEqual(output.sum(), 64 * 64 * 2)
+
+        # Selecting bands after setSkipEmpty() uses those bands' no-data.
+        testFile = self._createTiledFile(bands=3)
+        ds = gdal.Open(testFile, gdal.GA_Update)
+        ds.GetRasterBand(1).WriteArray(np.full((200, 300), -1, np.int32))
+        ds.GetRasterBand(1).WriteArray(np.ones((64, 64), np.int32), 128, 128)
+
+        for band in range(1, 4):
+            ds.GetRasterBand(band).SetNoDataValue(-band)
+
+        ds = None
+
+        c = Chunker(testFile)
+        c.setChunkSize(64, 64)
+        c.setSkipEmpty()
+        self.assertEqual(len(list(c.iterChunks())), 20)
+
+        c.setBands([1, 2])
+        self.assertEqual(len(list(c.iterChunks())), 20)
+
+        c.setBands([1])
+        self.assertEqual([loc for loc, chunk in c.iterChunks()], [(128, 128)])
+
+        c.setBands(None)
+        c.setSkipEmpty(useOverview=True)
+        c.setBands([1])
+        self.assertEqual(c.getChunk()[0], (128, 128))
+        self.assertIsNone(c.getChunk()[0])
+
+    # -------------------------------------------------------------------------
+    # testSetCache
+    # -------------------------------------------------------------------------
+    def testSetCache(self):
+
+        testFile = self._createTiledFile(bands=2)
+        cache = ChunkCache()
+        c = Chunker(testFile)
+        c.setChunkSize(64, 64)
+        c.setBands([1, 2])
+        c.setCache(cache)
+
+        first = [chunk.copy() for loc, chunk in c.iterChunks(ordered=True)]
+        self.assertEqual(cache.statistics()['misses'], 20)
+
+        c.setLayout(Chunker.LAYOUT_BYX)
+        c.setPrefetch(2)
+        second = []
+
+        while not c.isComplete():
+
+            loc, chunk = c.getChunk()
+
+            if chunk is not None:
+                second.append(chunk.transpose(2, 1, 0))
+
+        self.assertEqual(cache.statistics()['hits'], 20)
+
+        for a, b in zip(first, second):
+            self.assertTrue(np.array_equal(a, b))
+
+        # Windows of other bands are cached separately.
+        c.setPrefetch(0)
+        c.setBands([2])
+        c.setLayout(Chunker.LAYOUT_XYB)
+        c.reset()
+        loc, chunk = c.getChunk()
+        self.assertTrue(np.array_equal(chunk, first[0][:, :, 1]))
+        self.assertEqual(cache.statistics()['misses'], 21)
+
+        c.setCache(None)
+        c.reset()
+        c.getChunk()
+        self.assertEqual(cache.statistics()['misses'], 21)
+
+    # -------------------------------------------------------------------------
+    # testPickle
+    # -------------------------------------------------------------------------
+    def testPickle(self):
+
+        testFile = self._createTiledFile()
+        srs = SpatialReference()
+        srs.ImportFromEPSG(32612)
+        ds = gdal.Open(testFile, gdal.GA_Update)
+        ds.SetGeoTransform((1000, 10, 0, 5000, 0, -10))
+        ds.SetSpatialRef(srs)
+        ds = None
+
+        c = Chunker(testFile)
+        c.setChunkSize(64, 64)
+        c.setLayout(Chunker.LAYOUT_BYX)
+        c.setPrefetch(2)
+        envelope = Envelope()
+        envelope.addPoint(1700, 4700, 0, srs)
+        envelope.addPoint(3000, 3500, 0, srs)
+        c.setRegion(envelope)
+        c.setSkipEmpty(noDataValue=-1)
+        c.getChunk()
+
+        # The copy continues from the same position, with the same settings.
+        dump = pickle.dumps(c)
+        self.assertLess(len(dump), 4096)
+        c2 = pickle.loads(dump)
+        self.assertIsNone(c2._imageFile._dataset)
+        self.assertEqual(c2.getChunkPlan(), c.getChunkPlan())
+
+        while not c.isComplete():
+
+            loc, chunk = c.getChunk()
+            loc2, chunk2 = c2.getChunk()
+            self.assertEqual(loc2, loc)
+
+            if loc:
+
+                self.assertTrue(np.array_equal(chunk2, chunk))
+
+                self.assertTrue(np.array_equal(c2.getRegionMask(loc),
+                                               c.getRegionMask(loc)))
+
+        self.assertTrue(c2.isComplete())
+
+    # -------------------------------------------------------------------------
+    # testSetPool
+    # -------------------------------------------------------------------------
+    def testSetPool(self):
+
+        testFile = self._createTiledFile()
+        pool = DatasetPool()
+        c = Chunker(testFile)
+        c.setChunkSize(64, 64)
+        c.setPool(pool)
+        first = [chunk.copy() for loc, chunk in c.iterChunks(workers=2)]
+        gc.collect()
+        opens = pool.statistics()['opens']
+        self.assertLessEqual(opens, 3)
+
+        # Another pass borrows the same handles.
+        second = [chunk.copy() for loc, chunk in c.iterChunks(workers=2)]
+        gc.collect()
+        self.assertEqual(pool.statistics()['opens'], opens)
+        self.assertGreaterEqual(pool.statistics()['reuses'], 1)
+        self.assertEqual(len(first), len(second))
+
+        c.setPrefetch(2)
+
+        while not c.isComplete():
+            c.getChunk()
+
+        c.setPool(None)
+        self.assertEqual(pool.statistics()['lent'], 0)
+
+    # -------------------------------------------------------------------------
+    # testSetRegion
+    # -------------------------------------------------------------------------
+    def testSetRegion(self):
+
+        # Pixels are 10 units, with the upper left at (1000, 5000).
+        testFile = self._createTiledFile()
+        srs = SpatialReference()
+        srs.ImportFromEPSG(32612)
+        ds = gdal.Open(testFile, gdal.GA_Update)
+        ds.SetGeoTransform((1000, 10, 0, 5000, 0, -10))
+        ds.SetSpatialRef(srs)
+        ds = None
+
+        c = Chunker(testFile)
+        c.setChunkToImage()
+        image = c.getChunk()[1]
+        c.setChunkSize(64, 64)
+
+        # This envelope covers pixels 70 to 199 and rows 30 to 149.
+        envelope = Envelope()
+        envelope.addPoint(1700, 4700, 0, srs)
+        envelope.addPoint(3000, 3500, 0, srs)
+        c.setRegion(envelope)
+        self.assertEqual(c.getChunkPlan().region(), (70, 30, 130, 120))
+
+        locs = []
+
+        while not c.isComplete():
+
+            loc, chunk = c.getChunk()
+
+            if loc:
+
+                x, y = loc
+                xLen = min(64, 200 - x)
+                yLen = min(64, 150 - y)
+
+                self.assertTrue(np.array_equal(
+                    chunk, image[x:x + xLen, y:y + yLen]))
+
+                locs.append(loc)
+
+        expected = [(70, 30), (134, 30), (198, 30),
+                    (70, 94), (134, 94), (198, 94)]
+
+        self.assertEqual(locs, expected)
+        self.assertEqual([loc for loc, chunk in c.iterChunks(ordered=True)],
+                         expected)
+
+        # Chunks outside a triangle are not read.
+        ring = ogr.Geometry(ogr.wkbLinearRing)
+
+        for x, y in ((1700, 4700), (3000, 4700), (1700, 3500), (1700, 4700)):
+            ring.AddPoint_2D(x, y)
+
+        triangle = ogr.Geometry(ogr.wkbPolygon)
+        triangle.AddGeometry(ring)
+        triangle.AssignSpatialReference(srs)
+        c.setRegion(triangle)
+
+        expected = [(70, 30), (134, 30), (198, 30), (70, 94)]
+        self.assertEqual([c.getChunk()[0] for i in range(4)], expected)
+        self.assertEqual(c.getChunk(), (None, None))
+        self.assertEqual([loc for loc, chunk in c.iterChunks(ordered=True)],
+                         expected)
+
+        c.setPrefetch(2)
+        c.reset()
+        self.assertEqual([c.getChunk()[0] for i in range(4)], expected)
+        c.setPrefetch(0)
+
+        # The mask follows the triangle's hypotenuse.
+        mask = c.getRegionMask((70, 30))
+        self.assertEqual(mask.shape, (64, 64))
+        self.assertTrue(mask[0, 0])
+        self.assertTrue(mask[63, 0])
+        self.assertFalse(mask[63, 63])
+
+        c.setLayout(Chunker.LAYOUT_BYX)
+        self.assertTrue(np.array_equal(c.getRegionMask((70, 30)), mask.T))
+
+        # Only chunks within the region are processed.
+        c.setLayout(Chunker.LAYOUT_XYB)
+        output = c.processMap(doubleChunk, workers=2, dataType=np.int32)
+        expectedOutput = np.zeros_like(output)
+
+        for x, y in expected:
+
+            xEnd = min(x + 64, 200)
+            yEnd = min(y + 64, 150)
+            expectedOutput[x:xEnd, y:yEnd] = image[x:xEnd, y:yEnd] * 2
+
+        self.assertTrue(np.array_equal(output, expectedOutput))
+
+        # The whole image is restored.
+        c.setRegion()
+        self.assertEqual(len(list(c.iterChunks())), 20)
+
+        with self.assertRaisesRegex(RuntimeError, 'no region to mask'):
+            c.getRegionMask((0, 0))
+
+        outside = Envelope()
+        outside.addPoint(0, 0, 0, srs)
+        outside.addPoint(10, 10, 0, srs)
+
+        with self.assertRaisesRegex(RuntimeError, 'does not intersect'):
+            c.setRegion(outside)
+
+        # This triangle's envelope overlaps the upper left corner, but the
+        # triangle does not, so there are no chunks.
+        ring = ogr.Geometry(ogr.wkbLinearRing)
+
+        for x, y in ((800, 5200), (1100, 5200), (800, 4900), (800, 5200)):
+            ring.AddPoint_2D(x, y)
+
+        corner = ogr.Geometry(ogr.wkbPolygon)
+        corner.AddGeometry(ring)
+        corner.AssignSpatialReference(srs)
+        c.setRegion(corner)
+        self.assertEqual(c.getChunkPlan().region(), (0, 0, 10, 10))
+        self.assertEqual(c.getChunk(), (None, None))
+        self.assertEqual(list(c.iterChunks()), [])
+
+    # -------------------------------------------------------------------------
+    # testSetResolution
+    # -------------------------------------------------------------------------
+    def testSetResolution(self):
+
+        testFile = self._createTiledFile(bands=2)
+        c = Chunker(testFile)
+        c.setChunkSize(64, 64)
+        c.setResolution(4)
+
+        chunks = dict(c.iterChunks())
+        self.assertEqual(len(chunks), 20)
+        self.assertEqual(chunks[(0, 0)].shape, (16, 16, 2))
+        self.assertEqual(chunks[(256, 192)].shape, (11, 2, 2))
+
+        # Chunks match decimated reads of their windows.
+        imageFile = c.getImageFile()
+
+        expected = imageFile.readWindow(64,
+                                        128,
+                                        64,
+                                        64,
+                                        bufSize=(16, 16))
+
+        self.assertTrue(np.array_equal(chunks[(64, 128)],
+                                       expected.transpose(2, 1, 0)))
+
+        c.setLayout(Chunker.LAYOUT_BYX)
+        loc, chunk = c.getChunk()
+        self.assertEqual(chunk.shape, (2, 16, 16))
+
+        # Any GDAL resampling algorithm may be chosen.
+        c.setResolution(4, resampling=gdal.GRIORA_Average)
+        self.assertEqual(c.readWindow(0, 0, 64, 64).shape, (2, 16, 16))
+
+        with self.assertRaisesRegex(RuntimeError, 'at least one'):
+            c.setResolution(0.5)
+
+        with self.assertRaisesRegex(RuntimeError, 'cannot be used'):
+            c.setHalo(1)
+
+        with self.assertRaisesRegex(RuntimeError, 'full resolution'):
+            c.processMap(doubleChunk)
+
+        # Select an overview's resolution.  Overviews built in update mode
+        # are internal, so no .ovr file is left behind.
+        ds = gdal.Open(testFile, gdal.GA_Update)
+        ds.BuildOverviews('AVERAGE', [2, 4])
+        ds = None
+
+        c = Chunker(testFile)
+        c.setChunkSize(64, 64)
+        c.setLayout(Chunker.LAYOUT_BYX)
+        c.setResolution(overview=1)
+        self.assertEqual(c.readWindow(0, 0, 64, 64).shape, (2, 16, 16))
+
+        with self.assertRaisesRegex(RuntimeError, 'has no overview 2'):
+            c.setResolution(overview=2)
+
+        c.setResolution()
+        self.assertEqual(c.readWindow(0, 0, 64, 64).shape, (2, 64, 64))
+
+    # -------------------------------------------------------------------------
+    # testAiter
+    # -------------------------------------------------------------------------
+    def testAiter(self):
+
+        c = Chunker(self._createTiledFile())
+        c.setChunkSize(64, 64)
+        expected = list(c.iterChunks(ordered=True))
+
+        async def collect(**kwargs):
+            return [(loc, chunk) async for loc, chunk in c.aiter(**kwargs)]
+
+        chunks = asyncio.run(collect(concurrency=3, ordered=True))
+        self.assertEqual([loc for loc, chunk in chunks],
+                         [loc for loc, chunk in expected])
+
+        for (loc, chunk), (expectedLoc, expectedChunk) in zip(chunks,
+                                                              expected):
+
+            self.assertTrue(np.array_equal(chunk, expectedChunk))
+
+        chunks = asyncio.run(collect(concurrency=2, indices=[3, 1]))
+        self.assertEqual(sorted(loc for loc, chunk in chunks),
+                         [(64, 0), (192, 0)])
+
+        # A slow consumer leaves, at most, concurrency chunks read ahead.
+        async def consumeSlowly():
+
+            numRead = []
+            reads = c._readChunkOnThread
+
+            def countRead(threadState, window):
+
+                numRead.append(window)
+                return reads(threadState, window)
+
+            c._readChunkOnThread = countRead
+            numConsumed = 0
+
+            async for loc, chunk in c.aiter(concurrency=2):
+
+                numConsumed += 1
+                await asyncio.sleep(0.05)
+                self.assertLessEqual(len(numRead), numConsumed + 2)
+
+                if numConsumed == 5:
+                    break
+
+            del c._readChunkOnThread
+
+            return numConsumed
+
+        self.assertEqual(asyncio.run(consumeSlowly()), 5)
+
+        with self.assertRaisesRegex(RuntimeError, 'greater than zero'):
+            asyncio.run(collect(concurrency=0))
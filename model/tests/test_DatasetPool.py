@@ -0,0 +1,179 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import gc
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from osgeo import gdal
+
+from core.model.DatasetPool import DatasetPool
+from core.model.ImageFile import ImageFile
+
+
+# -----------------------------------------------------------------------------
+# class DatasetPoolTestCase
+#
+# python -m unittest discover model/tests/
+# python -m unittest core.model.tests.test_DatasetPool
+# -----------------------------------------------------------------------------
+class DatasetPoolTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # _createFile
+    # -------------------------------------------------------------------------
+    def _createFile(self, value=0):
+
+        testFile = tempfile.mkstemp(suffix='.tif')[1]
+        self.addCleanup(os.remove, testFile)
+        ds = gdal.GetDriverByName('GTiff').Create(testFile, 20, 10, 1,
+                                                  gdal.GDT_Int32)
+
+        ds.GetRasterBand(1).WriteArray(np.full((10, 20), value,
+                                               dtype=np.int32))
+
+        ds = None
+
+        return testFile
+
+    # -------------------------------------------------------------------------
+    # testAcquireAndRelease
+    # -------------------------------------------------------------------------
+    def testAcquireAndRelease(self):
+
+        testFile = self._createFile()
+        pool = DatasetPool()
+        token, dataset = pool.acquire(testFile)
+        self.assertEqual(dataset.RasterXSize, 20)
+
+        # A lent handle is not lent again.
+        otherToken, otherDataset = pool.acquire(testFile)
+        self.assertIsNot(otherDataset, dataset)
+
+        pool.release(token)
+        pool.release(token)
+        self.assertIs(pool.acquire(testFile)[1], dataset)
+
+        # Read-only and writable handles are separate.
+        pool.release(otherToken)
+        self.assertIsNot(pool.acquire(testFile, readOnly=False)[1],
+                         otherDataset)
+
+        stats = pool.statistics()
+        self.assertEqual(stats['opens'], 3)
+        self.assertEqual(stats['reuses'], 1)
+        self.assertEqual(stats['lent'], 2)
+        self.assertEqual(stats['idle'], 1)
+
+        with self.assertRaisesRegex(RuntimeError, 'could not open'):
+            pool.acquire(testFile + '.missing')
+
+    # -------------------------------------------------------------------------
+    # testEviction
+    # -------------------------------------------------------------------------
+    def testEviction(self):
+
+        pool = DatasetPool(maxHandles=2)
+        evicted = []
+        first = pool.acquire(self._createFile(), onEvict=evicted.append)[0]
+        second = pool.acquire(self._createFile())[0]
+        pool.touch(first)
+        pool.acquire(self._createFile())
+        self.assertEqual(len(pool), 2)
+        self.assertEqual(evicted, [])
+
+        # The least recently used, idle or lent, is closed.
+        pool.release(second)
+        pool.acquire(self._createFile())
+        pool.acquire(self._createFile())
+        self.assertEqual(evicted, [first])
+        self.assertEqual(pool.statistics()['evictions'], 3)
+
+        pool.setMaxHandles(1)
+        self.assertEqual(len(pool), 1)
+
+        with self.assertRaisesRegex(RuntimeError, 'at least one'):
+            pool.setMaxHandles(0)
+
+    # -------------------------------------------------------------------------
+    # testImageFile
+    # -------------------------------------------------------------------------
+    def testImageFile(self):
+
+        pool = DatasetPool(maxHandles=1)
+        files = [self._createFile(value) for value in range(3)]
+        imageFiles = [ImageFile(name, pool=pool) for name in files]
+        self.assertEqual(len(pool), 1)
+
+        # Files whose handles were closed reopen on their next read.
+        for i in (0, 1, 2, 0):
+            self.assertEqual(imageFiles[i].readWindow(0, 0, 2, 2)[0, 0], i)
+
+        self.assertEqual(len(pool), 1)
+        self.assertEqual(pool.statistics()['opens'], 7)
+
+        # A collected ImageFile returns its handle for reuse.
+        del imageFiles
+        gc.collect()
+        self.assertEqual(pool.statistics()['idle'], 1)
+        imageFile = ImageFile(files[0], pool=pool)
+        self.assertEqual(pool.statistics()['reuses'], 1)
+
+        # Invalidating a file closes its handles, and its owners reopen it.
+        pool.invalidate(files[0])
+        self.assertEqual(len(pool), 0)
+        self.assertEqual(imageFile.readWindow(0, 0, 2, 2)[0, 0], 0)
+
+        imageFile.setPool(None)
+        self.assertEqual(pool.statistics()['idle'], 1)
+        self.assertIsNotNone(imageFile.getDataset())
+        self.assertEqual(pool.statistics()['opens'], 8)
+
+    # -------------------------------------------------------------------------
+    # testEvictWhileReleasing
+    # -------------------------------------------------------------------------
+    def testEvictWhileReleasing(self):
+
+        pool = DatasetPool(maxHandles=1)
+        imageFile = ImageFile(self._createFile(), pool=pool)
+
+        # This is the owner's state partway through _releaseDataset().
+        releaseHandle = imageFile._releaseHandle
+        imageFile._releaseHandle = None
+        pool.acquire(self._createFile())
+        self.assertIsNone(imageFile._poolToken)
+        self.assertIsNone(imageFile._dataset)
+
+        releaseHandle()
+        self.assertEqual(pool.statistics()['idle'], 0)
+        self.assertEqual(imageFile.readWindow(0, 0, 2, 2)[0, 0], 0)
+
+    # -------------------------------------------------------------------------
+    # testInvalidate
+    # -------------------------------------------------------------------------
+    def testInvalidate(self):
+
+        testFile = self._createFile()
+        backup = testFile + '.bak'
+        self.addCleanup(os.remove, backup)
+        gdal.GetDriverByName('GTiff').Create(backup, 20, 10, 1)
+        pool = DatasetPool()
+
+        # Relative and absolute names of a file share handles.
+        pool.release(pool.acquire(os.path.relpath(testFile))[0])
+        pool.acquire(testFile)
+        self.assertEqual(pool.statistics()['reuses'], 1)
+
+        # Only the named file is closed, whichever way it was named.
+        pool.acquire(backup)
+        pool.invalidate(testFile)
+        self.assertEqual(len(pool), 1)
+        pool.invalidate(os.path.relpath(backup))
+        self.assertEqual(len(pool), 0)
+
+        # Subdatasets belong to the file they quote.
+        self.assertEqual(DatasetPool._filePath('NETCDF:"a.nc":var'),
+                         os.path.abspath('a.nc'))
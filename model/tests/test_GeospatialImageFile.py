@@ -3,6 +3,7 @@
 
 import logging
 import os
+import pickle
 import shutil
 import sys
 import tempfile
@@ -13,6 +14,7 @@ from osgeo import gdalconst
 from osgeo.osr import SpatialReference
 from osgeo import osr
 
+from core.model.DatasetPool import DatasetPool
 from core.model.Envelope import Envelope
 from core.model.GeospatialImageFile import GeospatialImageFile
 
@@ -311,6 +313,34 @@ class GeospatialImageFileTestCase(unittest.TestCase):
         os.remove(imageFile.fileName())
         os.remove(workingCopy)
 
+    # -------------------------------------------------------------------------
+    # testPickle
+    # -------------------------------------------------------------------------
+    def testPickle(self):
+
+        imageFile = self._createTestFile(createUTM=True)
+        self.addCleanup(os.remove, imageFile.fileName())
+        envelope = imageFile.envelope()
+        dump = pickle.dumps(imageFile)
+        self.assertLess(len(dump), 1024)
+
+        # The dataset is not opened to answer from the pickled metadata.
+        imageFile2 = pickle.loads(dump)
+        self.assertIsNone(imageFile2._dataset)
+        self.assertEqual(imageFile2.fileName(), imageFile.fileName())
+        self.assertEqual(imageFile2.envelope().ulx(), envelope.ulx())
+        self.assertEqual(imageFile2.scale(), imageFile.scale())
+        self.assertTrue(imageFile2.srs().IsSame(imageFile.srs()))
+        self.assertIsNone(imageFile2._dataset)
+        self.assertIs(imageFile2.logger, imageFile.logger)
+
+        self.assertEqual(imageFile2.getDataset().ReadAsArray(0, 0, 5, 5).
+                         tolist(),
+                         imageFile.getDataset().ReadAsArray(0, 0, 5, 5).
+                         tolist())
+
+        self.assertTrue(imageFile2.srs().IsSame(imageFile.srs()))
+
     # -------------------------------------------------------------------------
     # testNoOperation
     # -------------------------------------------------------------------------
@@ -326,6 +356,40 @@ class GeospatialImageFileTestCase(unittest.TestCase):
         # Delete the test file.
         os.remove(imageFile.fileName())
 
+    # -------------------------------------------------------------------------
+    # testPooledSrs
+    # -------------------------------------------------------------------------
+    def testPooledSrs(self):
+
+        imageFile = self._createTestFile(createUTM=True)
+        self.addCleanup(os.remove, imageFile.fileName())
+        fileSRS = imageFile.srs()
+
+        # An owner passing another SRS shares the pool with one that does not.
+        otherSRS = SpatialReference()
+        otherSRS.ImportFromEPSG(32610)
+        pool = DatasetPool(maxHandles=1)
+
+        first = GeospatialImageFile(imageFile.fileName(),
+                                    spatialReference=otherSRS,
+                                    pool=pool)
+
+        self.assertTrue(first.srs().IsSame(otherSRS))
+        first = None
+
+        second = GeospatialImageFile(imageFile.fileName(), pool=pool)
+        self.assertEqual(pool.statistics()['reuses'], 1)
+        self.assertTrue(second.srs().IsSame(fileSRS))
+        self.assertFalse(second.srs().IsSame(otherSRS))
+
+        self.assertTrue(second.getDataset().GetSpatialRef().IsSame(fileSRS))
+
+        # Without a pool, the passed SRS is set on the dataset, too.
+        third = GeospatialImageFile(imageFile.fileName(),
+                                    spatialReference=otherSRS)
+
+        self.assertTrue(third.getDataset().GetSpatialRef().IsSame(otherSRS))
+
     # -------------------------------------------------------------------------
     # testReproject
     # -------------------------------------------------------------------------
@@ -2,11 +2,48 @@
 # -*- coding: utf-8 -*-
 
 import os
+import pickle
+import tempfile
 import unittest
 
+try:
+    import dask
+
+except ImportError:
+    dask = None
+
+try:
+    import xarray
+
+except ImportError:
+    xarray = None
+
+import numpy as np
+
+from osgeo import gdal
+
+from core.model.DatasetPool import DatasetPool
 from core.model.ImageFile import ImageFile
 
 
+# -----------------------------------------------------------------------------
+# class ParentOnlyFailure
+#
+# This fails to construct only in the process that imported it first, as if
+# its file changed after a worker process validated it.
+# -----------------------------------------------------------------------------
+class ParentOnlyFailure(ImageFile):
+
+    PARENT_PID = os.getpid()
+
+    def __init__(self, pathToFile, **kwargs):
+
+        if os.getpid() == ParentOnlyFailure.PARENT_PID:
+            raise RuntimeError(pathToFile + ' changed.')
+
+        super(ParentOnlyFailure, self).__init__(pathToFile, **kwargs)
+
+
 # -----------------------------------------------------------------------------
 # class ImageFileTestCase
 #
@@ -20,6 +57,60 @@ class ImageFileTestCase(unittest.TestCase):
     TEST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
                              'TSURF.nc')
 
+    # -------------------------------------------------------------------------
+    # test_asMemmap
+    # -------------------------------------------------------------------------
+    def test_asMemmap(self):
+
+        # This is an uncompressed GeoTIFF of contiguous strips.
+        imageFile = ImageFile(os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            'gsenm_250m_eucl_dist_streams.tif'))
+
+        pixels = imageFile.getDataset().ReadAsArray()
+        array = imageFile.asMemmap()
+        self.assertEqual(array.shape, (1,) + pixels.shape)
+        self.assertTrue(np.array_equal(array[0], pixels))
+        self.assertTrue(np.array_equal(imageFile.asMemmap(1), pixels))
+        self.assertFalse(array.flags.writeable)
+
+        # Compressed pixels cannot be mapped.
+        testFile = tempfile.mkstemp(suffix='.tif')[1]
+        self.addCleanup(os.remove, testFile)
+
+        gdal.GetDriverByName('GTiff').Create(testFile, 20, 10, 1,
+                                             gdal.GDT_Byte,
+                                             options=['COMPRESS=LZW'])
+
+        with self.assertRaisesRegex(RuntimeError, 'cannot be memory mapped'):
+            ImageFile(testFile).asMemmap()
+
+        # Bit-packed 12-bit pixels are not mapped as whole UInt16 values.
+        nBitsFile = tempfile.mkstemp(suffix='.tif')[1]
+        self.addCleanup(os.remove, nBitsFile)
+        pixels = np.arange(200, dtype=np.uint16).reshape(10, 20) * 20
+
+        ds = gdal.GetDriverByName('GTiff').Create(nBitsFile, 20, 10, 1,
+                                                  gdal.GDT_UInt16,
+                                                  options=['NBITS=12'])
+
+        ds.GetRasterBand(1).WriteArray(pixels)
+        ds = None
+
+        imageFile = ImageFile(nBitsFile)
+        dataset = imageFile.getDataset()
+        self.assertIsNone(imageFile._mapTiff(dataset, [1]))
+
+        # GDAL's virtual memory, if available, unpacks them.
+        try:
+            array = imageFile.asMemmap(1)
+
+        except RuntimeError:
+            array = None
+
+        if array is not None:
+            self.assertTrue(np.array_equal(array, pixels))
+
     # -------------------------------------------------------------------------
     # test_getDataset
     # -------------------------------------------------------------------------
@@ -30,3 +121,169 @@ class ImageFileTestCase(unittest.TestCase):
 
         # Test _getDataset.
         self.assertIsNotNone(imageFile.getDataset())
+
+    # -------------------------------------------------------------------------
+    # test_lazy
+    # -------------------------------------------------------------------------
+    def test_lazy(self):
+
+        testFile, pixels = self._createTiledFile()
+        imageFile = ImageFile(testFile, lazy=True)
+        self.assertIsNone(imageFile._dataset)
+
+        self.assertTrue(np.array_equal(imageFile.readWindow(0, 0, 10, 10),
+                                       pixels[:, :10, :10]))
+
+        self.assertIsNotNone(imageFile._dataset)
+
+        # Invalid files fail on first use, or in validate().
+        invalidFile = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), 'invalid.tif')
+
+        imageFile = ImageFile(invalidFile, lazy=True)
+
+        with self.assertRaises(RuntimeError):
+            imageFile.validate()
+
+        with self.assertRaises(RuntimeError):
+            ImageFile(invalidFile)
+
+    # -------------------------------------------------------------------------
+    # test_openMany
+    # -------------------------------------------------------------------------
+    def test_openMany(self):
+
+        testFile, pixels = self._createTiledFile()
+        otherFile, pixels = self._createTiledFile()
+
+        invalidFile = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), 'invalid.tif')
+
+        paths = [testFile, invalidFile, otherFile]
+
+        for useProcesses in (False, True):
+
+            imageFiles, failures, stats = \
+                ImageFile.openMany(paths, 2, useProcesses=useProcesses)
+
+            self.assertEqual([image.fileName() for image in imageFiles],
+                             [testFile, otherFile])
+
+            self.assertEqual([path for path, message in failures],
+                             [invalidFile])
+
+            self.assertIn('GDAL', failures[0][1])
+            self.assertEqual(stats['files'], 3)
+            self.assertEqual(stats['opened'], 2)
+            self.assertEqual(stats['failed'], 1)
+
+            self.assertLessEqual(stats['maxOpenSeconds'],
+                                 stats['openSeconds'])
+
+            self.assertEqual(imageFiles[1].readWindow(0, 0, 2, 2).shape,
+                             (2, 2, 2))
+
+        # Constructor arguments pass through, and files validate when lazy.
+        imageFiles, failures, stats = \
+            ImageFile.openMany(paths, 2, cls=ImageFile, lazy=True)
+
+        self.assertEqual(len(imageFiles), 2)
+        self.assertIsNotNone(imageFiles[0]._dataset)
+        self.assertEqual(len(failures), 1)
+
+        # Process-local arguments stay in this process.
+        pool = DatasetPool()
+
+        imageFiles, failures, stats = \
+            ImageFile.openMany(paths, 2, useProcesses=True, pool=pool)
+
+        self.assertEqual(len(failures), 1)
+        self.assertIs(imageFiles[0].getPool(), pool)
+
+        # Files that fail to construct here are failures, too.
+        imageFiles, failures, stats = \
+            ImageFile.openMany([testFile], 2, ParentOnlyFailure, True)
+
+        self.assertEqual(imageFiles, [])
+        self.assertEqual([path for path, message in failures], [testFile])
+        self.assertEqual(stats['failed'], 1)
+
+    # -------------------------------------------------------------------------
+    # test_pickle
+    # -------------------------------------------------------------------------
+    def test_pickle(self):
+
+        testFile, pixels = self._createTiledFile()
+        imageFile = ImageFile(testFile)
+        metadata = imageFile.getMetadata()
+        imageFile2 = pickle.loads(pickle.dumps(imageFile))
+        self.assertIsNone(imageFile2._dataset)
+        self.assertEqual(imageFile2.getMetadata(), metadata)
+        self.assertIsNone(imageFile2._dataset)
+
+        self.assertTrue(np.array_equal(imageFile2.readWindow(0, 0, 10, 10),
+                                       pixels[:, :10, :10]))
+
+    # -------------------------------------------------------------------------
+    # _createTiledFile
+    # -------------------------------------------------------------------------
+    def _createTiledFile(self):
+
+        testFile = tempfile.mkstemp(suffix='.tif')[1]
+        self.addCleanup(os.remove, testFile)
+
+        ds = gdal.GetDriverByName('GTiff').Create(
+            testFile,
+            300,
+            200,
+            2,
+            gdal.GDT_Int32,
+            options=['TILED=YES', 'BLOCKXSIZE=64', 'BLOCKYSIZE=64'])
+
+        ds.SetGeoTransform((1000, 10, 0, 5000, 0, -10))
+        pixels = np.arange(300 * 200, dtype=np.int32).reshape(200, 300)
+        ds.GetRasterBand(1).WriteArray(pixels)
+        ds.GetRasterBand(2).WriteArray(pixels * 2)
+        ds = None
+
+        return testFile, np.stack([pixels, pixels * 2])
+
+    # -------------------------------------------------------------------------
+    # test_toDaskArray
+    # -------------------------------------------------------------------------
+    @unittest.skipUnless(dask, 'dask is not installed.')
+    def test_toDaskArray(self):
+
+        testFile, pixels = self._createTiledFile()
+        array = ImageFile(testFile).toDaskArray(chunks=(128, 64))
+
+        self.assertEqual(array.shape, (2, 200, 300))
+        self.assertEqual(array.dtype, np.int32)
+        self.assertEqual(array.chunks, ((2,), (64, 64, 64, 8), (128, 128, 44)))
+        self.assertTrue(np.array_equal(array.compute(), pixels))
+
+        # Reductions run block by block, on threads or processes.
+        self.assertEqual(array.sum().compute(scheduler='threads'),
+                         pixels.sum())
+
+        self.assertEqual(array[1].max().compute(scheduler='processes'),
+                         pixels[1].max())
+
+        array = ImageFile(testFile).toDaskArray(bands=[2])
+        self.assertEqual(array.chunks, ((1,), (200,), (300,)))
+        self.assertTrue(np.array_equal(array[0], pixels[1]))
+
+    # -------------------------------------------------------------------------
+    # test_toDataArray
+    # -------------------------------------------------------------------------
+    @unittest.skipUnless(xarray, 'xarray is not installed.')
+    def test_toDataArray(self):
+
+        testFile, pixels = self._createTiledFile()
+        array = ImageFile(testFile).toDataArray(chunks=(64, 64))
+
+        self.assertEqual(array.dims, ('band', 'y', 'x'))
+        self.assertEqual(list(array.band), [1, 2])
+        self.assertEqual(float(array.x[0]), 1005)
+        self.assertEqual(float(array.y[-1]), 3005)
+        self.assertEqual(int(array.sel(x=1015, y=4995, band=2)), 2)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from osgeo import gdal
+from osgeo.osr import SpatialReference
+
+from core.model.GeospatialImageFile import GeospatialImageFile
+from core.model.MetadataCache import MetadataCache
+
+
+# -----------------------------------------------------------------------------
+# class MetadataCacheTestCase
+#
+# python -m unittest discover model/tests/
+# python -m unittest core.model.tests.test_MetadataCache
+# -----------------------------------------------------------------------------
+class MetadataCacheTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # setUp
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self._testFile = tempfile.mkstemp(suffix='.tif')[1]
+        self.addCleanup(os.remove, self._testFile)
+        self._writeFile(30)
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self._database = os.path.join(directory, 'metadata.sqlite')
+
+    # -------------------------------------------------------------------------
+    # _writeFile
+    # -------------------------------------------------------------------------
+    def _writeFile(self, xScale):
+
+        ds = gdal.GetDriverByName('GTiff').Create(self._testFile, 20, 10, 2,
+                                                  gdal.GDT_Int16)
+
+        ds.SetGeoTransform((500000, xScale, 0, 4000000, 0, -30))
+        srs = SpatialReference()
+        srs.ImportFromEPSG(32610)
+        ds.SetSpatialRef(srs)
+        ds.GetRasterBand(1).SetNoDataValue(-9999)
+        ds = None
+
+    # -------------------------------------------------------------------------
+    # testGetAndPut
+    # -------------------------------------------------------------------------
+    def testGetAndPut(self):
+
+        cache = MetadataCache(self._database)
+        self.assertIsNone(cache.get(self._testFile))
+
+        metadata = MetadataCache.describe(gdal.Open(self._testFile))
+        self.assertEqual(metadata['xSize'], 20)
+        self.assertEqual(metadata['ySize'], 10)
+        self.assertEqual(metadata['numBands'], 2)
+        self.assertEqual(metadata['dataTypes'], [gdal.GDT_Int16] * 2)
+        self.assertEqual(metadata['noDataValues'][0], -9999)
+        self.assertEqual(metadata['geoTransform'][1], 30)
+
+        cache.put(self._testFile, metadata)
+        self.assertEqual(cache.get(self._testFile), metadata)
+        self.assertIsNone(cache.get(self._testFile, 'NETCDF:x:y'))
+
+        # The cache persists.
+        self.assertEqual(MetadataCache(self._database).get(self._testFile),
+                         metadata)
+
+        # A rewritten file is not found.
+        stat = os.stat(self._testFile)
+        os.utime(self._testFile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        self.assertIsNone(cache.get(self._testFile))
+
+        self.assertEqual(cache.statistics(),
+                         {'hits': 1, 'misses': 3, 'entries': 1})
+
+        cache.invalidate(self._testFile)
+        self.assertEqual(len(cache), 0)
+
+    # -------------------------------------------------------------------------
+    # testGeospatialImageFile
+    # -------------------------------------------------------------------------
+    def testGeospatialImageFile(self):
+
+        cache = MetadataCache(self._database)
+        first = GeospatialImageFile(self._testFile, metadataCache=cache)
+        self.assertEqual(first.scale(), (30, -30))
+        expected = first.envelope()
+
+        # Once cached, the file is not opened.
+        image = GeospatialImageFile(self._testFile,
+                                    lazy=True,
+                                    metadataCache=cache)
+
+        self.assertEqual(image.scale(), (30, -30))
+        self.assertEqual(image.envelope().ulx(), expected.ulx())
+        self.assertEqual(image.envelope().lry(), expected.lry())
+        self.assertTrue(image.srs().IsSame(first.srs()))
+        self.assertIsNone(image._dataset)
+
+        # After the file changes, it is described again.
+        self._writeFile(60)
+        stat = os.stat(self._testFile)
+        os.utime(self._testFile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+        image = GeospatialImageFile(self._testFile,
+                                    lazy=True,
+                                    metadataCache=cache)
+
+        self.assertEqual(image.scale(), (60, -30))
+        self.assertIsNotNone(image._dataset)
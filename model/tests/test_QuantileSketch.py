@@ -0,0 +1,67 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import math
+import pickle
+import unittest
+
+import numpy as np
+
+from core.model.QuantileSketch import QuantileSketch
+
+
+# -----------------------------------------------------------------------------
+# class QuantileSketchTestCase
+#
+# python -m unittest discover model/tests/
+# python -m unittest core.model.tests.test_QuantileSketch
+# -----------------------------------------------------------------------------
+class QuantileSketchTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # testQuantile
+    # -------------------------------------------------------------------------
+    def testQuantile(self):
+
+        values = np.random.default_rng(0).normal(0, 100, 100000)
+        sketch = QuantileSketch()
+        sketch.add(values)
+        self.assertEqual(sketch.count(), values.size)
+
+        for q in (0, 0.01, 0.25, 0.5, 0.75, 0.99, 1):
+
+            expected = np.quantile(values, q, method='lower')
+
+            self.assertLessEqual(abs(sketch.quantile(q) - expected),
+                                 0.01 * abs(expected) + 1e-6)
+
+        self.assertTrue(math.isnan(QuantileSketch().quantile(0.5)))
+
+        with self.assertRaisesRegex(RuntimeError, 'from 0 to 1'):
+            sketch.quantile(2)
+
+    # -------------------------------------------------------------------------
+    # testMerge
+    # -------------------------------------------------------------------------
+    def testMerge(self):
+
+        values = np.random.default_rng(1).exponential(10, 10000)
+        values[:100] = 0
+        whole = QuantileSketch()
+        whole.add(values)
+
+        parts = [QuantileSketch() for i in range(4)]
+
+        for part, split in zip(parts, np.array_split(values, 4)):
+            part.add(split)
+
+        merged = pickle.loads(pickle.dumps(parts[0]))
+
+        for part in parts[1:]:
+            merged.merge(part)
+
+        for q in (0, 0.005, 0.1, 0.5, 0.9, 1):
+            self.assertEqual(merged.quantile(q), whole.quantile(q))
+
+        with self.assertRaisesRegex(RuntimeError, 'different accuracies'):
+            merged.merge(QuantileSketch(0.05))
@@ -0,0 +1,135 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import os
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+
+from osgeo import gdal
+
+from core.model.RasterStats import RasterStats
+
+
+# -----------------------------------------------------------------------------
+# class RasterStatsTestCase
+#
+# python -m unittest discover model/tests/
+# python -m unittest core.model.tests.test_RasterStats
+# -----------------------------------------------------------------------------
+class RasterStatsTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # testUpdate
+    # -------------------------------------------------------------------------
+    def testUpdate(self):
+
+        pixels = np.random.default_rng(0).normal(50, 10, (2, 100, 80))
+        pixels[1, :10] = -9999
+        pixels[0, 0, 0] = np.nan
+
+        stats = RasterStats(2, [None, -9999], histRange=(0, 100))
+
+        # Update with chunks of columns.
+        for start in range(0, 80, 30):
+            stats.update(pixels[:, :, start:start + 30])
+
+        band0 = pixels[0].ravel()[1:]
+        band1 = pixels[1, 10:].ravel()
+
+        self.assertEqual(list(stats.count()), [band0.size, band1.size])
+        self.assertTrue(np.allclose(stats.mean(), [band0.mean(),
+                                                   band1.mean()]))
+
+        self.assertTrue(np.allclose(stats.std(), [band0.std(), band1.std()]))
+        self.assertEqual(stats.minimum()[1], band1.min())
+        self.assertEqual(stats.maximum()[0], band0.max())
+
+        counts, edges = stats.histogram(1)
+        self.assertEqual(len(counts), RasterStats.DEFAULT_NUM_BINS)
+        self.assertEqual(edges[-1], 100)
+        self.assertEqual(counts.sum(), ((band1 >= 0) & (band1 <= 100)).sum())
+
+        median = stats.percentile(50)
+        self.assertLess(abs(median[1] - np.median(band1)), 1)
+
+        with self.assertRaisesRegex(RuntimeError, 'has 1 bands'):
+            stats.update(pixels[0])
+
+    # -------------------------------------------------------------------------
+    # testMerge
+    # -------------------------------------------------------------------------
+    def testMerge(self):
+
+        pixels = np.random.default_rng(1).integers(0, 256, (1, 64, 64))
+        whole = RasterStats(histRange=(0, 256))
+        whole.update(pixels)
+
+        # Merge partial statistics, as if from other processes.
+        merged = RasterStats(histRange=(0, 256))
+
+        for start in range(0, 64, 16):
+
+            part = RasterStats(histRange=(0, 256))
+            part.update(pixels[:, start:start + 16])
+            merged.merge(pickle.loads(pickle.dumps(part)))
+
+        self.assertEqual(merged.count(), whole.count())
+        self.assertTrue(np.allclose(merged.mean(), whole.mean()))
+        self.assertTrue(np.allclose(merged.variance(), whole.variance()))
+        self.assertEqual(merged.minimum(), whole.minimum())
+
+        self.assertTrue(np.array_equal(merged.histogram()[0],
+                                       whole.histogram()[0]))
+
+        self.assertEqual(merged.percentile(90), whole.percentile(90))
+
+        # Empty statistics merge, too.
+        merged.merge(RasterStats(histRange=(0, 256)))
+        self.assertEqual(merged.count(), whole.count())
+
+        with self.assertRaisesRegex(RuntimeError, 'different histogram'):
+            merged.merge(RasterStats())
+
+        self.assertTrue(np.isnan(RasterStats().mean()[0]))
+
+    # -------------------------------------------------------------------------
+    # testFromImage
+    # -------------------------------------------------------------------------
+    def testFromImage(self):
+
+        testFile = tempfile.mkstemp(suffix='.tif')[1]
+        self.addCleanup(os.remove, testFile)
+
+        ds = gdal.GetDriverByName('GTiff').Create(
+            testFile,
+            300,
+            200,
+            2,
+            gdal.GDT_Int16,
+            options=['TILED=YES', 'BLOCKXSIZE=64', 'BLOCKYSIZE=64'])
+
+        pixels = (np.arange(2 * 200 * 300) % 30000).astype(np.int16)
+        pixels = pixels.reshape(2, 200, 300)
+        pixels[1, :, :100] = -1
+
+        for band in (1, 2):
+
+            ds.GetRasterBand(band).WriteArray(pixels[band - 1])
+            ds.GetRasterBand(band).SetNoDataValue(-1)
+
+        ds = None
+
+        stats = RasterStats.fromImage(testFile, workers=2)
+        valid = pixels[1, :, 100:]
+
+        self.assertEqual(list(stats.count()), [60000, valid.size])
+        self.assertEqual(stats.minimum()[1], valid.min())
+        self.assertTrue(np.allclose(stats.mean(), [pixels[0].mean(),
+                                                   valid.mean()]))
+
+        stats = RasterStats.fromImage(testFile, bands=[2], noDataValue=0)
+        self.assertEqual(stats.count()[0], 60000)
+        self.assertEqual(stats.minimum()[0], -1)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from osgeo import gdal
+from osgeo.osr import SpatialReference
+
+from core.model.StackChunker import StackChunker
+
+
+# -----------------------------------------------------------------------------
+# class StackChunkerTestCase
+#
+# python -m unittest discover model/tests/
+# python -m unittest core.model.tests.test_StackChunker
+# -----------------------------------------------------------------------------
+class StackChunkerTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    # _createFile
+    #
+    # This creates a tiled GeoTIFF whose pixels are
+    # offset + row * xSize + column.
+    # -------------------------------------------------------------------------
+    def _createFile(self,
+                    offset,
+                    xSize=300,
+                    ySize=200,
+                    dataType=gdal.GDT_Int32,
+                    geoTransform=(500000, 30, 0, 4000000, 0, -30),
+                    epsg=32612):
+
+        testFile = tempfile.mkstemp(suffix='.tif')[1]
+        self.addCleanup(os.remove, testFile)
+
+        ds = gdal.GetDriverByName('GTiff').Create(
+            testFile,
+            xSize,
+            ySize,
+            1,
+            dataType,
+            options=['TILED=YES', 'BLOCKXSIZE=64', 'BLOCKYSIZE=64'])
+
+        srs = SpatialReference()
+        srs.ImportFromEPSG(epsg)
+        ds.SetSpatialRef(srs)
+        ds.SetGeoTransform(geoTransform)
+
+        pixels = np.arange(xSize * ySize).reshape(ySize, xSize) + offset
+        ds.GetRasterBand(1).WriteArray(pixels)
+        ds = None
+
+        return testFile
+
+    # -------------------------------------------------------------------------
+    # testInit
+    # -------------------------------------------------------------------------
+    def testInit(self):
+
+        first = self._createFile(0)
+
+        with self.assertRaisesRegex(RuntimeError, 'at least one image'):
+            StackChunker([])
+
+        with self.assertRaisesRegex(RuntimeError, 'The size of'):
+            StackChunker([first, self._createFile(0, xSize=301)])
+
+        with self.assertRaisesRegex(RuntimeError, 'The geotransform of'):
+
+            StackChunker([first,
+                          self._createFile(0, geoTransform=(0, 30, 0,
+                                                            0, 0, -30))])
+
+        with self.assertRaisesRegex(RuntimeError, 'The SRS of'):
+            StackChunker([first, self._createFile(0, epsg=32613)])
+
+        # Origins must be within a small fraction of a pixel.
+        for shift in (30, 15, 0.5):
+
+            with self.assertRaisesRegex(RuntimeError, 'The geotransform of'):
+
+                StackChunker([first,
+                              self._createFile(0, geoTransform=(
+                                  500000, 30, 0, 4000000 + shift, 0, -30))])
+
+        with self.assertRaisesRegex(RuntimeError, 'The geotransform of'):
+
+            StackChunker([first,
+                          self._createFile(0, geoTransform=(
+                              500000 + 30, 30, 0, 4000000, 0, -30))])
+
+        with self.assertRaisesRegex(RuntimeError, 'The geotransform of'):
+
+            StackChunker([first,
+                          self._createFile(0, geoTransform=(
+                              500000, 30.001, 0, 4000000, 0, -30))])
+
+        StackChunker([first,
+                      self._createFile(0, geoTransform=(
+                          500000.001, 30, 0, 4000000 - 0.001, 0, -30))])
+
+    # -------------------------------------------------------------------------
+    # testIterChunks
+    # -------------------------------------------------------------------------
+    def testIterChunks(self):
+
+        paths = [self._createFile(t * 100000) for t in range(3)]
+
+        # One image has a smaller type, so it is converted.
+        paths.append(self._createFile(7, dataType=gdal.GDT_Int16))
+
+        stack = StackChunker(paths)
+        self.assertEqual(len(stack), 4)
+        stack.setChunkSize(128, 128)
+
+        image = np.arange(300 * 200).reshape(200, 300).transpose()
+        locs = []
+
+        for loc, chunk in stack.iterChunks():
+
+            xStart, yStart = loc
+            expected = image[xStart:xStart + 128, yStart:yStart + 128]
+            self.assertEqual(chunk.shape, (4,) + expected.shape)
+            self.assertEqual(chunk.dtype, np.int32)
+
+            for t in range(3):
+                self.assertTrue(np.array_equal(chunk[t],
+                                               expected + t * 100000))
+
+            self.assertTrue(np.array_equal(chunk[3],
+                                           (expected + 7).astype(np.int16)))
+
+            locs.append(loc)
+
+        self.assertEqual(locs, [tuple(w[:2]) for w in stack.getChunkPlan()])
+
+        chunks = list(stack.iterChunks(indices=[5]))
+        self.assertEqual([loc for loc, chunk in chunks], [(256, 128)])
+
+        chunk = stack.readWindow(10, 20, 5, 6)
+        self.assertTrue(np.array_equal(chunk[1], image[10:15, 20:26] + 100000))
+
+        stack.setChunkToBlocks(maxPixels=4 * 64 * 64)
+        self.assertEqual(stack.getChunkPlan().chunkSize(), (64, 64))